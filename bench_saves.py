@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark save games: JSON vs the binary .sav format
+
+Builds a grid world with many extra objects (all differing from the
+initial world, so every one is written) and sprites, then times
+save_game() and load_game() with each format, plus reading the file on
+its own.
+
+Usage: python bench_saves.py [--sizes 10000 100000] [--grid 32] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from dataclasses import replace
+from bench_sprites import grid_rooms, WORLD_PATH
+from game_engine_rpg import GameEngineRPG
+from save_format import load_state
+
+FORMATS = [('json', 'json', None), ('sav', 'sav', 'none'), ('sav+zlib', 'sav', 'zlib'), ('sav+lzma', 'sav', 'lzma')]
+
+
+def build_engine(object_count: int, side: int) -> GameEngineRPG:
+    """A grid world with object_count extra objects and object_count // 10 sprites"""
+    engine = GameEngineRPG(config_path=WORLD_PATH)
+    engine.rooms = grid_rooms(side)
+    engine.player_location = "room_0_0"
+    
+    random.seed(1)
+    room_ids = list(engine.rooms)
+    originals = list(engine.objects.values())
+    for i in range(object_count):
+        original = originals[i % len(originals)]
+        obj_id = f"{original.id}_{i}"
+        engine.objects[obj_id] = replace(original, id=obj_id, location=random.choice(room_ids),
+                                         properties=dict(original.properties, weight=random.randint(1, 50)))
+    engine.reindex()
+    
+    templates = list(engine.sprite_templates)
+    for _ in range(object_count // 10):
+        engine.spawn_sprite(random.choice(templates), random.choice(room_ids))
+    return engine
+
+
+def best_ms(action, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark save game formats')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Extra object counts')
+    parser.add_argument('--grid', type=int, default=32, help='World is grid x grid rooms')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per timing (best is kept)')
+    args = parser.parse_args()
+    
+    print(f"Save games, {args.grid}x{args.grid} rooms, best of {args.repeat}\n")
+    print(f"{'objects':>9} {'format':>9} {'size KB':>9} {'save ms':>9} {'load ms':>9} {'read ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            engine = build_engine(size, args.grid)
+            loader = build_engine(size, args.grid)
+            for label, save_format, compression in FORMATS:
+                filename = os.path.join(tmp, f"bench_{label}")
+                engine.save_format = save_format
+                engine.SAVE_COMPRESSION = compression
+                
+                def save():
+                    engine.save_journals.clear()  # Full checkpoint every time
+                    engine.save_game(filename)
+                
+                save_ms = best_ms(save, args.repeat)
+                path = load_state(filename)[1]
+                load_ms = best_ms(lambda: loader.load_game(filename), args.repeat)
+                read_ms = best_ms(lambda: load_state(filename), args.repeat)
+                print(f"{size:>9} {label:>9} {os.path.getsize(path) / 1024:>9.0f} "
+                      f"{save_ms:>9.0f} {load_ms:>9.0f} {read_ms:>9.0f}")
+            engine.close()
+            loader.close()
+    print("\nload ms is the whole load_game() (respawning sprites included); read ms is")
+    print("just reading and decoding the file.")
+
+
+if __name__ == "__main__":
+    main()
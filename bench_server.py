@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Load test the multiplayer server with simulated players
+
+Starts a MultiplayerGameServer with the world ticking and drives it with
+bots, either directly through handle_player_command() (--mode direct,
+the default) or as real SSH clients of a local asyncssh server (--mode
+ssh). Each bot joins, then issues commands with an optional think time:
+random-walk bots pick moves, looks, takes, attacks and says; --script
+bots cycle through the commands in a file. Reports:
+  
+  - commands/sec and p50/p95/p99/max command latency (command sent to
+    the reply and prompt being written)
+  - broadcast delivery lag: bots say a timestamp, everyone in the room
+    measures how long it took to reach them
+  - memory per player: allocations made while the players joined
+  - world tick timing under the load
+
+--json writes the results for comparing runs, and --max-p99 fails the
+run (exit 1) when p99 latency goes over a limit, so it can gate a deploy.
+
+Usage: python bench_server.py [--players 100] [--duration 10] [--think 0.5] [--mode direct|ssh]
+                              [--script commands.txt] [--json results.json] [--max-p99 50]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+from typing import Tuple
+
+WORLD_PATH = "config" if os.path.isdir("config") else os.path.dirname(os.path.abspath(__file__))
+
+SAY_STAMP = re.compile(r'says: "t=(\d+)"')
+MOVES = ["n", "s", "e", "w", "north", "south", "east", "west"]
+
+
+class Stats:
+    """Latencies and broadcast lags in milliseconds, shared by every bot"""
+    
+    def __init__(self):
+        self.latencies = []
+        self.lags = []
+        self.errors = 0
+    
+    def saw(self, text: str):
+        """Record the lag of every timestamped say in text that just arrived"""
+        now = time.perf_counter_ns()
+        for match in SAY_STAMP.finditer(text):
+            self.lags.append((now - int(match.group(1))) / 1e6)
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class RandomBot:
+    """Picks a plausible command each turn; names come from the world's objects and sprites"""
+    
+    def __init__(self, rng: random.Random, items: list, enemies: list):
+        self.rng = rng
+        self.items = items
+        self.enemies = enemies
+    
+    def next_command(self) -> str:
+        roll = self.rng.random()
+        if roll < 0.4:
+            return self.rng.choice(MOVES)
+        if roll < 0.55:
+            return "look"
+        if roll < 0.7:
+            return f"take {self.rng.choice(self.items)}"
+        if roll < 0.85:
+            return f"attack {self.rng.choice(self.enemies)}"
+        return f"say t={time.perf_counter_ns()}"
+
+
+class ScriptBot:
+    """Cycles through a command script, starting at a random line"""
+    
+    def __init__(self, rng: random.Random, commands: list):
+        self.commands = commands
+        self.position = rng.randrange(len(commands))
+    
+    def next_command(self) -> str:
+        command = self.commands[self.position % len(self.commands)]
+        self.position += 1
+        if command == "say":
+            return f"say t={time.perf_counter_ns()}"  # Measured like the random bots' says
+        return command
+
+
+class LoopbackProcess:
+    """The stdout side of an SSH process for direct mode: counts output and looks for says"""
+    
+    def __init__(self, stats: Stats):
+        self.stats = stats
+        self.stdout = self
+        self.bytes = 0
+    
+    def write(self, text: str):
+        self.bytes += len(text)
+        if 'says: "t=' in text:
+            self.stats.saw(text)
+    
+    async def drain(self):
+        pass
+    
+    def close(self):
+        pass
+
+
+async def think(rng: random.Random, mean: float, deadline: float):
+    """Wait an exponentially distributed time, but not past the end of the run"""
+    delay = rng.expovariate(1 / mean) if mean > 0 else 0
+    await asyncio.sleep(max(0.0, min(delay, deadline - time.perf_counter())))
+
+
+async def run_direct(server, args, bots: list, stats: Stats) -> Tuple[float, float]:
+    """Bots call handle_player_command() and write the reply like handle_client does"""
+    from ssh_server_multiplayer_rpg import PlayerSession
+    
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = {}
+    for i in range(len(bots)):
+        name = f"Bot{i}"
+        sessions[name] = PlayerSession(name, LoopbackProcess(stats), server.queue_limit, server.queue_policy)
+        server.add_player(name, sessions[name])
+    memory = (tracemalloc.get_traced_memory()[0] - before) / len(bots)
+    tracemalloc.stop()
+    
+    started = time.perf_counter()
+    deadline = started + args.duration
+    
+    async def play(name: str, bot, rng: random.Random):
+        session = sessions[name]
+        while time.perf_counter() < deadline:
+            command = bot.next_command()
+            started = time.perf_counter()
+            try:
+                result = await server.handle_player_command(name, command)
+                await session.write(result + "\n\n> ")
+            except Exception:
+                stats.errors += 1
+            stats.latencies.append((time.perf_counter() - started) * 1000)
+            await think(rng, args.think, deadline)
+    
+    await asyncio.gather(*(play(f"Bot{i}", bot, random.Random(i)) for i, bot in enumerate(bots)))
+    return memory, time.perf_counter() - started
+
+
+class SshBot:
+    """One SSH client: sends commands and waits for the prompt that follows each reply"""
+    
+    PROMPT = "\n> "
+    
+    def __init__(self, name: str, stats: Stats):
+        self.name = name
+        self.stats = stats
+        self.process = None
+        self.prompts = 0
+        self.prompt_seen = asyncio.Event()
+        self.last = ""     # End of the previous read, so a prompt split across reads still counts
+        self.partial = ""  # Unfinished last line, likewise for says
+    
+    async def connect(self, host: str, port: int):
+        import asyncssh
+        self.connection = await asyncssh.connect(host, port, username=self.name, known_hosts=None)
+        self.process = await self.connection.create_process(encoding='utf-8')
+        self.reader = asyncio.create_task(self.read_loop())
+        self.process.stdin.write(self.name + "\n")
+        await self.wait_for_prompt(0)  # Welcome and first look
+    
+    async def read_loop(self):
+        while True:
+            text = await self.process.stdout.read(65536)
+            if not text:
+                return
+            prompts = (self.last + text).count(self.PROMPT)
+            self.last = (self.last + text)[-2:]
+            lines = (self.partial + text).split("\n")
+            self.partial = lines.pop()
+            if lines:
+                self.stats.saw("\n".join(lines))
+            if prompts:
+                self.prompts += prompts
+                self.prompt_seen.set()
+    
+    async def wait_for_prompt(self, seen: int):
+        while self.prompts <= seen:
+            self.prompt_seen.clear()
+            await self.prompt_seen.wait()
+    
+    async def command(self, command: str):
+        seen = self.prompts
+        self.process.stdin.write(command + "\n")
+        await self.wait_for_prompt(seen)
+    
+    def close(self):
+        self.reader.cancel()
+        self.connection.close()
+
+
+async def run_ssh(server, args, bots: list, stats: Stats) -> Tuple[float, float]:
+    """Bots are SSH clients of the server (in this process unless --connect is given)"""
+    host, port = "127.0.0.1", 0
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        port = int(port)
+    else:
+        import asyncssh
+        import ssh_server_multiplayer_rpg as server_module
+        acceptor = await asyncssh.create_server(
+            server_module.ZorkRPGSSHServer, host, 0,
+            server_host_keys=[asyncssh.generate_private_key('ssh-ed25519')],
+            process_factory=server_module.handle_client, encoding='utf-8')
+        port = acceptor.get_port()
+    
+    clients = [SshBot(f"Bot{i}", stats) for i in range(len(bots))]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for client in clients:
+        await client.connect(host, port)
+    memory = (tracemalloc.get_traced_memory()[0] - before) / len(clients)
+    tracemalloc.stop()
+    
+    started = time.perf_counter()
+    deadline = started + args.duration
+    
+    async def play(client: SshBot, bot, rng: random.Random):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await client.command(bot.next_command())
+            except Exception:
+                stats.errors += 1
+                return
+            stats.latencies.append((time.perf_counter() - started) * 1000)
+            await think(rng, args.think, deadline)
+    
+    await asyncio.gather(*(play(client, bot, random.Random(i)) for i, (client, bot) in enumerate(zip(clients, bots))))
+    elapsed = time.perf_counter() - started
+    for client in clients:
+        client.close()
+    if not args.connect:
+        for _ in range(100):  # Let the server see everyone leave
+            if not server.players:
+                break
+            await asyncio.sleep(0.02)
+        acceptor.close()
+    return memory, elapsed
+
+
+async def run(args) -> dict:
+    from ssh_server_multiplayer_rpg import MultiplayerGameServer
+    import ssh_server_multiplayer_rpg as server_module
+    
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:  # The server prints every join
+        server = MultiplayerGameServer(config_path=args.config, tick_rate=args.tick_rate, seed=args.seed,
+                                       sim_radius=args.sim_radius, sprite_table=args.sprite_table)
+    server_module.game_server = server
+    engine = server.engine
+    
+    rng = random.Random(args.seed)
+    items = sorted({obj.name for obj in engine.objects.values()})
+    enemies = sorted({template['name'].split()[-1] for template in engine.sprite_templates.values()}) or ["goblin"]
+    if args.script:
+        with open(args.script) as f:
+            script = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        bots = [ScriptBot(random.Random(rng.random()), script) for _ in range(args.players)]
+    else:
+        bots = [RandomBot(random.Random(rng.random()), items, enemies) for _ in range(args.players)]
+    
+    stats = Stats()
+    ticks = asyncio.create_task(server.run_world_ticks())
+    with quiet:
+        if args.mode == 'ssh':
+            memory, elapsed = await run_ssh(server, args, bots, stats)
+        else:
+            memory, elapsed = await run_direct(server, args, bots, stats)
+    ticks.cancel()
+    
+    latencies = sorted(stats.latencies)
+    lags = sorted(stats.lags)
+    tick = server.tick_stats
+    results = {
+        'mode': args.mode,
+        'players': args.players,
+        'seconds': round(elapsed, 3),
+        'commands': len(latencies),
+        'commands_per_sec': round(len(latencies) / elapsed, 1),
+        'errors': stats.errors,
+        'latency_ms': {name: round(percentile(latencies, fraction), 3)
+                       for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))},
+        'broadcasts': len(lags),
+        'broadcast_lag_ms': {name: round(percentile(lags, fraction), 3)
+                             for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))},
+        'memory_per_player_kb': round(memory / 1024, 1)
+    }
+    if not args.connect:  # Otherwise the world is ticking in another process
+        results.update({
+            'ticks': tick['ticks'],
+            'tick_avg_ms': round(tick['total_ms'] / tick['ticks'], 3) if tick['ticks'] else 0.0,
+            'tick_max_ms': round(tick['max_ms'], 3),
+            'tick_overruns': tick['overruns']
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the multiplayer server with simulated players')
+    parser.add_argument('--players', type=int, default=100, help='Simulated players')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load after everyone joined')
+    parser.add_argument('--think', type=float, default=0.5,
+                        help='Mean seconds between a bot\'s commands (0 = as fast as possible)')
+    parser.add_argument('--mode', choices=['direct', 'ssh'], default='direct',
+                        help='Call handle_player_command() directly, or connect over SSH')
+    parser.add_argument('--connect', default=None,
+                        help='HOST:PORT of a running server for --mode ssh (default: start one in this process)')
+    parser.add_argument('--script', default=None,
+                        help='File of commands, one per line, for scripted bots ("say" is timestamped)')
+    parser.add_argument('--config', default=WORLD_PATH, help='Config directory')
+    parser.add_argument('--tick-rate', type=float, default=1.0, help='World turns per second')
+    parser.add_argument('--sim-radius', type=int, default=None, help='Passed to the server')
+    parser.add_argument('--sprite-table', action='store_true', help='Passed to the server')
+    parser.add_argument('--seed', type=int, default=1, help='World and bot seed')
+    parser.add_argument('--json', default=None, help='Also write the results to this file')
+    parser.add_argument('--max-p99', type=float, default=None, help='Exit 1 if p99 latency (ms) is above this')
+    parser.add_argument('--verbose', action='store_true', help='Show the server output')
+    args = parser.parse_args()
+    
+    try:
+        results = asyncio.run(run(args))
+    except ImportError as e:
+        print(f"Error: {e} (the multiplayer server needs asyncssh)")
+        sys.exit(2)
+    
+    latency, lag = results['latency_ms'], results['broadcast_lag_ms']
+    print(f"{results['players']} players, {results['mode']} mode, {results['seconds']:.1f}s")
+    print(f"   Commands:   {results['commands']} ({results['commands_per_sec']:,.1f}/s), {results['errors']} errors")
+    print(f"   Latency:    p50 {latency['p50']:.2f} ms  p95 {latency['p95']:.2f} ms  "
+          f"p99 {latency['p99']:.2f} ms  max {latency['max']:.2f} ms")
+    print(f"   Broadcasts: {results['broadcasts']} delivered, lag p50 {lag['p50']:.2f} ms  "
+          f"p95 {lag['p95']:.2f} ms  p99 {lag['p99']:.2f} ms  max {lag['max']:.2f} ms")
+    print(f"   Memory:     {results['memory_per_player_kb']:.1f} KB per player"
+          + ({'direct': "", 'ssh': " (server and client side)"}[args.mode] if not args.connect else " (client side)"))
+    if 'ticks' in results:
+        print(f"   World:      {results['ticks']} ticks, avg {results['tick_avg_ms']:.2f} ms, "
+              f"max {results['tick_max_ms']:.2f} ms, {results['tick_overruns']} overran")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.max_p99 is not None and latency['p99'] > args.max_p99:
+        print(f"❌ p99 latency {latency['p99']:.2f} ms is over the {args.max_p99:g} ms limit")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark sprite AI ticks: per-sprite Python loop vs the NumPy sprite table
+
+Builds a grid world, fills it with sprites and times process_sprite_ai()
+both ways, plus the table's array step on its own.
+
+Usage: python bench_sprites.py [--sizes 10000 100000] [--ticks 20] [--grid 32]
+"""
+
+import argparse
+import os
+import random
+import time
+from game_engine_rpg import GameEngineRPG, Room
+from sprite_table import np
+
+WORLD_PATH = "config" if os.path.isdir("config") else os.path.dirname(os.path.abspath(__file__))
+
+
+def grid_rooms(side: int) -> dict:
+    """side x side rooms, each connected to its neighbours"""
+    rooms = {}
+    for y in range(side):
+        for x in range(side):
+            exits = {}
+            if y > 0:
+                exits['north'] = f"room_{x}_{y - 1}"
+            if y < side - 1:
+                exits['south'] = f"room_{x}_{y + 1}"
+            if x < side - 1:
+                exits['east'] = f"room_{x + 1}_{y}"
+            if x > 0:
+                exits['west'] = f"room_{x - 1}_{y}"
+            room_id = f"room_{x}_{y}"
+            rooms[room_id] = Room(id=room_id, name=room_id, description="", exits=exits)
+    return rooms
+
+
+def build_engine(sprite_count: int, side: int, sprite_table: bool) -> GameEngineRPG:
+    engine = GameEngineRPG(config_path=WORLD_PATH, sprite_table=sprite_table)
+    engine.rooms = grid_rooms(side)
+    engine.player_location = "room_0_0"
+    engine.reindex()
+    
+    random.seed(1)
+    room_ids = list(engine.rooms)
+    templates = list(engine.sprite_templates)
+    for _ in range(sprite_count):
+        engine.spawn_sprite(random.choice(templates), random.choice(room_ids))
+    return engine
+
+
+def time_ticks(engine: GameEngineRPG, ticks: int) -> float:
+    """Milliseconds per process_sprite_ai() call"""
+    started = time.perf_counter()
+    for _ in range(ticks):
+        engine.player_health = 100
+        engine.process_sprite_ai()
+    return (time.perf_counter() - started) * 1000 / ticks
+
+
+def time_steps(engine: GameEngineRPG, ticks: int) -> float:
+    """Milliseconds per SpriteTable.step(), i.e. without writing moves back"""
+    table = engine.sprite_table
+    rooms = [table.room_index[engine.player_location]]
+    started = time.perf_counter()
+    for _ in range(ticks):
+        table.step(rooms, engine.SPRITE_MOVE_CHANCE)
+    return (time.perf_counter() - started) * 1000 / ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sprite AI ticks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Sprite counts')
+    parser.add_argument('--ticks', type=int, default=20, help='Ticks timed per run')
+    parser.add_argument('--grid', type=int, default=32, help='World is grid x grid rooms')
+    args = parser.parse_args()
+    
+    if np is None:
+        print("Error: NumPy is not installed (pip install numpy)")
+        return
+    
+    print(f"Sprite AI, {args.grid}x{args.grid} rooms, {args.ticks} ticks each\n")
+    print(f"{'sprites':>10} {'python ms/tick':>16} {'table ms/tick':>15} {'speedup':>9} {'step only ms':>14}")
+    for size in args.sizes:
+        loop_ms = time_ticks(build_engine(size, args.grid, sprite_table=False), args.ticks)
+        engine = build_engine(size, args.grid, sprite_table=True)
+        table_ms = time_ticks(engine, args.ticks)
+        step_ms = time_steps(engine, args.ticks)
+        print(f"{size:>10} {loop_ms:>16.2f} {table_ms:>15.2f} {loop_ms / table_ms:>8.1f}x {step_ms:>14.2f}")
+    print("\nTable ticks are dominated by writing moves back to Sprite objects and the")
+    print("location index; step only is the array work itself.")
+
+
+if __name__ == "__main__":
+    main()
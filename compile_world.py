@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Compile the .ini world files into binary snapshots
+Engines reuse a snapshot while the .ini files it was built from are unchanged,
+so startup costs one file read instead of a full configparser pass.
+
+Usage: python compile_world.py [config_path]
+"""
+
+import os
+import sys
+from game_engine import GameEngine, snapshot_path
+from game_engine_rpg import GameEngineRPG
+
+
+def compile_world(config_path: str):
+    for engine_class in (GameEngine, GameEngineRPG):
+        name = engine_class.__name__
+        target = snapshot_path(config_path, name)
+        
+        # Remove any existing snapshot so the engine re-parses the .ini files
+        if os.path.exists(target):
+            os.remove(target)
+        
+        engine_class(config_path=config_path)
+        
+        if os.path.exists(target):
+            print(f"✅ {name}: {target} ({os.path.getsize(target)} bytes)")
+        else:
+            print(f"Warning: Could not write snapshot for {name} in {config_path}")
+
+
+def main():
+    config_path = sys.argv[1] if len(sys.argv) > 1 else "config"
+    if not os.path.isdir(config_path):
+        print(f"Error: Config directory not found: {config_path}")
+        sys.exit(1)
+    compile_world(config_path)
+
+
+if __name__ == "__main__":
+    main()
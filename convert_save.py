@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Convert save games between JSON (.json) and the binary format (.sav)
+
+Works for both engines' saves, including delta checkpoints: the journal
+next to a checkpoint is left alone and still applies after conversion.
+The original file is kept unless --replace is given.
+
+Usage: python convert_save.py slot1.json [more saves...] [--compression lzma] [--replace]
+       python convert_save.py slot1.sav            (back to JSON)
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+import save_format
+from storage import write_json_atomic
+
+
+def convert(path: str, compression: str = 'zlib', replace: bool = False) -> str:
+    """Convert one save to the other format; returns the new file's path"""
+    base, extension = os.path.splitext(path)
+    if extension == save_format.EXTENSION:
+        state = save_format.load(path)
+        target = f"{base}.json"
+        write_json_atomic(Path(target), state)
+    elif extension == ".json":
+        with open(path, 'r') as f:
+            state = json.load(f)
+        target = f"{base}{save_format.EXTENSION}"
+        save_format.dump(state, target, compression)
+    else:
+        raise ValueError(f"{path}: expected a .json or {save_format.EXTENSION} save")
+    
+    if replace:
+        os.remove(path)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert save games between .json and .sav')
+    parser.add_argument('saves', nargs='+', help='Save files (.json or .sav)')
+    parser.add_argument('--compression', choices=list(save_format.COMPRESSION), default='zlib',
+                        help='Compression for .sav output')
+    parser.add_argument('--replace', action='store_true', help='Delete the original after converting')
+    args = parser.parse_args()
+    
+    failed = False
+    for path in args.saves:
+        try:
+            size = os.path.getsize(path)
+            target = convert(path, args.compression, args.replace)
+        except (OSError, ValueError) as e:  # SaveFormatError and JSON errors are ValueErrors
+            print(f"Error: {e}")
+            failed = True
+            continue
+        print(f"{path} ({size} bytes) -> {target} ({os.path.getsize(target)} bytes)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
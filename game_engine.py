@@ -4,11 +4,91 @@ Matrix-based design with .ini configuration
 """
 
 import configparser
+import hashlib
+import heapq
 import json
+import os
+import pickle
 import random
 from typing import Dict, List, Set, Optional, Any
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from collections import defaultdict
+from collections.abc import MutableMapping
+from save_format import load_state, save_state
+
+
+DIRECTIONS = ['north', 'south', 'east', 'west', 'up', 'down']
+
+SNAPSHOT_VERSION = 1
+
+
+def _file_signature(path: str) -> Optional[tuple]:
+    """(mtime_ns, size) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _file_hash(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def snapshot_path(config_path: str, name: str) -> str:
+    return os.path.join(config_path, f".{name}.snapshot")
+
+
+def load_world_snapshot(config_path: str, name: str, sources: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Load a compiled world snapshot if it is still valid.
+    
+    A snapshot is valid when every source file has the recorded
+    mtime/size, or failing that, the recorded content hash. Anything
+    unreadable or stale returns None so the caller re-parses the .ini files.
+    """
+    try:
+        with open(snapshot_path(config_path, name), 'rb') as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        return None
+    
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    recorded = snapshot.get('sources', {})
+    if sorted(recorded) != sorted(sources):
+        return None
+    
+    for path in sources:
+        signature, digest = recorded[path]
+        if _file_signature(path) != signature and _file_hash(path) != digest:
+            return None
+    
+    return snapshot['data']
+
+
+def save_world_snapshot(config_path: str, name: str, sources: List[str], data: Dict[str, Any]):
+    """Write a compiled world snapshot (atomically; silently skipped if read-only)"""
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'sources': {path: (_file_signature(path), _file_hash(path)) for path in sources},
+        'data': data
+    }
+    target = snapshot_path(config_path, name)
+    temp = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(temp, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, target)
+    except OSError:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
 
 
 @dataclass
@@ -21,7 +101,15 @@ class GameObject:
     valid_verbs: Set[str] = field(default_factory=set)
     location: Optional[str] = None  # room_id or 'inventory' or object_id (container)
     state: str = "normal"
-    state_turn_count: int = 0  # How many turns in current state
+    state_entered_turn: int = 0  # Scheduler turn at which the current state began
+    
+    def __setattr__(self, key, value):
+        # Every move wakes the rules waiting for this object (see GameEngine.watch)
+        object.__setattr__(self, key, value)
+        if key == 'location':
+            scheduler = self.__dict__.get('_scheduler')
+            if scheduler is not None:
+                scheduler.wake(self.id)
     
     def get_property(self, key: str, default=None):
         return self.properties.get(key, default)
@@ -49,16 +137,179 @@ class Room:
         return self.properties.get(key, default)
 
 
+class ObjectOverlay(MutableMapping):
+    """
+    Copy-on-write view of a shared set of object templates.
+    
+    Reading (overlay[obj_id], values(), items()) returns this session's copy
+    if it has one and the shared template otherwise, so it must be treated
+    as read-only. Callers that change an object get it from writable(),
+    which copies the template into the session on first use.
+    """
+    
+    def __init__(self, base: Dict[str, GameObject]):
+        self.base = base
+        self.changed: Dict[str, GameObject] = {}
+        self.removed: Set[str] = set()
+    
+    def __getitem__(self, obj_id: str) -> GameObject:
+        obj = self.changed.get(obj_id)
+        if obj is not None:
+            return obj
+        if obj_id in self.removed:
+            raise KeyError(obj_id)
+        return self.base[obj_id]
+    
+    def writable(self, obj_id: str) -> GameObject:
+        """This session's own copy of an object, made on first use"""
+        obj = self.changed.get(obj_id)
+        if obj is not None:
+            return obj
+        
+        # Properties are mutable per object; valid_verbs are shared as-is
+        template = self[obj_id]
+        obj = replace(template, properties=dict(template.properties))
+        self.changed[obj_id] = obj
+        return obj
+    
+    def __setitem__(self, obj_id: str, obj: GameObject):
+        self.changed[obj_id] = obj
+        self.removed.discard(obj_id)
+    
+    def __delitem__(self, obj_id: str):
+        if obj_id not in self:
+            raise KeyError(obj_id)
+        self.changed.pop(obj_id, None)
+        if obj_id in self.base:
+            self.removed.add(obj_id)
+    
+    def __contains__(self, obj_id) -> bool:
+        return obj_id in self.changed or (obj_id in self.base and obj_id not in self.removed)
+    
+    def __iter__(self):
+        for obj_id in self.base:
+            if obj_id not in self.removed:
+                yield obj_id
+        for obj_id in self.changed:
+            if obj_id not in self.base:
+                yield obj_id
+    
+    def __len__(self) -> int:
+        return len(self.base) - len(self.removed) + sum(1 for obj_id in self.changed if obj_id not in self.base)
+    
+    def values(self):
+        return [self[obj_id] for obj_id in self]
+    
+    def items(self):
+        return [(obj_id, self[obj_id]) for obj_id in self]
+
+
+class TransformationScheduler:
+    """
+    Event-driven timing for transformation rules.
+    
+    Rules are indexed by (object_id, state). When an object enters a state
+    the matching rules are pushed onto a heap keyed by the turn at which
+    turns_required is met, so each turn only pops the rules that are due.
+    A due rule stays armed until it fires or the object changes state.
+    An armed rule that is only waiting on the object's room (e.g. a cold
+    room) is set aside with block() and re-armed by wake() when the object
+    moves (from GameObject.__setattr__), so idle objects in the wrong room
+    cost nothing per turn.
+    """
+    
+    def __init__(self, transformations: List[Dict[str, Any]]):
+        self.transformations = transformations
+        self.turn = 0
+        self.rules: Dict[tuple, List[int]] = defaultdict(list)  # (object_id, state or None) -> rule indexes
+        self.heap: List[tuple] = []  # (due_turn, rule_index, object_id, generation)
+        self.generation: Dict[str, int] = {}  # object_id -> bumped on every state change
+        self.armed: Dict[str, Set[int]] = {}  # object_id -> due rule indexes
+        self.blocked: Dict[str, Set[int]] = {}  # object_id -> due rules waiting for the object to move
+        self.rule_indexes = {transformation['id']: rule_index
+                             for rule_index, transformation in enumerate(transformations)}
+        
+        for rule_index, transformation in enumerate(transformations):
+            conditions = transformation['conditions']
+            if conditions.get('object_id'):
+                self.rules[(conditions['object_id'], conditions.get('state'))].append(rule_index)
+    
+    def state_age(self, obj) -> int:
+        """Turns the object has spent in its current state"""
+        return self.turn - obj.state_entered_turn
+    
+    def enter_state(self, obj):
+        """Record that obj entered its current state this turn"""
+        obj.state_entered_turn = self.turn
+        self.schedule(obj)
+    
+    def schedule(self, obj):
+        """(Re)queue the rules for obj's current state"""
+        generation = self.generation.get(obj.id, 0) + 1
+        self.generation[obj.id] = generation
+        self.armed.pop(obj.id, None)
+        self.blocked.pop(obj.id, None)
+        
+        rule_indexes = self.rules.get((obj.id, obj.state), []) + self.rules.get((obj.id, None), [])
+        for rule_index in rule_indexes:
+            turns_required = self.transformations[rule_index]['conditions'].get('turns_required', 0)
+            due = obj.state_entered_turn + turns_required
+            heapq.heappush(self.heap, (due, rule_index, obj.id, generation))
+    
+    def advance(self) -> List[tuple]:
+        """Move to the next turn and return armed (rule_index, object_id) pairs in rule order"""
+        self.turn += 1
+        while self.heap and self.heap[0][0] <= self.turn:
+            _, rule_index, obj_id, generation = heapq.heappop(self.heap)
+            if self.generation.get(obj_id) == generation:
+                self.armed.setdefault(obj_id, set()).add(rule_index)
+        
+        return sorted((rule_index, obj_id)
+                      for obj_id, rule_indexes in self.armed.items()
+                      for rule_index in rule_indexes)
+    
+    def is_armed(self, rule_index: int, obj_id: str) -> bool:
+        return rule_index in self.armed.get(obj_id, ())
+    
+    def block(self, transformation: Dict[str, Any], obj_id: str):
+        """Stop checking an armed rule until its object moves (see wake)"""
+        rule_index = self.rule_indexes[transformation['id']]
+        armed = self.armed.get(obj_id)
+        if armed is None or rule_index not in armed:
+            return
+        armed.discard(rule_index)
+        if not armed:
+            del self.armed[obj_id]
+        self.blocked.setdefault(obj_id, set()).add(rule_index)
+    
+    def wake(self, obj_id: str):
+        """The object moved: re-arm its blocked rules"""
+        rule_indexes = self.blocked.pop(obj_id, None)
+        if rule_indexes:
+            self.armed.setdefault(obj_id, set()).update(rule_indexes)
+
+
 class GameEngine:
     """
     Core game engine with matrix-based verb/object/action system
     """
     
-    def __init__(self, config_path: str = "config"):
-        self.config_path = config_path
+    # Config files and parsed attributes captured by the compiled snapshot
+    CONFIG_FILES = ['verbs.ini', 'rooms.ini', 'objects.ini', 'transformations.ini']
+    SNAPSHOT_ATTRS = ['verbs', 'verb_lookup', 'verb_alias_collisions', 'direction_map',
+                      'rooms', 'objects', 'action_matrix', 'transformations']
+    SAVE_COMPRESSION = 'zlib'  # For .sav saves: none, zlib or lzma
+    
+    def __init__(self, config_path: str = "config", template: Optional['WorldTemplate'] = None,
+                 save_format: str = 'json'):
+        self.config_path = template.config_path if template else config_path
+        self.save_format = save_format  # 'json' or 'sav' (binary, see save_format.py)
         self.rooms: Dict[str, Room] = {}
         self.objects: Dict[str, GameObject] = {}
         self.verbs: Dict[str, Dict[str, Any]] = {}  # verb_id -> {aliases, handler, etc}
+        self.verb_lookup: Dict[str, str] = {}  # verb_id or alias -> verb_id
+        self.verb_alias_collisions: List[tuple] = []  # (alias, kept_verb, ignored_verb)
+        self.direction_map: Dict[str, str] = {}  # n/north/... -> direction
         self.action_matrix: Dict[str, Set[str]] = {}  # object_id -> set of valid verb_ids
         self.transformations: List[Dict[str, Any]] = []
         
@@ -67,14 +318,52 @@ class GameEngine:
         self.turn_count: int = 0
         self.game_flags: Dict[str, Any] = {}
         
-        self.load_all_configs()
+        if template:
+            self.use_template(template)
+        else:
+            self.load_all_configs()
+        self.reset_scheduler()
+    
+    def use_template(self, template: 'WorldTemplate'):
+        """Reference a shared world, keeping only a copy-on-write overlay of objects"""
+        for attr in self.SNAPSHOT_ATTRS:
+            if attr != 'objects':
+                setattr(self, attr, getattr(template, attr))
+        self.objects = ObjectOverlay(template.objects)
+    
+    def reset_scheduler(self):
+        """Index transformation rules and queue them for every object"""
+        self.scheduler = TransformationScheduler(self.transformations)
+        for obj in self.objects.values():
+            self.scheduler.schedule(obj)
+        owned = self.objects.changed if isinstance(self.objects, ObjectOverlay) else self.objects
+        for obj in owned.values():
+            self.watch(obj)
+    
+    def watch(self, obj: GameObject):
+        """Wake obj's blocked rules in this engine's scheduler whenever it moves"""
+        obj.__dict__['_scheduler'] = self.scheduler  # Not a field: never saved or compared
+    
+    def snapshot_sources(self) -> List[str]:
+        """Files a compiled snapshot depends on: the .ini files and this module"""
+        return [os.path.join(self.config_path, name) for name in self.CONFIG_FILES] + [__file__]
     
     def load_all_configs(self):
-        """Load all configuration from .ini files"""
+        """Load all configuration, from the compiled snapshot when it is current"""
+        name = type(self).__name__
+        data = load_world_snapshot(self.config_path, name, self.snapshot_sources())
+        if data is not None:
+            for attr in self.SNAPSHOT_ATTRS:
+                setattr(self, attr, data[attr])
+            return
+        
         self.load_verbs()
         self.load_rooms()
         self.load_objects()
         self.load_transformations()
+        
+        save_world_snapshot(self.config_path, name, self.snapshot_sources(),
+                            {attr: getattr(self, attr) for attr in self.SNAPSHOT_ATTRS})
     
     def load_verbs(self):
         """Load verb definitions"""
@@ -92,6 +381,28 @@ class GameEngine:
                 'requires_object': verb_data.get('requires_object', 'true').lower() == 'true',
                 'description': verb_data.get('description', '')
             }
+        
+        self.build_verb_lookup()
+    
+    def build_verb_lookup(self):
+        """Flatten verb ids and aliases into one lookup table"""
+        self.verb_lookup = {verb_id: verb_id for verb_id in self.verbs}
+        self.verb_alias_collisions = []
+        
+        # Earlier verbs win, and a verb id always beats another verb's alias
+        for verb_id, verb_data in self.verbs.items():
+            for alias in verb_data['aliases']:
+                alias = alias.lower()
+                kept = self.verb_lookup.setdefault(alias, verb_id)
+                if kept != verb_id:
+                    self.verb_alias_collisions.append((alias, kept, verb_id))
+                    print(f"Warning: verb alias '{alias}' of '{verb_id}' already maps to '{kept}'")
+        
+        # Direction shortcuts
+        self.direction_map = {}
+        for direction in DIRECTIONS:
+            self.direction_map[direction] = direction
+            self.direction_map[direction[0]] = direction
     
     def load_rooms(self):
         """Load room definitions"""
@@ -103,7 +414,7 @@ class GameEngine:
             
             # Parse exits
             exits = {}
-            for direction in ['north', 'south', 'east', 'west', 'up', 'down']:
+            for direction in DIRECTIONS:
                 if direction in room_data:
                     exits[direction] = room_data.pop(direction)
             
@@ -214,15 +525,12 @@ class GameEngine:
         self.turn_count += 1
         messages = []
         
-        # Update state turn counts
-        for obj in self.objects.values():
-            obj.state_turn_count += 1
-        
-        # Check transformations
-        for transformation in self.transformations:
-            msg = self.check_transformation(transformation)
-            if msg:
-                messages.append(msg)
+        # Check only the transformations whose deadline has been reached
+        for rule_index, obj_id in self.scheduler.advance():
+            if self.scheduler.is_armed(rule_index, obj_id):
+                msg = self.check_transformation(self.transformations[rule_index])
+                if msg:
+                    messages.append(msg)
         
         return messages
     
@@ -235,7 +543,7 @@ class GameEngine:
         if not obj_id or obj_id not in self.objects:
             return None
         
-        obj = self.objects[obj_id]
+        obj = self.objects[obj_id]  # Copied into the session only if the rule fires
         
         # Check state
         required_state = conditions.get('state')
@@ -247,17 +555,19 @@ class GameEngine:
         if location_prop and obj.location in self.rooms:
             room = self.rooms[obj.location]
             if not room.get_property(location_prop, False):
+                self.scheduler.block(transformation, obj_id)  # Until the object moves
                 return None
         
         # Check turns
         turns_required = conditions.get('turns_required', 0)
-        if obj.state_turn_count < turns_required:
+        if self.scheduler.state_age(obj) < turns_required:
             return None
         
         # Apply transformation
         if transformation['new_state']:
+            obj = self.writable_object(obj_id)
             obj.state = transformation['new_state']
-            obj.state_turn_count = 0
+            self.scheduler.enter_state(obj)
         
         # Create new object if specified
         if transformation['new_object_id']:
@@ -275,9 +585,19 @@ class GameEngine:
                     state=template.state
                 )
                 self.objects[obj.id] = new_obj
+                self.watch(new_obj)
+                self.scheduler.enter_state(new_obj)
         
         return transformation.get('message', '')
     
+    def writable_object(self, obj_id: str) -> GameObject:
+        """An object to change: copies a shared template into the session first"""
+        if not isinstance(self.objects, ObjectOverlay):
+            return self.objects[obj_id]
+        obj = self.objects.writable(obj_id)
+        self.watch(obj)  # A fresh copy doesn't carry the session's scheduler yet
+        return obj
+    
     def parse_command(self, command: str) -> tuple[str, Optional[str], Optional[str]]:
         """Parse command into verb and object(s)"""
         parts = command.lower().strip().split()
@@ -321,18 +641,7 @@ class GameEngine:
     
     def get_verb_handler(self, verb: str) -> Optional[str]:
         """Map verb to handler function"""
-        verb = verb.lower()
-        
-        # Direct match
-        if verb in self.verbs:
-            return verb
-        
-        # Check aliases
-        for verb_id, verb_data in self.verbs.items():
-            if verb in verb_data['aliases']:
-                return verb_id
-        
-        return None
+        return self.verb_lookup.get(verb.lower())
     
     def can_perform_action(self, verb_id: str, obj: GameObject) -> bool:
         """Check action matrix if verb can be performed on object"""
@@ -350,15 +659,9 @@ class GameEngine:
             return f"I don't know how to '{verb}'."
         
         # Handle directional movement specially
-        direction_map = {
-            'n': 'north', 's': 'south', 'e': 'east', 'w': 'west',
-            'u': 'up', 'd': 'down',
-            'north': 'north', 'south': 'south', 'east': 'east', 
-            'west': 'west', 'up': 'up', 'down': 'down'
-        }
-        
-        if verb.lower() in direction_map:
-            return self.go(direction_map[verb.lower()])
+        direction = self.direction_map.get(verb.lower())
+        if direction:
+            return self.go(direction)
         
         # Route to appropriate handler
         handler_map = {
@@ -436,6 +739,7 @@ class GameEngine:
             return "You already have that."
         
         self.inventory.add(obj.id)
+        obj = self.writable_object(obj.id)
         obj.location = 'inventory'
         return f"Taken: {obj.name}"
     
@@ -445,6 +749,7 @@ class GameEngine:
             return "You don't have that."
         
         self.inventory.remove(obj.id)
+        obj = self.writable_object(obj.id)
         obj.location = self.player_location
         return f"Dropped: {obj.name}"
     
@@ -483,6 +788,7 @@ class GameEngine:
             return "You need to be holding it first."
         
         self.inventory.remove(obj.id)
+        obj = self.writable_object(obj.id)
         obj.location = container.id
         return f"You put the {obj.name} in the {container.name}."
     
@@ -521,23 +827,20 @@ class GameEngine:
                 obj_id: {
                     'location': obj.location,
                     'state': obj.state,
-                    'state_turn_count': obj.state_turn_count,
+                    'state_turn_count': self.scheduler.state_age(obj),
                     'properties': obj.properties
                 }
                 for obj_id, obj in self.objects.items()
             }
         }
         
-        with open(f"{filename}.json", 'w') as f:
-            json.dump(state, f, indent=2)
-        
-        return f"Game saved to {filename}.json"
+        path = save_state(filename, state, self.save_format, self.SAVE_COMPRESSION)
+        return f"Game saved to {path}"
     
     def load_game(self, filename: str) -> str:
-        """Load game state"""
+        """Load game state (.json or .sav)"""
         try:
-            with open(f"{filename}.json", 'r') as f:
-                state = json.load(f)
+            state, path = load_state(filename)
             
             self.player_location = state['player_location']
             self.inventory = set(state['inventory'])
@@ -547,14 +850,41 @@ class GameEngine:
             # Restore object states
             for obj_id, obj_state in state['objects'].items():
                 if obj_id in self.objects:
-                    obj = self.objects[obj_id]
+                    obj = self.writable_object(obj_id)
                     obj.location = obj_state['location']
                     obj.state = obj_state['state']
-                    obj.state_turn_count = obj_state['state_turn_count']
+                    obj.state_entered_turn = self.scheduler.turn - obj_state['state_turn_count']
                     obj.properties = obj_state['properties']
+                    self.scheduler.schedule(obj)
             
-            return f"Game loaded from {filename}.json\n\n" + self.look()
-        except FileNotFoundError:
-            return f"Save file {filename}.json not found."
+            return f"Game loaded from {path}\n\n" + self.look()
+        except FileNotFoundError as e:
+            return f"Save file {e.filename or filename} not found."  # The path(s) actually tried
         except Exception as e:
             return f"Error loading game: {e}"
+
+
+class WorldTemplate:
+    """
+    Immutable world definition shared by session engines
+    Rooms, verbs, transformations and object templates are loaded once;
+    each GameEngine(template=...) keeps only the objects it changes.
+    """
+    
+    def __init__(self, config_path: str = "config"):
+        self.config_path = config_path
+        engine = GameEngine(config_path=config_path)
+        for attr in GameEngine.SNAPSHOT_ATTRS:
+            setattr(self, attr, getattr(engine, attr))
+        for obj in self.objects.values():
+            obj.__dict__.pop('_scheduler', None)  # Sessions watch their own copies
+
+
+_world_templates: Dict[str, WorldTemplate] = {}
+
+
+def get_world_template(config_path: str = "config") -> WorldTemplate:
+    """Shared WorldTemplate for a config directory, loaded on first use"""
+    if config_path not in _world_templates:
+        _world_templates[config_path] = WorldTemplate(config_path)
+    return _world_templates[config_path]
@@ -5,13 +5,24 @@ NOW WITH: Combat, Health, Sprites/NPCs, Multiplayer Support
 """
 
 import configparser
+import itertools
 import json
 import random
 import os
+from array import array
 from pathlib import Path
 from typing import Dict, List, Set, Optional, Any
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import defaultdict, deque
+import game_engine
+from game_engine import TransformationScheduler, load_world_snapshot, save_world_snapshot
+from sprite_table import SpriteTable
+from player_store import PlayerStore
+from storage import Storage, open_storage
+from save_format import FORMATS, load_state, save_state
+
+
+DIRECTIONS = ['north', 'south', 'east', 'west', 'up', 'down']
 
 
 @dataclass
@@ -24,13 +35,25 @@ class GameObject:
     valid_verbs: Set[str] = field(default_factory=set)
     location: Optional[str] = None
     state: str = "normal"
-    state_turn_count: int = 0
+    state_entered_turn: int = 0  # Scheduler turn at which the current state began
+    
+    def __setattr__(self, key, value):
+        # Keep the engine's location index in sync with every move, and tell it what changed
+        index = self.__dict__.get('_index')
+        if index is not None and key == 'location':
+            index.moved(self, self.__dict__.get('location'), value)
+        object.__setattr__(self, key, value)
+        if index is not None:
+            index.touch(self)
     
     def get_property(self, key: str, default=None):
         return self.properties.get(key, default)
     
     def set_property(self, key: str, value):
         self.properties[key] = value
+        index = self.__dict__.get('_index')
+        if index is not None:
+            index.touch(self)
     
     def can_contain(self) -> bool:
         return self.get_property('container', False)
@@ -60,6 +83,13 @@ class Sprite(GameObject):
     
     def is_hostile(self) -> bool:
         return self.aggression > 0.5
+    
+    def __setattr__(self, key, value):
+        super().__setattr__(key, value)
+        # Keep this sprite's SpriteTable row (if any) in sync
+        table = self.__dict__.get('_table')
+        if table is not None and key in table.COLUMNS:
+            table.update(self.__dict__['_row'], key, value)
 
 
 @dataclass
@@ -75,6 +105,392 @@ class Room:
         return self.properties.get(key, default)
 
 
+@dataclass
+class PlayerContext:
+    """One player's state; engine commands act on the context they are given"""
+    name: str
+    location: str = ""
+    inventory: Set[str] = field(default_factory=set)
+    health: int = 100
+    max_health: int = 100
+    kills: int = 0
+    deaths: int = 0
+    potions_consumed: int = 0
+    in_combat: bool = False
+    combat_target: Optional[str] = None
+    
+    def __setattr__(self, key, value):
+        # Keep the engine's location index in sync with moves and renames
+        index = self.__dict__.get('_index')
+        if index is not None:
+            if key == 'location':
+                index.move_player(self.name, value)
+            elif key == 'name':
+                index.discard_player(self)
+                object.__setattr__(self, key, value)
+                index.add_player(self)
+                return
+        object.__setattr__(self, key, value)
+
+
+class PlayerField:
+    """Engine attribute backed by a field of the engine's own PlayerContext"""
+    
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+    
+    def __get__(self, engine, owner=None):
+        if engine is None:
+            return self
+        return getattr(engine.player, self.field_name)
+    
+    def __set__(self, engine, value):
+        setattr(engine.player, self.field_name, value)
+
+
+class LocationIndex:
+    """
+    Maintained location -> contents index.
+    
+    Buckets object ids, sprite ids and player names by location so room
+    queries cost O(items in room) instead of O(world size). Objects and
+    sprites report their own moves through GameObject.__setattr__ once
+    they are tracked, and player contexts do the same once added with
+    add_player(); bare player names can be moved with move_player().
+    Buckets are insertion-ordered dicts so listings stay deterministic.
+    
+    Objects and sprites are also indexed by name token per location:
+    their id, full name and every prefix of every word in the name. Name
+    lookups then only touch candidates that are in scope and match.
+    
+    Object moves also wake the transformation rules that were waiting for
+    the object to change rooms (TransformationScheduler.block/wake).
+    
+    Every change to a tracked object or sprite (and adding or discarding
+    one) marks its id as changed until take_changes(), so saves only
+    serialise what changed (see GameEngineRPG.take_changes).
+    """
+    
+    def __init__(self):
+        self.objects: Dict[str, Dict[str, None]] = {}
+        self.sprites: Dict[str, Dict[str, None]] = {}
+        self.players: Dict[str, Dict[str, None]] = {}
+        self.player_locations: Dict[str, str] = {}
+        self.contexts: Dict[str, PlayerContext] = {}  # Tracked player contexts by name
+        self.names: Dict[tuple, Dict[str, None]] = {}  # (kind, location, token) -> ids
+        self.name_keys: Dict[tuple, tuple] = {}  # (kind, id) -> (name, id, tokens)
+        self.scheduler: Optional[TransformationScheduler] = None  # Set by the engine
+        self.changed_objects: Set[str] = set()  # Ids changed since take_changes()
+        self.changed_sprites: Set[str] = set()
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(text.lower().split())
+    
+    @classmethod
+    def tokens_for(cls, entity: GameObject) -> tuple:
+        """Normalized name, normalized id and lookup tokens for an entity"""
+        name = cls.normalize(entity.name)
+        entity_id = entity.id.lower()
+        tokens = {name, entity_id}
+        for word in name.split():
+            for end in range(1, len(word) + 1):
+                tokens.add(word[:end])
+        return name, entity_id, tokens
+    
+    @staticmethod
+    def _kind(entity: GameObject) -> str:
+        return 'sprite' if isinstance(entity, Sprite) else 'object'
+    
+    def _add_names(self, entity: GameObject, location):
+        key = (self._kind(entity), entity.id)
+        if key not in self.name_keys:
+            self.name_keys[key] = self.tokens_for(entity)
+        for token in self.name_keys[key][2]:
+            self._add(self.names, (key[0], location, token), entity.id)
+    
+    def _remove_names(self, entity: GameObject, location):
+        key = (self._kind(entity), entity.id)
+        if key in self.name_keys:
+            for token in self.name_keys[key][2]:
+                self._remove(self.names, (key[0], location, token), entity.id)
+    
+    def _bucket(self, entity: GameObject) -> Dict[str, Dict[str, None]]:
+        return self.sprites if isinstance(entity, Sprite) else self.objects
+    
+    @staticmethod
+    def _add(bucket: Dict[str, Dict[str, None]], location, key: str):
+        bucket.setdefault(location, {})[key] = None
+    
+    @staticmethod
+    def _remove(bucket: Dict[str, Dict[str, None]], location, key: str):
+        members = bucket.get(location)
+        if members is not None:
+            members.pop(key, None)
+            if not members:
+                del bucket[location]
+    
+    def clear(self):
+        """Forget everything but the changed ids (entities stay tracked until re-added)"""
+        self.objects.clear()
+        self.sprites.clear()
+        self.players.clear()
+        self.player_locations.clear()
+        self.contexts.clear()
+        self.names.clear()
+        self.name_keys.clear()
+    
+    def add(self, entity: GameObject):
+        """Start tracking an object or sprite"""
+        object.__setattr__(entity, '_index', self)
+        self._add(self._bucket(entity), entity.location, entity.id)
+        self._add_names(entity, entity.location)
+        self.touch(entity)
+    
+    def discard(self, entity: GameObject):
+        """Stop tracking an object or sprite"""
+        if entity.__dict__.get('_index') is self:
+            del entity.__dict__['_index']
+        self._remove(self._bucket(entity), entity.location, entity.id)
+        self._remove_names(entity, entity.location)
+        self.name_keys.pop((self._kind(entity), entity.id), None)
+        self.touch(entity)
+    
+    def touch(self, entity: GameObject):
+        """Called by GameObject when anything about it changes"""
+        (self.changed_sprites if isinstance(entity, Sprite) else self.changed_objects).add(entity.id)
+    
+    def take_changes(self) -> tuple:
+        """(object ids, sprite ids) changed since the last call"""
+        changes = self.changed_objects, self.changed_sprites
+        self.changed_objects, self.changed_sprites = set(), set()
+        return changes
+    
+    def moved(self, entity: GameObject, old_location, new_location):
+        """Called by GameObject when its location changes"""
+        if old_location == new_location:
+            return
+        bucket = self._bucket(entity)
+        self._remove(bucket, old_location, entity.id)
+        self._add(bucket, new_location, entity.id)
+        self._remove_names(entity, old_location)
+        self._add_names(entity, new_location)
+        if self.scheduler is not None:
+            self.scheduler.wake(entity.id)
+    
+    def move_player(self, player_name: str, location: str):
+        """Place (or move) a player"""
+        old_location = self.player_locations.get(player_name)
+        if old_location is not None:
+            self._remove(self.players, old_location, player_name)
+        self.player_locations[player_name] = location
+        self._add(self.players, location, player_name)
+    
+    def remove_player(self, player_name: str):
+        """Forget a player"""
+        location = self.player_locations.pop(player_name, None)
+        if location is not None:
+            self._remove(self.players, location, player_name)
+    
+    def add_player(self, player: PlayerContext):
+        """Start tracking a player context"""
+        object.__setattr__(player, '_index', self)
+        self.contexts[player.name] = player
+        self.move_player(player.name, player.location)
+    
+    def discard_player(self, player: PlayerContext):
+        """Stop tracking a player context"""
+        if player.__dict__.get('_index') is self:
+            del player.__dict__['_index']
+        if self.contexts.get(player.name) is player:
+            del self.contexts[player.name]
+            self.remove_player(player.name)
+    
+    def objects_at(self, location) -> List[str]:
+        return list(self.objects.get(location, ()))
+    
+    def sprites_at(self, location) -> List[str]:
+        return list(self.sprites.get(location, ()))
+    
+    def players_at(self, location) -> List[str]:
+        return list(self.players.get(location, ()))
+    
+    def match(self, kind: str, location, query: str,
+              allowed: Optional[Set[str]] = None) -> List[str]:
+        """
+        Ids of the best matches for query at location, sorted by id.
+        
+        Ranking: exact name or id, then whole words of the name, then a
+        prefix starting at a word boundary ("sw" finds "rusty sword").
+        """
+        query = self.normalize(query)
+        if not query:
+            return []
+        
+        candidates = dict(self.names.get((kind, location, query), {}))
+        candidates.update(self.names.get((kind, location, query.split()[0]), {}))
+        
+        best_rank = None
+        best: List[str] = []
+        for entity_id in candidates:
+            if allowed is not None and entity_id not in allowed:
+                continue
+            name, norm_id, _ = self.name_keys[(kind, entity_id)]
+            if query == name or query == norm_id:
+                rank = 0
+            elif f" {query} " in f" {name} ":
+                rank = 1
+            elif f" {name}".find(f" {query}") >= 0:
+                rank = 2
+            else:
+                continue
+            if best_rank is None or rank < best_rank:
+                best_rank, best = rank, [entity_id]
+            elif rank == best_rank:
+                best.append(entity_id)
+        
+        return sorted(best)
+
+
+class RoomGraph:
+    """
+    Rooms compiled to integer ids, with exits in CSR (compressed sparse row)
+    form so walking the map never touches the Room dicts:
+      targets[offsets[i]:offsets[i + 1]]     - room ids behind room i's exits
+      directions[offsets[i]:offsets[i + 1]]  - the matching direction names
+    Exits to rooms that don't exist are left out and listed in dangling.
+    
+    BFS tables (distance and first exit from a source room) are built on
+    first use and cached; build a new graph when the rooms change.
+    """
+    
+    def __init__(self, rooms: Dict[str, Room]):
+        self.room_ids: List[str] = list(rooms)
+        self.index: Dict[str, int] = {room_id: i for i, room_id in enumerate(self.room_ids)}
+        self.offsets = array('i', [0])
+        self.targets = array('i')
+        self.directions: List[str] = []
+        self.dangling: List[tuple] = []  # (room_id, direction, missing target)
+        for room_id, room in rooms.items():
+            for direction, target in room.exits.items():
+                if target in self.index:
+                    self.targets.append(self.index[target])
+                    self.directions.append(direction)
+                else:
+                    self.dangling.append((room_id, direction, target))
+            self.offsets.append(len(self.targets))
+        # The same rows as tuples: iterating these is what BFS loops do fastest in Python
+        self.neighbors: List[tuple] = [tuple(self.targets[self.offsets[i]:self.offsets[i + 1]])
+                                       for i in range(len(self.room_ids))]
+        self.room_exits: Dict[str, tuple] = {  # room_id -> ((direction, room_id), ...)
+            room_id: tuple((self.directions[k], self.room_ids[self.targets[k]])
+                           for k in range(self.offsets[i], self.offsets[i + 1]))
+            for i, room_id in enumerate(self.room_ids)}
+        self.bfs_cache: Dict[int, tuple] = {}
+    
+    def __len__(self):
+        return len(self.room_ids)
+    
+    def exits(self, room_id: str) -> List[tuple]:
+        """(direction, room_id) for each valid exit of a room"""
+        return list(self.room_exits.get(room_id, ()))
+    
+    def random_exit(self, room_id: str, rng=random) -> Optional[tuple]:
+        """A random (direction, room_id) exit, or None for a dead end"""
+        exits = self.room_exits.get(room_id)
+        return rng.choice(exits) if exits else None
+    
+    def bfs(self, source: int) -> tuple:
+        """
+        (distance, first exit) tables for a source room id, cached.
+        distance[i] is -1 for rooms that can't be reached; first_exit[i] is
+        the index into targets/directions of the exit to take from source.
+        """
+        tables = self.bfs_cache.get(source)
+        if tables is None:
+            distance = array('i', [-1]) * len(self.room_ids)
+            first_exit = array('i', [-1]) * len(self.room_ids)
+            distance[source] = 0
+            frontier = [source]
+            while frontier:
+                next_frontier = []
+                for room in frontier:
+                    for k in range(self.offsets[room], self.offsets[room + 1]):
+                        target = self.targets[k]
+                        if distance[target] < 0:
+                            distance[target] = distance[room] + 1
+                            first_exit[target] = k if room == source else first_exit[room]
+                            next_frontier.append(target)
+                frontier = next_frontier
+            tables = self.bfs_cache[source] = (distance, first_exit)
+        return tables
+    
+    def distance(self, start: str, goal: str) -> Optional[int]:
+        """Fewest exits from start to goal (None if unreachable)"""
+        if start not in self.index or goal not in self.index:
+            return None
+        steps = self.bfs(self.index[start])[0][self.index[goal]]
+        return steps if steps >= 0 else None
+    
+    def next_step(self, start: str, goal: str) -> Optional[tuple]:
+        """First (direction, room_id) on a shortest path from start to goal"""
+        if start not in self.index or goal not in self.index or start == goal:
+            return None
+        k = self.bfs(self.index[start])[1][self.index[goal]]
+        if k < 0:
+            return None
+        return self.directions[k], self.room_ids[self.targets[k]]
+    
+    def within(self, centers, radius: int) -> List[str]:
+        """Rooms at most radius exits from any of the center rooms, nearest first"""
+        neighbors = self.neighbors
+        seen = bytearray(len(self.room_ids))
+        order = []
+        for room_id in sorted(centers):
+            i = self.index.get(room_id)
+            if i is not None and not seen[i]:
+                seen[i] = 1
+                order.append(i)
+        frontier = list(order)
+        for _ in range(radius):
+            next_frontier = []
+            for room in frontier:
+                for target in neighbors[room]:
+                    if not seen[target]:
+                        seen[target] = 1
+                        next_frontier.append(target)
+            if not next_frontier:
+                break
+            order.extend(next_frontier)
+            frontier = next_frontier
+        room_ids = self.room_ids
+        return [room_ids[i] for i in order]
+    
+    def unreachable_from(self, room_id: str) -> List[str]:
+        """Rooms that no chain of exits leads to from room_id"""
+        distance = self.bfs(self.index[room_id])[0]
+        return [self.room_ids[i] for i, steps in enumerate(distance) if steps < 0]
+    
+    def components(self) -> List[List[str]]:
+        """Groups of rooms connected when exits are followed either way, largest first"""
+        parent = list(range(len(self.room_ids)))
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        for room, targets in enumerate(self.neighbors):
+            for target in targets:
+                parent[find(room)] = find(target)
+        
+        groups: Dict[int, List[str]] = {}
+        for i, room_id in enumerate(self.room_ids):
+            groups.setdefault(find(i), []).append(room_id)
+        return sorted(groups.values(), key=len, reverse=True)
+
+
 class GameEngineRPG:
     """
     Enhanced game engine with RPG features:
@@ -85,35 +501,89 @@ class GameEngineRPG:
     - Multiplayer file structure
     """
     
+    # Config files and parsed attributes captured by the compiled snapshot
+    CONFIG_FILES = ['verbs.ini', 'rooms.ini', 'objects.ini', 'sprites.ini',
+                    'transformations.ini', 'taunts.ini']
+    SNAPSHOT_ATTRS = ['verbs', 'verb_lookup', 'verb_alias_collisions', 'direction_map',
+                      'rooms', 'objects', 'action_matrix', 'sprite_templates',
+                      'transformations', 'taunts']
+    
+    # The engine's own player, for single-player callers that use these directly
+    player_name = PlayerField('name')
+    player_location = PlayerField('location')
+    inventory = PlayerField('inventory')
+    player_health = PlayerField('health')
+    player_max_health = PlayerField('max_health')
+    kills = PlayerField('kills')
+    deaths = PlayerField('deaths')
+    potions_consumed = PlayerField('potions_consumed')
+    in_combat = PlayerField('in_combat')
+    combat_target = PlayerField('combat_target')
+    
+    SPRITE_MOVE_CHANCE = 0.2  # Per turn, for sprites away from the player
+    MAX_SPRITES_PER_ROOM = 3  # Spawn cap per room (rooms.ini max_sprites overrides)
+    SPRITE_POOL_SIZE = 64  # Removed sprites kept around for reuse
+    SIM_FAST_FORWARD_CAP = 64  # Skipped turns replayed for a sprite that wakes up
+    JOURNAL_COMPACT_ENTRIES = 16  # Journal entries before save_game() writes a fresh checkpoint
+    SAVE_COMPRESSION = 'zlib'  # For .sav checkpoints: none, zlib or lzma
+    
     def __init__(self, config_path: str = "config", player_name: str = "Player", 
-                 multiplayer_root: Optional[str] = None):
+                 multiplayer_root: Optional[str] = None, sim_radius: Optional[int] = None,
+                 sprite_table: bool = False, save_interval: float = 5.0, storage: str = 'json',
+                 save_format: str = 'json', seed: Optional[int] = None):
         self.config_path = config_path
-        self.player_name = player_name
+        
+        # All of the world's randomness comes from one seeded generator, so a
+        # session can be replayed exactly (see command_journal.py)
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.save_format = save_format  # Checkpoint format: 'json' or 'sav' (binary, see save_format.py)
         self.multiplayer_root = Path(multiplayer_root) if multiplayer_root else None
         
+        # Multiplayer state goes to a storage backend ('json' files or 'sqlite', see
+        # storage.py); player saves are written behind every save_interval seconds
+        self.storage_backend = storage
+        self.save_interval = save_interval
+        self.storage: Optional[Storage] = None
+        self.player_store: Optional[PlayerStore] = None
+        
+        # Area of interest: with a radius, only sprites within that many exits of
+        # a player are simulated every turn (see sprites_to_simulate)
+        self.sim_radius = sim_radius
+        self.sim_far_batch = 16  # Far-away sprites caught up per turn
+        self.sim_turns: Dict[str, int] = {}  # sprite id -> last turn it was simulated
+        self.sim_queue = deque()  # Round-robin order for catching up far sprites
+        self.sim_stats = {'simulated': 0, 'fast_forwarded': 0}
+        
+        # Optional NumPy sprite table for batched AI (see sprite_table.py)
+        self.use_sprite_table = sprite_table
+        self.sprite_table: Optional[SpriteTable] = None
+        
         # World data
         self.rooms: Dict[str, Room] = {}
         self.objects: Dict[str, GameObject] = {}
         self.sprites: Dict[str, Sprite] = {}  # Active sprites in world
+        self.sprite_population: Dict[str, int] = defaultdict(int)  # template -> live sprites
+        self.sprite_pool: List[Sprite] = []  # Removed sprites, recycled by spawn_sprite
+        self.sprite_serial = itertools.count(1)  # Sprite ids are never reused
         self.sprite_templates: Dict[str, Dict] = {}  # Templates for spawning
         self.verbs: Dict[str, Dict[str, Any]] = {}
+        self.verb_lookup: Dict[str, str] = {}  # verb_id or alias -> verb_id
+        self.verb_alias_collisions: List[tuple] = []  # (alias, kept_verb, ignored_verb)
+        self.direction_map: Dict[str, str] = {}  # n/north/... -> direction
         self.action_matrix: Dict[str, Set[str]] = {}
         self.transformations: List[Dict[str, Any]] = []
+        self.index = LocationIndex()  # location -> objects/sprites/players
+        self.room_graph = RoomGraph({})  # Compiled exits, rebuilt by reindex()
         
-        # Player state
-        self.player_location: str = ""
-        self.inventory: Set[str] = set()
-        self.player_health: int = 100
-        self.player_max_health: int = 100
+        # Player state (multiplayer servers pass their own contexts to commands)
+        self.player = PlayerContext(name=player_name)
+        self.index.add_player(self.player)
         self.turn_count: int = 0
         self.game_flags: Dict[str, Any] = {}
-        self.in_combat: bool = False
-        self.combat_target: Optional[str] = None
-        
-        # Stats
-        self.kills: int = 0
-        self.deaths: int = 0
-        self.potions_consumed: int = 0
+        self.save_journals: Dict[str, Dict[str, Any]] = {}  # save file -> generation and entries (see save_game)
+        self.change_sets: Dict[tuple, tuple] = {}  # Writer -> (object ids, sprite ids) changed since it wrote
+        self.modified_objects: Set[str] = set()  # Objects that may differ from baseline_objects
         
         # Taunt system
         self.taunts = {
@@ -125,11 +595,66 @@ class GameEngineRPG:
         }
         
         self.load_all_configs()
+        self.baseline_objects = {obj_id: self.record(self.object_record(obj))  # Delta saves diff against these
+                                 for obj_id, obj in self.objects.items()}
+        self.reindex()
+        self.check_room_graph()
+        self.reset_scheduler()
         
         # Setup multiplayer if enabled
         if self.multiplayer_root:
             self.setup_multiplayer_files()
     
+    def reindex(self):
+        """Rebuild the location index from the current objects and sprites"""
+        players = list(self.index.contexts.values())  # Includes multiplayer contexts
+        changes = self.index.take_changes()  # Re-adding isn't a change
+        self.room_graph = RoomGraph(self.rooms)
+        self.index.clear()
+        for obj in self.objects.values():
+            self.index.add(obj)
+        for sprite in self.sprites.values():
+            self.index.add(sprite)
+        self.index.changed_objects, self.index.changed_sprites = changes
+        for player in players:
+            self.index.add_player(player)
+        self.sim_queue = deque(self.sprites)
+        self.sim_turns = dict.fromkeys(self.sprites, self.turn_count)
+        self.sprite_population.clear()
+        for sprite in self.sprites.values():
+            self.sprite_population[sprite.properties.get('template')] += 1
+        
+        if self.use_sprite_table:
+            try:
+                self.sprite_table = SpriteTable(self.room_graph, capacity=max(1024, 2 * len(self.sprites)),
+                                                seed=self.rng.getrandbits(64))
+            except ImportError as e:
+                print(f"Warning: {e} - using the per-sprite AI loop")
+                self.use_sprite_table = False
+            else:
+                for sprite in self.sprites.values():
+                    self.sprite_table.add(sprite)
+    
+    def check_room_graph(self):
+        """Warn about exits to missing rooms and rooms the start can't reach"""
+        graph = self.room_graph
+        for room_id, direction, target in graph.dangling:
+            print(f"Warning: exit '{direction}' of room '{room_id}' leads to unknown room '{target}'")
+        
+        start = next((room_id for room_id, room in self.rooms.items() if room.get_property('start', False)),
+                     next(iter(self.rooms), None))
+        if start is not None:
+            unreachable = graph.unreachable_from(start)
+            if unreachable:
+                print(f"Warning: rooms unreachable from '{start}': {', '.join(unreachable)}")
+    
+    def reset_scheduler(self):
+        """Index transformation rules and queue them for every object"""
+        self.scheduler = TransformationScheduler(self.transformations)
+        self.index.scheduler = self.scheduler
+        for obj in self.objects.values():
+            self.scheduler.schedule(obj)
+    
     def setup_multiplayer_files(self):
         """Create multiplayer directory structure"""
         if not self.multiplayer_root:
@@ -139,24 +664,32 @@ class GameEngineRPG:
         (self.multiplayer_root / "world").mkdir(parents=True, exist_ok=True)
         (self.multiplayer_root / "players" / self.player_name).mkdir(parents=True, exist_ok=True)
         
-        # Initialize world state if it doesn't exist
-        world_state_file = self.multiplayer_root / "world" / "world_state.json"
-        if not world_state_file.exists():
-            with open(world_state_file, 'w') as f:
-                json.dump({
-                    'active_sprites': {},
-                    'dynamic_objects': {},
-                    'turn_count': 0
-                }, f, indent=2)
+        self.storage = open_storage(self.storage_backend, self.multiplayer_root)
+        self.player_store = PlayerStore(self.storage, self.save_interval)
+    
+    def snapshot_sources(self) -> List[str]:
+        """Files a compiled snapshot depends on: the .ini files and the engine modules"""
+        return ([os.path.join(self.config_path, name) for name in self.CONFIG_FILES] +
+                [__file__, game_engine.__file__])
     
     def load_all_configs(self):
-        """Load all configuration from .ini files"""
+        """Load all configuration, from the compiled snapshot when it is current"""
+        name = type(self).__name__
+        data = load_world_snapshot(self.config_path, name, self.snapshot_sources())
+        if data is not None:
+            for attr in self.SNAPSHOT_ATTRS:
+                setattr(self, attr, data[attr])
+            return
+        
         self.load_verbs()
         self.load_rooms()
         self.load_objects()
         self.load_sprites()
         self.load_transformations()
         self.load_taunts()  # Load NPC taunt system
+        
+        save_world_snapshot(self.config_path, name, self.snapshot_sources(),
+                            {attr: getattr(self, attr) for attr in self.SNAPSHOT_ATTRS})
     
     def load_sprites(self):
         """Load sprite templates"""
@@ -181,6 +714,7 @@ class GameEngineRPG:
                 'ai_behavior': sprite_data.get('ai_behavior', 'passive'),
                 'can_pickup': sprite_data.get('can_pickup', 'false').lower() == 'true',
                 'spawn_chance': float(sprite_data.get('spawn_chance', 0.05)),
+                'max_population': int(sprite_data.get('max_population', 5)),
                 'valid_verbs': set(v.strip() for v in sprite_data.get('valid_verbs', '').split(',') if v.strip())
             }
     
@@ -200,6 +734,28 @@ class GameEngineRPG:
                 'requires_object': verb_data.get('requires_object', 'true').lower() == 'true',
                 'description': verb_data.get('description', '')
             }
+        
+        self.build_verb_lookup()
+    
+    def build_verb_lookup(self):
+        """Flatten verb ids and aliases into one lookup table"""
+        self.verb_lookup = {verb_id: verb_id for verb_id in self.verbs}
+        self.verb_alias_collisions = []
+        
+        # Earlier verbs win, and a verb id always beats another verb's alias
+        for verb_id, verb_data in self.verbs.items():
+            for alias in verb_data['aliases']:
+                alias = alias.lower()
+                kept = self.verb_lookup.setdefault(alias, verb_id)
+                if kept != verb_id:
+                    self.verb_alias_collisions.append((alias, kept, verb_id))
+                    print(f"Warning: verb alias '{alias}' of '{verb_id}' already maps to '{kept}'")
+        
+        # Direction shortcuts
+        self.direction_map = {}
+        for direction in DIRECTIONS:
+            self.direction_map[direction] = direction
+            self.direction_map[direction[0]] = direction
     
     def load_rooms(self):
         """Load room definitions"""
@@ -211,7 +767,7 @@ class GameEngineRPG:
             
             # Parse exits
             exits = {}
-            for direction in ['north', 'south', 'east', 'west', 'up', 'down']:
+            for direction in DIRECTIONS:
                 if direction in room_data:
                     exits[direction] = room_data.pop(direction)
             
@@ -343,27 +899,27 @@ class GameEngineRPG:
         
         # Check if we should taunt at all
         taunt_chance = self.taunts['settings'].get('taunt_chance', 0.4)
-        if random.random() > taunt_chance:
+        if self.rng.random() > taunt_chance:
             return ""
         
         # Try character-specific taunt first
         sprite_type = sprite.get_property('ai_behavior', 'hostile')
         special_chance = self.taunts['settings'].get('special_taunt_chance', 0.6)
         
-        if sprite_type in self.taunts['special'] and random.random() < special_chance:
-            taunt_text = random.choice(self.taunts['special'][sprite_type])
+        if sprite_type in self.taunts['special'] and self.rng.random() < special_chance:
+            taunt_text = self.rng.choice(self.taunts['special'][sprite_type])
             return f'[TAUNT] The {sprite.name} snarls: "{taunt_text}"'
         
         # Generate generic taunt from matrix
-        addressee = random.choice(self.taunts['addressees'])
-        insult = random.choice(self.taunts['insults'])
-        threat = random.choice(self.taunts['threats'])
+        addressee = self.rng.choice(self.taunts['addressees'])
+        insult = self.rng.choice(self.taunts['insults'])
+        threat = self.rng.choice(self.taunts['threats'])
         
         # Optional fear word (30% chance)
         fear = ""
         fear_words = self.taunts['settings'].get('fear_words', [])
-        if fear_words and random.random() < 0.3:
-            fear = f" {random.choice(fear_words)}"
+        if fear_words and self.rng.random() < 0.3:
+            fear = f" {self.rng.choice(fear_words)}"
         
         return f'[TAUNT] The {sprite.name} snarls: "{addressee.capitalize()}, you are {insult}! {threat}!"{fear}'
     
@@ -381,8 +937,9 @@ class GameEngineRPG:
         self.turn_count = 0
         self.player_health = self.player_max_health
         
-        # Load player state if multiplayer
+        # Load the shared world and player state if multiplayer
         if self.multiplayer_root:
+            self.load_world_state()
             self.load_player_state()
         
         return self.look()
@@ -393,20 +950,24 @@ class GameEngineRPG:
             return None
         
         template = self.sprite_templates[template_name]
-        sprite_id = f"{template_name}_{random.randint(1000, 9999)}"
+        sprite_id = f"{template_name}_{next(self.sprite_serial)}"
+        while sprite_id in self.sprites:  # Ids restored from a save
+            sprite_id = f"{template_name}_{next(self.sprite_serial)}"
         
-        # Create sprite from template
-        sprite = Sprite(
+        fields = dict(
             id=sprite_id,
             name=template['name'],
             description=template['description'],
             properties={
                 'type': 'sprite',
+                'template': template_name,
                 'ai_behavior': template['ai_behavior'],
                 'can_pickup': template['can_pickup']
             },
             valid_verbs=template['valid_verbs'],
             location=location,
+            state="normal",
+            state_entered_turn=0,
             health=template['health'],
             max_health=template['health'],
             damage=template['damage'],
@@ -414,127 +975,342 @@ class GameEngineRPG:
             ai_behavior=template['ai_behavior']
         )
         
+        # Reuse a removed sprite if there is one, otherwise create one
+        if self.sprite_pool:
+            sprite = self.sprite_pool.pop()
+            for key, value in fields.items():
+                setattr(sprite, key, value)
+            sprite.inventory.clear()
+        else:
+            sprite = Sprite(**fields)
+        
         self.sprites[sprite_id] = sprite
+        self.sprite_population[template_name] += 1
+        self.index.add(sprite)
+        if self.sprite_table is not None:
+            self.sprite_table.add(sprite)
+        self.sim_queue.append(sprite_id)
+        self.sim_turns[sprite_id] = self.turn_count
         return sprite_id
     
-    def check_spawns(self):
-        """Check for random sprite and item spawns"""
+    def remove_sprite(self, sprite_id: str):
+        """Take a sprite out of the world, dropping what it carried, and pool it"""
+        sprite = self.sprites.pop(sprite_id, None)
+        if sprite is None:
+            return
+        
+        for item_id in sorted(sprite.inventory):
+            if item_id in self.objects and self.objects[item_id].location == sprite_id:
+                self.objects[item_id].location = sprite.location
+        
+        self.index.discard(sprite)
+        if self.sprite_table is not None:
+            self.sprite_table.remove(sprite)
+        self.sim_turns.pop(sprite_id, None)
+        template_name = sprite.properties.get('template')
+        if self.sprite_population.get(template_name, 0) > 0:
+            self.sprite_population[template_name] -= 1
+        if len(self.sprite_pool) < self.SPRITE_POOL_SIZE:
+            self.sprite_pool.append(sprite)
+    
+    def room_has_space(self, room_id: str) -> bool:
+        """Whether another sprite may spawn in this room"""
+        limit = self.rooms[room_id].get_property('max_sprites', self.MAX_SPRITES_PER_ROOM)
+        return len(self.index.sprites.get(room_id, ())) < limit
+    
+    def check_spawns(self, ctx: Optional[PlayerContext] = None, players: Optional[List[PlayerContext]] = None):
+        """Check for random sprite and item spawns (sprites never appear in the players' rooms)"""
+        if players is None:
+            players = [ctx or self.player]
+        occupied = {player.location for player in players}
         messages = []
         
-        # Check sprite spawns
+        # Check sprite spawns (up to each template's population cap)
         for template_name, template in self.sprite_templates.items():
-            if random.random() < template['spawn_chance']:
+            if self.sprite_population[template_name] >= template['max_population']:
+                continue
+            if self.rng.random() < template['spawn_chance']:
                 # Spawn in random room (not player's current location initially)
-                rooms = [r for r in self.rooms.keys() if r != self.player_location]
+                rooms = [r for r in self.rooms.keys() if r not in occupied and self.room_has_space(r)]
                 if rooms:
-                    room = random.choice(rooms)
+                    room = self.rng.choice(rooms)
                     sprite_id = self.spawn_sprite(template_name, room)
                     if sprite_id:
                         messages.append(f"ðŸ”® A {template['name']} has appeared somewhere in the dungeon...")
         
         # Check potion spawns
-        for obj_id, obj in self.objects.items():
-            if obj.get_property('consumable') and obj.location == 'none':
+        for obj_id in self.index.objects_at('none'):
+            obj = self.objects[obj_id]
+            if obj.get_property('consumable'):
                 spawn_chance = obj.get_property('spawn_chance', 0)
-                if spawn_chance > 0 and random.random() < spawn_chance:
+                if spawn_chance > 0 and self.rng.random() < spawn_chance:
                     rooms = list(self.rooms.keys())
-                    obj.location = random.choice(rooms)
+                    obj.location = self.rng.choice(rooms)
                     messages.append(f"âœ¨ A {obj.name} has materialized!")
         
         return messages
     
-    def process_sprite_ai(self):
-        """Process AI for all sprites"""
-        messages = []
+    def rooms_within(self, centers, radius: int) -> List[str]:
+        """Rooms at most radius exits from any of the center rooms, nearest first"""
+        return self.room_graph.within(centers, radius)
+    
+    def sprites_to_simulate(self, players: List[PlayerContext]) -> List[tuple]:
+        """
+        (id, sprite) pairs that get a full AI turn.
+        
+        Without a sim_radius that is every sprite. With one, it is the
+        sprites within sim_radius exits of any tracked or given player, plus
+        the next sim_far_batch far-away sprites in round-robin order. A sprite
+        that sat out some turns is fast-forwarded first, so a player walking
+        up finds it wherever its wandering would have taken it.
+        """
+        if self.sim_radius is None:
+            return list(self.sprites.items())
+        
+        centers = set(self.index.player_locations.values())
+        centers.update(player.location for player in players)
+        selected = {}
+        for room_id in self.rooms_within(centers, self.sim_radius):
+            for sprite_id in self.index.sprites_at(room_id):
+                selected[sprite_id] = self.sprites[sprite_id]
+        
+        for _ in range(min(self.sim_far_batch, len(self.sim_queue))):
+            sprite_id = self.sim_queue.popleft()
+            if sprite_id in self.sprites:
+                self.sim_queue.append(sprite_id)
+                selected.setdefault(sprite_id, self.sprites[sprite_id])
+            else:
+                self.sim_turns.pop(sprite_id, None)
+        
+        for sprite_id, sprite in selected.items():
+            skipped = self.turn_count - self.sim_turns.get(sprite_id, self.turn_count - 1) - 1
+            if skipped > 0 and sprite.is_alive():
+                self.fast_forward_sprite(sprite, skipped)
+            self.sim_turns[sprite_id] = self.turn_count
+        
+        self.sim_stats['simulated'] += len(selected)
+        return list(selected.items())
+    
+    def fast_forward_sprite(self, sprite: Sprite, turns: int):
+        """Replay the wandering a sprite would have done over turns it wasn't simulated"""
+        self.sim_stats['fast_forwarded'] += 1
+        for _ in range(min(turns, self.SIM_FAST_FORWARD_CAP)):
+            if self.rng.random() < self.SPRITE_MOVE_CHANCE:
+                step = self.room_graph.random_exit(sprite.location, self.rng)
+                if step:
+                    sprite.location = step[1]
+    
+    def sprite_pickup(self, sprite: Sprite) -> Optional[str]:
+        """A sprite with can_pickup may grab a weapon lying in its room"""
+        if sprite.get_property('can_pickup') and self.rng.random() < 0.3:
+            items_here = [self.objects[obj_id] for obj_id in self.index.objects_at(sprite.location)
+                          if self.objects[obj_id].is_weapon()]
+            if items_here:
+                item = self.rng.choice(items_here)
+                item.location = sprite.id  # Sprite takes it
+                sprite.inventory.add(item.id)
+                self.index.touch(sprite)
+                return f"ðŸ‘¹ The {sprite.name} picks up the {item.name}!"
+        return None
+    
+    def announce_attack(self, sprite: Sprite, players: List[PlayerContext], messages: Dict[str, List[str]]):
+        """Battle marker, taunt and hit message for every player the sprite attacks"""
+        taunt = self.generate_taunt(sprite)
+        for player in players:
+            out = messages[player.name]
+            out.append(f"BATTLE_START:{sprite.name}")
+            if taunt:
+                out.append(taunt)
+            out.append(f"[ATK] The {sprite.name} attacks you for {sprite.damage} damage!")
+    
+    @staticmethod
+    def check_slain(players: List[PlayerContext], messages: Dict[str, List[str]], slain: Set[str]):
+        """Count a death (once per turn) for each player the attacks have killed"""
+        for player in players:
+            if player.health <= 0 and player.name not in slain:
+                slain.add(player.name)
+                messages[player.name].append("[DEAD] You have been slain!")
+                player.deaths += 1
+    
+    def sprite_turn_table(self, rooms: Dict[str, List[PlayerContext]], messages: Dict[str, List[str]]):
+        """sprite_turn() for every sprite at once, using the sprite table"""
+        table = self.sprite_table
+        for row in table.dead():
+            self.remove_sprite(table.sprites[row].id)
+        
+        player_rooms = [table.room_index.get(location, -1) for location in rooms]
+        attackers, movers, room_damage = table.step(player_rooms, self.SPRITE_MOVE_CHANCE)
+        
+        # Write moves back to the sprites (this also updates the location index)
+        for row in movers.tolist():
+            table.sprites[row].location = table.room_ids[table.location[row]]
+        
+        attacked = {}  # Rooms in attack order
+        for row in attackers.tolist():
+            sprite = table.sprites[row]
+            self.announce_attack(sprite, rooms[sprite.location], messages)
+            attacked[sprite.location] = None
+        
+        # Everyone in a room takes the damage of all its attackers
+        slain = set()
+        for location in attacked:
+            damage = int(room_damage[table.room_index[location]])
+            for player in rooms[location]:
+                player.health -= damage
+            self.check_slain(rooms[location], messages, slain)
+        
+        for location, players in rooms.items():
+            for sprite_id in self.index.sprites_at(location):
+                sprite = self.sprites[sprite_id]
+                if sprite.is_alive():
+                    msg = self.sprite_pickup(sprite)
+                    if msg:
+                        for player in players:
+                            messages[player.name].append(msg)
+        
+        self.sim_stats['simulated'] += len(table)
+    
+    def sprite_turn(self, players: List[PlayerContext]) -> Dict[str, List[str]]:
+        """
+        One AI turn for the sprites (all of them, or those near players, see
+        sprites_to_simulate). A hostile sprite sharing a room with players
+        may attack, and every player in that room takes the hit; sprites away
+        from the players wander. Returns each player's messages by name.
+        """
+        rooms: Dict[str, List[PlayerContext]] = {}
+        for player in players:
+            rooms.setdefault(player.location, []).append(player)
+        messages = {player.name: [] for player in players}
+        if self.sprite_table is not None:
+            self.sprite_turn_table(rooms, messages)
+            return messages
         
-        for sprite_id, sprite in list(self.sprites.items()):
+        slain = set()
+        for sprite_id, sprite in self.sprites_to_simulate(players):
             if not sprite.is_alive():
+                self.remove_sprite(sprite_id)
                 continue
             
-            # Sprite in player's room?
-            if sprite.location == self.player_location:
+            # Sprite in a player's room?
+            here = rooms.get(sprite.location)
+            if here:
                 # Hostile sprite attacks
-                if sprite.is_hostile() and random.random() < sprite.aggression:
-                    damage = sprite.damage
-                    self.player_health -= damage
+                if sprite.is_hostile() and self.rng.random() < sprite.aggression:
+                    for player in here:
+                        player.health -= sprite.damage
                     
                     # BATTLE_START marker for server to generate scene!
-                    messages.append(f"BATTLE_START:{sprite.name}")
-                    
-                    # Generate taunt
-                    taunt = self.generate_taunt(sprite)
-                    if taunt:
-                        messages.append(taunt)
-                    
-                    messages.append(f"[ATK] The {sprite.name} attacks you for {damage} damage!")
-                    
-                    if self.player_health <= 0:
-                        messages.append("[DEAD] You have been slain!")
-                        self.deaths += 1
-                        self.deaths += 1
+                    self.announce_attack(sprite, here, messages)
+                    self.check_slain(here, messages, slain)
                 
                 # Sprite might pick up items
-                if sprite.get_property('can_pickup') and random.random() < 0.3:
-                    items_here = [obj for obj in self.objects.values() 
-                                if obj.location == sprite.location and obj.is_weapon()]
-                    if items_here:
-                        item = random.choice(items_here)
-                        item.location = sprite_id  # Sprite takes it
-                        sprite.inventory.add(item.id)
-                        messages.append(f"ðŸ‘¹ The {sprite.name} picks up the {item.name}!")
+                msg = self.sprite_pickup(sprite)
+                if msg:
+                    for player in here:
+                        messages[player.name].append(msg)
             else:
                 # Random movement
-                if random.random() < 0.2:
-                    if sprite.location in self.rooms:
-                        room = self.rooms[sprite.location]
-                        if room.exits:
-                            direction = random.choice(list(room.exits.keys()))
-                            sprite.location = room.exits[direction]
+                if self.rng.random() < self.SPRITE_MOVE_CHANCE:
+                    step = self.room_graph.random_exit(sprite.location, self.rng)
+                    if step:
+                        sprite.location = step[1]
         
         return messages
     
-    def process_turn(self):
-        """Process end-of-turn effects"""
-        self.turn_count += 1
+    def process_sprite_ai(self, ctx: Optional[PlayerContext] = None):
+        """Process AI for all sprites (or those near players, see sprites_to_simulate)"""
+        ctx = ctx or self.player
+        return self.sprite_turn([ctx])[ctx.name]
+    
+    def exhaust(self, ctx: PlayerContext) -> List[str]:
+        """Health depletion over time"""
         messages = []
-        
-        # Health depletion over time
         if self.turn_count % 5 == 0:  # Every 5 turns
-            self.player_health -= 2
-            if self.player_health < 30:
+            ctx.health -= 2
+            if ctx.health < 30:
                 messages.append("âš ï¸  You're feeling weak from exhaustion...")
+        return messages
+    
+    def run_transformations(self, players: List[PlayerContext]) -> List[str]:
+        """Advance the scheduler and fire the transformations that are due"""
+        messages = []
         
-        if self.player_health <= 0:
+        # Check only the transformations whose deadline has been reached
+        for rule_index, obj_id in self.scheduler.advance():
+            if self.scheduler.is_armed(rule_index, obj_id):
+                msg = self.check_transformation(self.transformations[rule_index], players)
+                if msg:
+                    messages.append(msg)
+        return messages
+    
+    def process_turn(self, ctx: Optional[PlayerContext] = None):
+        """Process end-of-turn effects"""
+        ctx = ctx or self.player
+        self.turn_count += 1
+        messages = self.exhaust(ctx)
+        
+        if ctx.health <= 0:
             messages.append("ðŸ’€ You have died from exhaustion! GAME OVER")
-            self.deaths += 1
+            ctx.deaths += 1
             return messages
         
-        # Update state turn counts
-        for obj in self.objects.values():
-            obj.state_turn_count += 1
-        
-        # Check transformations
-        for transformation in self.transformations:
-            msg = self.check_transformation(transformation)
-            if msg:
-                messages.append(msg)
+        messages.extend(self.run_transformations([ctx]))
         
         # Check spawns
-        spawn_msgs = self.check_spawns()
+        spawn_msgs = self.check_spawns(ctx)
         messages.extend(spawn_msgs)
         
         # Process sprite AI
-        ai_msgs = self.process_sprite_ai()
+        ai_msgs = self.process_sprite_ai(ctx)
         messages.extend(ai_msgs)
         
-        # Save player state if multiplayer
+        # Save player state if multiplayer (queued; written by the player store)
         if self.multiplayer_root:
             self.save_player_state()
         
         return messages
     
-    def check_transformation(self, transformation: Dict[str, Any]) -> Optional[str]:
-        """Check if a transformation should occur"""
+    def process_world_turn(self, players: List[PlayerContext]) -> tuple[List[str], Dict[str, List[str]]]:
+        """
+        One turn of a shared multiplayer world.
+        
+        Transformations, spawns and sprite movement run once per turn,
+        whoever is connected; sprite attacks and exhaustion then apply to
+        each player's own context. Returns (messages about the world,
+        {player name: messages for that player}). Unlike process_turn(), a
+        player's death doesn't stop the world: the server respawns them (see
+        respawn).
+        """
+        self.turn_count += 1
+        messages = self.run_transformations(players)
+        messages.extend(self.check_spawns(players=players))
+        
+        player_messages = self.sprite_turn(players)
+        for player in players:
+            alive = player.health > 0  # Not already slain by a sprite this turn
+            player_messages[player.name].extend(self.exhaust(player))
+            if alive and player.health <= 0:
+                player_messages[player.name].append("ðŸ’€ You have died from exhaustion!")
+                player.deaths += 1
+        
+        return messages, player_messages
+    
+    def respawn(self, ctx: PlayerContext, location: str) -> List[str]:
+        """Drop a dead player's items where they fell and bring them back at full health; returns what was dropped"""
+        dropped_items = []
+        for item_id in sorted(ctx.inventory):
+            if item_id in self.objects:
+                self.objects[item_id].location = ctx.location
+                dropped_items.append(self.objects[item_id].name)
+        ctx.location = location
+        ctx.health = ctx.max_health
+        ctx.inventory = set()
+        return dropped_items
+    
+    def check_transformation(self, transformation: Dict[str, Any],
+                             players: Optional[List[PlayerContext]] = None) -> Optional[str]:
+        """Check if a transformation should occur (carried objects are where their carrier is)"""
+        players = players if players is not None else [self.player]
         conditions = transformation['conditions']
         
         # Find matching object
@@ -544,10 +1320,16 @@ class GameEngineRPG:
         
         obj = self.objects[obj_id]
         
-        # Skip template objects (location='none')  
+        # Skip template objects (location='none') until they are placed
         if obj.location == 'none':
+            self.scheduler.block(transformation, obj_id)
             return None
         
+        # Rules for objects lying somewhere only need rechecking once the object
+        # moves; carried objects follow their carrier, so they stay armed
+        carrier = next((player for player in players if obj.id in player.inventory), None)
+        carried = obj.location == 'inventory' or carrier is not None
+        
         # DEBUG: Log transformation check
         trans_id = transformation.get('id', 'unknown')
         
@@ -562,9 +1344,9 @@ class GameEngineRPG:
             # Determine which room to check
             room_to_check = None
             
-            # If object is in inventory or player location, use player's current room
-            if obj.location == 'inventory' or obj.location == self.player_location or obj.id in self.inventory:
-                room_to_check = self.player_location
+            # If a player carries the object, use their current room
+            if carrier is not None:
+                room_to_check = carrier.location
             # Otherwise use the object's location
             elif obj.location in self.rooms:
                 room_to_check = obj.location
@@ -573,32 +1355,38 @@ class GameEngineRPG:
                 room = self.rooms[room_to_check]
                 has_prop = room.get_property(location_prop, False)
                 if not has_prop:
+                    if not carried:
+                        self.scheduler.block(transformation, obj_id)
                     return None
             else:
+                if not carried:
+                    self.scheduler.block(transformation, obj_id)
                 return None
         else:
             # No location property specified - check if NOT in cold room (for ice melting)
             room_to_check = None
-            if obj.location == 'inventory' or obj.location == self.player_location or obj.id in self.inventory:
-                room_to_check = self.player_location
+            if carrier is not None:
+                room_to_check = carrier.location
             elif obj.location in self.rooms:
                 room_to_check = obj.location
                 
             if room_to_check and room_to_check in self.rooms:
                 room = self.rooms[room_to_check]
                 if room.get_property('cold', False):
+                    if not carried:
+                        self.scheduler.block(transformation, obj_id)
                     return None  # Don't melt in cold room
         
         # Check turns
         turns_required = conditions.get('turns_required', 0)
-        if obj.state_turn_count < turns_required:
+        if self.scheduler.state_age(obj) < turns_required:
             return None
         
         
         # Apply transformation
         if transformation['new_state']:
             obj.state = transformation['new_state']
-            obj.state_turn_count = 0
+            self.scheduler.enter_state(obj)
         
         # Create new object if specified
         if transformation['new_object_id']:
@@ -614,7 +1402,10 @@ class GameEngineRPG:
                     location=obj.location,
                     state=template.state
                 )
+                self.index.discard(obj)
                 self.objects[obj.id] = new_obj
+                self.index.add(new_obj)
+                self.scheduler.enter_state(new_obj)
         
         return transformation.get('message', '')
     
@@ -647,61 +1438,49 @@ class GameEngineRPG:
         
         return verb, obj1, obj2
     
-    def find_object(self, name: str) -> Optional[GameObject]:
+    def find_objects(self, name: str, ctx: Optional[PlayerContext] = None) -> List[GameObject]:
+        """Best matches for name in inventory, else in the current room"""
+        ctx = ctx or self.player
+        # Inventory items share the 'inventory' location, so narrow to ours
+        matches = self.index.match('object', 'inventory', name, allowed=ctx.inventory)
+        if not matches:
+            matches = self.index.match('object', ctx.location, name)
+        return [self.objects[obj_id] for obj_id in matches]
+    
+    def find_object(self, name: str, ctx: Optional[PlayerContext] = None) -> Optional[GameObject]:
         """Find object by name in current room or inventory"""
-        name = name.lower().strip()
-        
-        # Check inventory
-        for obj_id in self.inventory:
-            if obj_id in self.objects:
-                obj = self.objects[obj_id]
-                if (obj.name.lower() == name or 
-                    obj.id.lower() == name or
-                    name in obj.name.lower()):
-                    return obj
-        
-        # Check current room
-        for obj_id, obj in self.objects.items():
-            if obj.location == self.player_location:
-                if (obj.name.lower() == name or 
-                    obj.id.lower() == name or
-                    name in obj.name.lower()):
-                    return obj
-        
-        return None
+        matches = self.find_objects(name, ctx)
+        return matches[0] if matches else None
+    
+    def find_sprites(self, name: str, ctx: Optional[PlayerContext] = None) -> List[Sprite]:
+        """Best matches for name among sprites in the current room"""
+        ctx = ctx or self.player
+        return [self.sprites[sprite_id]
+                for sprite_id in self.index.match('sprite', ctx.location, name)]
     
-    def find_sprite(self, name: str) -> Optional[Sprite]:
+    def find_sprite(self, name: str, ctx: Optional[PlayerContext] = None) -> Optional[Sprite]:
         """Find sprite by name in current room"""
-        name = name.lower().strip()
-        
-        for sprite_id, sprite in self.sprites.items():
-            if sprite.location == self.player_location:
-                if (sprite.name.lower() == name or
-                    name in sprite.name.lower() or
-                    sprite_id.lower() == name):
-                    return sprite
-        
-        return None
+        matches = self.find_sprites(name, ctx)
+        return matches[0] if matches else None
+    
+    def ambiguity_message(self, matches: List[GameObject]) -> Optional[str]:
+        """Ask which one was meant when matches have different names"""
+        names = sorted(set(match.name for match in matches))
+        if len(names) < 2:
+            return None
+        return f"Which do you mean: the {', the '.join(names[:-1])} or the {names[-1]}?"
     
     def get_verb_handler(self, verb: str) -> Optional[str]:
         """Map verb to handler function"""
-        verb = verb.lower()
-        
-        if verb in self.verbs:
-            return verb
-        
-        for verb_id, verb_data in self.verbs.items():
-            if verb in verb_data['aliases']:
-                return verb_id
-        
-        return None
+        return self.verb_lookup.get(verb.lower())
     
     def can_perform_action(self, verb_id: str, obj: GameObject) -> bool:
         """Check action matrix if verb can be performed on object"""
         return verb_id in self.action_matrix.get(obj.id, set())
     
-    def execute_command(self, command: str) -> str:
-        """Main command execution"""
+    def execute_command(self, command: str, ctx: Optional[PlayerContext] = None) -> str:
+        """Main command execution (for ctx, or the engine's own player)"""
+        ctx = ctx or self.player
         verb, obj_name, obj2_name = self.parse_command(command)
         
         if not verb:
@@ -712,15 +1491,9 @@ class GameEngineRPG:
             return f"I don't know how to '{verb}'."
         
         # Handle directional movement specially
-        direction_map = {
-            'n': 'north', 's': 'south', 'e': 'east', 'w': 'west',
-            'u': 'up', 'd': 'down',
-            'north': 'north', 'south': 'south', 'east': 'east', 
-            'west': 'west', 'up': 'up', 'down': 'down'
-        }
-        
-        if verb.lower() in direction_map:
-            return self.go(direction_map[verb.lower()])
+        direction = self.direction_map.get(verb.lower())
+        if direction:
+            return self.go(direction, ctx)
         
         # Route to appropriate handler
         handler_map = {
@@ -743,17 +1516,23 @@ class GameEngineRPG:
         handler = handler_map.get(verb_id)
         if handler:
             if verb_id == 'go' and obj_name:
-                return handler(obj_name)
+                return handler(obj_name, ctx)
             elif verb_id in ['health', 'flee']:
-                return handler()
+                return handler(ctx=ctx)
             elif obj_name:
                 # Try to find object or sprite
-                obj = self.find_object(obj_name)
-                sprite = self.find_sprite(obj_name)
+                objs = self.find_objects(obj_name, ctx)
+                sprites = self.find_sprites(obj_name, ctx)
+                obj = objs[0] if objs else None
+                sprite = sprites[0] if sprites else None
+                
+                ambiguous = self.ambiguity_message(sprites if verb_id == 'attack' and sprites else objs)
+                if ambiguous:
+                    return ambiguous
                 
                 if verb_id == 'attack':
                     if sprite:
-                        return self.attack(sprite, obj2_name)
+                        return self.attack(sprite, obj2_name, ctx)
                     elif obj:
                         return f"You can't attack the {obj.name}."
                     else:
@@ -766,20 +1545,21 @@ class GameEngineRPG:
                     return f"You can't {verb} the {obj.name}."
                 
                 if verb_id == 'put' and obj2_name:
-                    return self.put(obj, obj2_name)
+                    return self.put(obj, obj2_name, ctx)
                 else:
-                    return handler(obj)
+                    return handler(obj, ctx)
             else:
-                return handler()
+                return handler(ctx=ctx)
         
         return f"I don't know how to do that yet."
     
-    def look(self, obj: Optional[GameObject] = None) -> str:
+    def look(self, obj: Optional[GameObject] = None, ctx: Optional[PlayerContext] = None) -> str:
         """Look at current room or object"""
+        ctx = ctx or self.player
         if obj:
-            return self.examine(obj)
+            return self.examine(obj, ctx)
         
-        room = self.rooms.get(self.player_location)
+        room = self.rooms.get(ctx.location)
         if not room:
             return "You are nowhere."
         
@@ -791,22 +1571,21 @@ class GameEngineRPG:
             output.append(f"\nExits: {exits}")
         
         # List sprites in room
-        sprites_here = [s for s in self.sprites.values() 
-                       if s.location == self.player_location and s.is_alive()]
+        sprites_here = [self.sprites[sprite_id] for sprite_id in self.index.sprites_at(ctx.location)
+                        if self.sprites[sprite_id].is_alive()]
         if sprites_here:
             output.append("\nðŸš¨ ENEMIES:")
             for sprite in sprites_here:
                 health_bar = f"[{'â–ˆ' * (sprite.health // 10)}{'â–‘' * ((sprite.max_health - sprite.health) // 10)}]"
                 items_held = ""
                 if sprite.inventory:
-                    item_names = [self.objects[id].name for id in sprite.inventory if id in self.objects]
+                    item_names = [self.objects[id].name for id in sorted(sprite.inventory) if id in self.objects]
                     if item_names:
                         items_held = f" (holding: {', '.join(item_names)})"
                 output.append(f"  âš”ï¸  {sprite.name} {health_bar} {sprite.health}/{sprite.max_health} HP{items_held}")
         
         # List objects in room
-        objects_here = [obj for obj in self.objects.values() 
-                       if obj.location == self.player_location]
+        objects_here = [self.objects[obj_id] for obj_id in self.index.objects_at(ctx.location)]
         if objects_here:
             output.append("\nYou can see:")
             for obj in objects_here:
@@ -816,7 +1595,7 @@ class GameEngineRPG:
         
         return "\n".join(output)
     
-    def examine(self, obj: GameObject) -> str:
+    def examine(self, obj: GameObject, ctx: Optional[PlayerContext] = None) -> str:
         """Examine an object closely"""
         state_desc = f" It appears to be {obj.state}." if obj.state != "normal" else ""
         weapon_info = ""
@@ -828,34 +1607,37 @@ class GameEngineRPG:
             consumable_info = f" [POTION: restores {heal} HP]"
         return f"{obj.description}{state_desc}{weapon_info}{consumable_info}"
     
-    def take(self, obj: GameObject) -> str:
+    def take(self, obj: GameObject, ctx: Optional[PlayerContext] = None) -> str:
         """Take an object"""
+        ctx = ctx or self.player
         if not obj.is_takeable():
             return f"You can't take the {obj.name}."
         
-        if obj.id in self.inventory:
+        if obj.id in ctx.inventory:
             return "You already have that."
         
-        self.inventory.add(obj.id)
+        ctx.inventory.add(obj.id)
         obj.location = 'inventory'
         return f"Taken: {obj.name}"
     
-    def drop(self, obj: GameObject) -> str:
+    def drop(self, obj: GameObject, ctx: Optional[PlayerContext] = None) -> str:
         """Drop an object"""
-        if obj.id not in self.inventory:
+        ctx = ctx or self.player
+        if obj.id not in ctx.inventory:
             return "You don't have that."
         
-        self.inventory.remove(obj.id)
-        obj.location = self.player_location
+        ctx.inventory.remove(obj.id)
+        obj.location = ctx.location
         return f"Dropped: {obj.name}"
     
-    def show_inventory(self) -> str:
+    def show_inventory(self, ctx: Optional[PlayerContext] = None) -> str:
         """Show inventory"""
-        if not self.inventory:
+        ctx = ctx or self.player
+        if not ctx.inventory:
             return "You aren't carrying anything."
         
         output = ["You are carrying:"]
-        for obj_id in self.inventory:
+        for obj_id in sorted(ctx.inventory):
             if obj_id in self.objects:
                 obj = self.objects[obj_id]
                 weapon_mark = "âš”ï¸ " if obj.is_weapon() else ""
@@ -863,9 +1645,10 @@ class GameEngineRPG:
                 output.append(f"  {weapon_mark}{potion_mark}{obj.name}")
         return "\n".join(output)
     
-    def go(self, direction: str) -> str:
+    def go(self, direction: str, ctx: Optional[PlayerContext] = None) -> str:
         """Move in a direction"""
-        room = self.rooms.get(self.player_location)
+        ctx = ctx or self.player
+        room = self.rooms.get(ctx.location)
         if not room:
             return "You can't go anywhere from here."
         
@@ -873,82 +1656,85 @@ class GameEngineRPG:
         if direction not in room.exits:
             return f"You can't go {direction}."
         
-        self.player_location = room.exits[direction]
-        return self.look()
+        ctx.location = room.exits[direction]
+        return self.look(ctx=ctx)
     
-    def put(self, obj: GameObject, container_name: str) -> str:
+    def put(self, obj: GameObject, container_name: str, ctx: Optional[PlayerContext] = None) -> str:
         """Put object in container"""
-        container = self.find_object(container_name)
+        ctx = ctx or self.player
+        container = self.find_object(container_name, ctx)
         if not container:
             return f"I don't see a {container_name} here."
         
         if not container.can_contain():
             return f"You can't put things in the {container.name}."
         
-        if obj.id not in self.inventory:
+        if obj.id not in ctx.inventory:
             return "You need to be holding it first."
         
-        self.inventory.remove(obj.id)
+        ctx.inventory.remove(obj.id)
         obj.location = container.id
         return f"You put the {obj.name} in the {container.name}."
     
-    def open_obj(self, obj: GameObject) -> str:
+    def open_obj(self, obj: GameObject, ctx: Optional[PlayerContext] = None) -> str:
         """Open a container"""
         if not obj.can_contain():
             return f"You can't open the {obj.name}."
         
-        contents = [o for o in self.objects.values() if o.location == obj.id]
+        contents = [self.objects[obj_id] for obj_id in self.index.objects_at(obj.id)]
         if not contents:
             return f"The {obj.name} is empty."
         
         items = ", ".join([o.name for o in contents])
         return f"The {obj.name} contains: {items}"
     
-    def close_obj(self, obj: GameObject) -> str:
+    def close_obj(self, obj: GameObject, ctx: Optional[PlayerContext] = None) -> str:
         """Close a container"""
         if not obj.can_contain():
             return f"You can't close the {obj.name}."
         return f"You close the {obj.name}."
     
-    def use(self, obj: GameObject) -> str:
+    def use(self, obj: GameObject, ctx: Optional[PlayerContext] = None) -> str:
         """Use an object"""
         return f"You're not sure how to use the {obj.name}."
     
-    def drink(self, obj: GameObject) -> str:
+    def drink(self, obj: GameObject, ctx: Optional[PlayerContext] = None) -> str:
         """Drink a potion"""
+        ctx = ctx or self.player
         if not obj.get_property('consumable'):
             return f"You can't drink the {obj.name}."
         
-        if obj.id not in self.inventory:
+        if obj.id not in ctx.inventory:
             return "You need to be holding it first."
         
         # Apply healing
         heal_amount = obj.get_property('health_restore', 0)
-        self.player_health = min(self.player_max_health, self.player_health + heal_amount)
-        self.potions_consumed += 1
+        ctx.health = min(ctx.max_health, ctx.health + heal_amount)
+        ctx.potions_consumed += 1
         
         # Remove potion
-        self.inventory.remove(obj.id)
+        ctx.inventory.remove(obj.id)
         obj.location = 'none'  # Consumed
         
-        return f"ðŸ’Š You drink the {obj.name} and restore {heal_amount} HP! (Health: {self.player_health}/{self.player_max_health})"
+        return f"ðŸ’Š You drink the {obj.name} and restore {heal_amount} HP! (Health: {ctx.health}/{ctx.max_health})"
     
-    def attack(self, target: Sprite, weapon_name: Optional[str] = None) -> str:
+    def attack(self, target: Sprite, weapon_name: Optional[str] = None, ctx: Optional[PlayerContext] = None) -> str:
         """Attack a sprite"""
+        ctx = ctx or self.player
         if not target.is_alive():
             return f"The {target.name} is already dead."
         
         # Find weapon
         weapon = None
         if weapon_name:
-            weapon = self.find_object(weapon_name)
-            if not weapon or weapon.id not in self.inventory:
+            weapon = self.find_object(weapon_name, ctx)
+            if not weapon or weapon.id not in ctx.inventory:
                 return f"You don't have a {weapon_name}."
             if not weapon.is_weapon():
                 return f"You can't attack with the {weapon.name}."
         else:
             # Find any weapon in inventory
-            for obj_id in self.inventory:
+            for obj_id in sorted(ctx.inventory):
                 if obj_id in self.objects and self.objects[obj_id].is_weapon():
                     weapon = self.objects[obj_id]
                     break
@@ -963,39 +1749,40 @@ class GameEngineRPG:
         
         if target.health <= 0:
             target.health = 0
-            self.kills += 1
+            ctx.kills += 1
             
             # Drop sprite's inventory
             loot = []
-            for item_id in target.inventory:
+            for item_id in sorted(target.inventory):
                 if item_id in self.objects:
-                    self.objects[item_id].location = self.player_location
+                    self.objects[item_id].location = ctx.location
                     loot.append(self.objects[item_id].name)
             
             loot_msg = ""
             if loot:
                 loot_msg = f"\nðŸ’° The {target.name} dropped: {', '.join(loot)}"
             
-            del self.sprites[target.id]
+            self.remove_sprite(target.id)
             return f"âš”ï¸  You attack the {target.name} with {weapon.name if weapon else 'your fists'} for {base_damage} damage!\nðŸ’€ The {target.name} has been slain!{loot_msg}"
         else:
             return f"âš”ï¸  You attack the {target.name} with {weapon.name if weapon else 'your fists'} for {base_damage} damage! ({target.health}/{target.max_health} HP remaining)"
     
-    def flee(self) -> str:
+    def flee(self, ctx: Optional[PlayerContext] = None) -> str:
         """Flee from current room"""
-        room = self.rooms.get(self.player_location)
-        if not room or not room.exits:
+        ctx = ctx or self.player
+        step = self.room_graph.random_exit(ctx.location, self.rng)
+        if not step:
             return "There's nowhere to run!"
         
         # Pick random exit
-        direction = random.choice(list(room.exits.keys()))
-        self.player_location = room.exits[direction]
-        return f"ðŸƒ You flee {direction}!\n\n{self.look()}"
+        direction, ctx.location = step
+        return f"ðŸƒ You flee {direction}!\n\n{self.look(ctx=ctx)}"
     
-    def check_health(self) -> str:
+    def check_health(self, ctx: Optional[PlayerContext] = None) -> str:
         """Check player health"""
-        health_pct = (self.player_health / self.player_max_health) * 100
-        health_bar = f"[{'â–ˆ' * (self.player_health // 10)}{'â–‘' * ((self.player_max_health - self.player_health) // 10)}]"
+        ctx = ctx or self.player
+        health_pct = (ctx.health / ctx.max_health) * 100
+        health_bar = f"[{'â–ˆ' * (ctx.health // 10)}{'â–‘' * ((ctx.max_health - ctx.health) // 10)}]"
         
         status = "Healthy"
         if health_pct < 30:
@@ -1003,14 +1790,13 @@ class GameEngineRPG:
         elif health_pct < 60:
             status = "Wounded"
         
-        return f"ðŸ’š Health: {health_bar} {self.player_health}/{self.player_max_health} HP ({health_pct:.0f}%) - {status}"
+        return f"ðŸ’š Health: {health_bar} {ctx.health}/{ctx.max_health} HP ({health_pct:.0f}%) - {status}"
     
     def save_player_state(self):
-        """Save player state to multiplayer files"""
-        if not self.multiplayer_root:
+        """Queue player state for the multiplayer files (see flush_player_state)"""
+        if not self.player_store:
             return
         
-        player_file = self.multiplayer_root / "players" / self.player_name / "player.json"
         state = {
             'name': self.player_name,
             'health': self.player_health,
@@ -1022,22 +1808,180 @@ class GameEngineRPG:
             'deaths': self.deaths,
             'potions_consumed': self.potions_consumed
         }
+        self.player_store.save(self.player_name, state)
+    
+    def flush_player_state(self):
+        """Write queued player state to disk now (on disconnect or quit)"""
+        if self.player_store:
+            self.player_store.flush()
+    
+    def close(self):
+        """Save the player and the world, then close the storage backend"""
+        if self.player_store:
+            self.save_player_state()
+            self.player_store.close()
+            self.save_world_state()
+            self.storage.close()
+    
+    def world_state(self) -> Dict[str, Any]:
+        """Objects and sprites as plain data (see storage.py and world snapshots)"""
+        serial = next(self.sprite_serial)
+        self.sprite_serial = itertools.count(serial)  # Peeked, not used up
+        return {
+            'turn_count': self.turn_count,
+            'sprite_serial': serial,
+            'objects': {
+                obj_id: {
+                    'name': obj.name,  # Transformations can replace an object under the same id
+                    'description': obj.description,
+                    'location': obj.location,
+                    'state': obj.state,
+                    'state_turn_count': self.scheduler.state_age(obj),
+                    'properties': obj.properties
+                }
+                for obj_id, obj in self.objects.items()
+            },
+            'sprites': {sprite_id: self.sprite_record(sprite) for sprite_id, sprite in self.sprites.items()}
+        }
+    
+    @staticmethod
+    def sprite_record(sprite: Sprite) -> Dict[str, Any]:
+        return {
+            'template': sprite.properties.get('template'),
+            'name': sprite.name,
+            'location': sprite.location,
+            'health': sprite.health,
+            'inventory': sorted(sprite.inventory)
+        }
+    
+    @staticmethod
+    def object_record(obj: GameObject) -> Dict[str, Any]:
+        """What a delta save keeps for an object (state_entered_turn is a scheduler turn)"""
+        return {
+            'name': obj.name,
+            'description': obj.description,
+            'location': obj.location,
+            'state': obj.state,
+            'state_entered_turn': obj.state_entered_turn,
+            'properties': obj.properties
+        }
+    
+    @staticmethod
+    def record(data: Dict[str, Any]) -> str:
+        """Canonical JSON, used to tell which objects and sprites changed"""
+        return json.dumps(data, sort_keys=True)
+    
+    def take_changes(self, writer: tuple) -> Optional[tuple]:
+        """
+        (object ids, sprite ids) changed since writer (a save file or the
+        storage backend) last wrote, or None if it never has and must
+        write everything. Costs O(changes), not O(world).
+        """
+        objects, sprites = self.index.take_changes()
+        self.modified_objects |= objects
+        for pending_objects, pending_sprites in self.change_sets.values():
+            pending_objects |= objects
+            pending_sprites |= sprites
+        changes = self.change_sets.get(writer)
+        self.change_sets[writer] = (set(), set())
+        return changes
+    
+    def forget_writer(self, writer: tuple):
+        """After a failed write: the writer's next take_changes() is None, so it writes everything"""
+        self.change_sets.pop(writer, None)
+    
+    def world_changes(self) -> Dict[str, Any]:
+        """
+        What the storage backend needs to catch up (see Storage.save_world):
+        every object and sprite the first time ('full'), then only those
+        changed since the last call and the ids of removed sprites.
+        """
+        changes = self.take_changes(('storage',))
+        if changes is None:
+            changed_objects, changed_sprites = self.objects.keys(), self.sprites.keys()
+        else:
+            changed_objects, changed_sprites = changes
+        serial = next(self.sprite_serial)
+        self.sprite_serial = itertools.count(serial)  # Peeked, not used up
+        return {
+            'full': changes is None,
+            'turn_count': self.turn_count,
+            'scheduler_turn': self.scheduler.turn,
+            'sprite_serial': serial,
+            'objects': {obj_id: self.object_record(self.objects[obj_id])
+                        for obj_id in sorted(changed_objects) if obj_id in self.objects},
+            'sprites': {sprite_id: self.sprite_record(self.sprites[sprite_id])
+                        for sprite_id in sorted(changed_sprites) if sprite_id in self.sprites},
+            'removed_sprites': sorted(sprite_id for sprite_id in changed_sprites
+                                      if sprite_id not in self.sprites)
+        }
+    
+    def restore_world_state(self, world: Dict[str, Any]):
+        """Put objects and sprites back as world_state() recorded them (turn_count is left alone)"""
+        for sprite_id in list(self.sprites):
+            self.remove_sprite(sprite_id)
         
-        with open(player_file, 'w') as f:
-            json.dump(state, f, indent=2)
+        for obj_id, obj_state in world.get('objects', {}).items():
+            if obj_id in self.objects:
+                obj = self.objects[obj_id]
+                obj.name = obj_state.get('name', obj.name)  # reindex() below picks up renames
+                obj.description = obj_state.get('description', obj.description)
+                obj.location = obj_state['location']
+                obj.state = obj_state['state']
+                obj.state_entered_turn = self.scheduler.turn - obj_state['state_turn_count']
+                obj.properties = obj_state['properties']
+                self.scheduler.schedule(obj)
+        
+        for sprite_id, sprite_state in world.get('sprites', {}).items():
+            new_id = self.spawn_sprite(sprite_state.get('template'), sprite_state['location'])
+            if new_id is None:
+                print(f"Warning: sprite '{sprite_id}' has no template '{sprite_state.get('template')}', skipped")
+                continue
+            sprite = self.sprites.pop(new_id)
+            sprite.id = sprite_id  # reindex() below files it under the saved id
+            sprite.health = sprite_state['health']
+            sprite.inventory = set(sprite_state['inventory'])
+            self.sprites[sprite_id] = sprite
+        
+        if 'sprite_serial' in world:
+            self.sprite_serial = itertools.count(world['sprite_serial'])
+        self.reindex()
+        self.modified_objects = {obj_id for obj_id, obj in self.objects.items()
+                                 if self.record(self.object_record(obj)) != self.baseline_objects.get(obj_id)}
+    
+    def reseed(self, seed: int):
+        """Restart the world's random numbers (and the sprite table's) from seed"""
+        self.seed = seed
+        self.rng.seed(seed)
+        if self.sprite_table is not None:
+            self.sprite_table.seed(self.rng.getrandbits(64))
+    
+    def save_world_state(self):
+        """Store what changed in the shared world (objects and sprites) in the storage backend"""
+        if self.storage:
+            try:
+                self.storage.save_world(self.world_changes())
+            except Exception:
+                self.forget_writer(('storage',))
+                raise
+    
+    def load_world_state(self):
+        """Restore the shared world from the storage backend, if it has one"""
+        if not self.storage:
+            return
+        world = self.storage.load_world()
+        if world is not None:
+            self.restore_world_state(world)
     
     def load_player_state(self):
         """Load player state from multiplayer files"""
-        if not self.multiplayer_root:
+        if not self.player_store:
             return
         
-        player_file = self.multiplayer_root / "players" / self.player_name / "player.json"
-        if not player_file.exists():
+        state = self.player_store.load(self.player_name)
+        if state is None:
             return
         
-        with open(player_file, 'r') as f:
-            state = json.load(f)
-        
         self.player_health = state.get('health', self.player_max_health)
         self.player_max_health = state.get('max_health', 100)
         self.player_location = state.get('location', self.player_location)
@@ -1048,48 +1992,114 @@ class GameEngineRPG:
         self.potions_consumed = state.get('potions_consumed', 0)
     
     def save_game(self, filename: str) -> str:
-        """Save game state"""
-        state = {
+        """
+        Save game state as a delta against the initial world.
+        
+        {filename}.json (or .sav, see save_format) is a checkpoint: the
+        player, the objects that differ from the compiled world and the
+        sprites. Later saves append only what changed since the previous
+        save to {filename}.journal, one JSON line each; every
+        JOURNAL_COMPACT_ENTRIES entries the journal is folded into a fresh
+        checkpoint. Only objects and sprites the location index saw change
+        are serialised (see take_changes).
+        """
+        header = {
             'player_name': self.player_name,
             'player_location': self.player_location,
             'player_health': self.player_health,
             'player_max_health': self.player_max_health,
-            'inventory': list(self.inventory),
+            'inventory': sorted(self.inventory),
             'turn_count': self.turn_count,
+            'scheduler_turn': self.scheduler.turn,
             'game_flags': self.game_flags,
             'kills': self.kills,
             'deaths': self.deaths,
-            'potions_consumed': self.potions_consumed,
-            'objects': {
-                obj_id: {
-                    'location': obj.location,
-                    'state': obj.state,
-                    'state_turn_count': obj.state_turn_count,
-                    'properties': obj.properties
-                }
-                for obj_id, obj in self.objects.items()
-            },
-            'sprites': {
-                sprite_id: {
-                    'name': sprite.name,
-                    'location': sprite.location,
-                    'health': sprite.health,
-                    'inventory': list(sprite.inventory)
-                }
-                for sprite_id, sprite in self.sprites.items()
-            }
+            'potions_consumed': self.potions_consumed
         }
         
-        with open(f"{filename}.json", 'w') as f:
-            json.dump(state, f, indent=2)
-        
-        return f"Game saved to {filename}.json"
+        journal = f"{filename}.journal"
+        path = f"{filename}{FORMATS[self.save_format]}"
+        last = self.save_journals.get(filename)
+        changes = self.take_changes(('save', filename))
+        if (last is None or changes is None or last['entries'] >= self.JOURNAL_COMPACT_ENTRIES
+                or not os.path.exists(path)):
+            # Checkpoint; the new generation id retires any older journal lines
+            generation = os.urandom(8).hex()
+            objects = {}
+            for obj_id in sorted(self.modified_objects & self.objects.keys()):
+                record = self.object_record(self.objects[obj_id])
+                if self.record(record) != self.baseline_objects.get(obj_id):
+                    objects[obj_id] = record
+            checkpoint = dict(header, format='delta', generation=generation, objects=objects,
+                              sprites={sprite_id: self.sprite_record(sprite)
+                                       for sprite_id, sprite in self.sprites.items()})
+            path = save_state(filename, checkpoint, self.save_format, self.SAVE_COMPRESSION)
+            open(journal, 'w').close()
+            entries = 0
+        else:
+            generation = last['generation']
+            changed_objects, changed_sprites = changes
+            entry = dict(header, generation=generation,
+                         objects={obj_id: self.object_record(self.objects[obj_id])
+                                  for obj_id in sorted(changed_objects) if obj_id in self.objects},
+                         sprites={sprite_id: self.sprite_record(self.sprites[sprite_id])
+                                  for sprite_id in sorted(changed_sprites) if sprite_id in self.sprites},
+                         removed_sprites=sorted(sprite_id for sprite_id in changed_sprites
+                                                if sprite_id not in self.sprites))
+            with open(journal, 'a') as f:
+                f.write(json.dumps(entry, separators=(',', ':')) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            entries = last['entries'] + 1
+        
+        self.save_journals[filename] = {'generation': generation, 'entries': entries}
+        return f"Game saved to {path}"
+    
+    def read_save(self, filename: str) -> Dict[str, Any]:
+        """
+        A save file as a full state: checkpoint plus journal for delta saves,
+        with every object filled in from the initial world. Older full saves
+        are returned as they are.
+        """
+        state, path = load_state(filename)
+        state['path'] = path  # .json or .sav, whichever was read
+        if state.get('format') != 'delta':
+            return state
+        
+        objects = dict(state['objects'])
+        sprites = dict(state['sprites'])
+        state['journal_entries'] = 0
+        try:
+            with open(f"{filename}.journal", 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # Torn last line from a crash mid-append
+                        state['journal_entries'] = self.JOURNAL_COMPACT_ENTRIES  # Checkpoint next time
+                        break
+                    if entry.get('generation') != state['generation']:
+                        continue  # Left over from before the last checkpoint
+                    objects.update(entry.pop('objects'))
+                    sprites.update(entry.pop('sprites'))
+                    for sprite_id in entry.pop('removed_sprites'):
+                        sprites.pop(sprite_id, None)
+                    state.update(entry)
+                    state['journal_entries'] += 1
+        except FileNotFoundError:
+            pass
+        
+        full_objects = {obj_id: json.loads(rec) for obj_id, rec in self.baseline_objects.items()}
+        full_objects.update(objects)
+        for record in full_objects.values():
+            record['state_turn_count'] = state['scheduler_turn'] - record.pop('state_entered_turn')
+        state['objects'] = full_objects
+        state['sprites'] = sprites
+        return state
     
     def load_game(self, filename: str) -> str:
-        """Load game state"""
+        """Load game state (delta or full save)"""
         try:
-            with open(f"{filename}.json", 'r') as f:
-                state = json.load(f)
+            state = self.read_save(filename)
             
             self.player_name = state.get('player_name', 'Player')
             self.player_location = state['player_location']
@@ -1102,21 +2112,19 @@ class GameEngineRPG:
             self.deaths = state.get('deaths', 0)
             self.potions_consumed = state.get('potions_consumed', 0)
             
-            # Restore object states
-            for obj_id, obj_state in state['objects'].items():
-                if obj_id in self.objects:
-                    obj = self.objects[obj_id]
-                    obj.location = obj_state['location']
-                    obj.state = obj_state['state']
-                    obj.state_turn_count = obj_state['state_turn_count']
-                    obj.properties = obj_state['properties']
+            # Restore objects and sprites, on the save's scheduler timeline so
+            # later journal entries line up with the checkpoint
+            self.scheduler.turn = state.get('scheduler_turn', self.scheduler.turn)
+            self.restore_world_state(state)
             
-            # Restore sprites
-            self.sprites = {}
-            # We'd need to restore sprites from templates here if needed
+            # Later saves to the same file continue its journal
+            if state.get('format') == 'delta':
+                self.save_journals[filename] = {'generation': state['generation'],
+                                                'entries': state['journal_entries']}
+                self.take_changes(('save', filename))  # The file already holds the loaded world
             
-            return f"Game loaded from {filename}.json\n\n" + self.look()
-        except FileNotFoundError:
-            return f"Save file {filename}.json not found."
+            return f"Game loaded from {state['path']}\n\n" + self.look()
+        except FileNotFoundError as e:
+            return f"Save file {e.filename or filename} not found."  # The path(s) actually tried
         except Exception as e:
             return f"Error loading game: {e}"
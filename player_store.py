@@ -0,0 +1,103 @@
+"""
+Write-behind persistence for multiplayer player state
+
+GameEngineRPG used to write players/<name>/player.json on every turn.
+PlayerStore keeps the latest state per player in memory instead and a
+background thread hands the dirty ones to the storage backend (see
+storage.py) every interval seconds, as one batch, so the game loop (or the
+server's event loop) never waits on I/O. Both backends write atomically:
+a crash loses at most the last interval of play, never leaves a
+half-written player.
+"""
+
+import atexit
+import threading
+from typing import Any, Dict, Optional
+from storage import Storage
+
+
+class PlayerStore:
+    """
+    Pending player states, flushed in batches by a writer thread.
+    
+    save() only records the state, or with urgent=True also wakes the
+    writer to flush it now (when a player disconnects); flush() writes
+    everything pending from the caller's thread; close() flushes and stops
+    the thread. Pending states are also flushed at interpreter exit.
+    """
+    
+    def __init__(self, storage: Storage, interval: float = 5.0):
+        self.storage = storage
+        self.interval = interval
+        self.pending: Dict[str, Dict[str, Any]] = {}  # player name -> latest unsaved state
+        self.lock = threading.Lock()  # Guards pending
+        self.write_lock = threading.Lock()  # One batch on disk at a time
+        self.stats = {'saves': 0, 'writes': 0, 'batches': 0, 'coalesced': 0, 'errors': 0}
+        self.stopped = threading.Event()
+        self.urgent = threading.Event()  # Wakes the writer before the interval is up
+        self.thread: Optional[threading.Thread] = None
+        if interval > 0:
+            self.thread = threading.Thread(target=self._run, name="player-store", daemon=True)
+            self.thread.start()
+        atexit.register(self.close)
+    
+    def save(self, player_name: str, state: Dict[str, Any], urgent: bool = False):
+        """Mark a player dirty with their latest state (written on the next flush, or now if urgent)"""
+        with self.lock:
+            if player_name in self.pending:
+                self.stats['coalesced'] += 1
+            self.pending[player_name] = state
+            self.stats['saves'] += 1
+        if urgent:
+            if self.thread is None:
+                self.flush(player_name)
+            else:
+                self.urgent.set()
+    
+    def load(self, player_name: str) -> Optional[Dict[str, Any]]:
+        """The latest state for a player, unsaved or on disk (None if neither)"""
+        with self.lock:
+            state = self.pending.get(player_name)
+        if state is not None:
+            return state
+        return self.storage.load_player(player_name)
+    
+    def flush(self, player_name: Optional[str] = None):
+        """Write pending states now (all players, or just one)"""
+        with self.write_lock:
+            with self.lock:
+                if player_name is None:
+                    batch, self.pending = self.pending, {}
+                elif player_name in self.pending:
+                    batch = {player_name: self.pending.pop(player_name)}
+                else:
+                    batch = {}
+            if not batch:
+                return
+            
+            try:
+                self.storage.save_players(batch)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Warning: could not save players {', '.join(batch)}: {e}")
+                with self.lock:
+                    for name, state in batch.items():
+                        self.pending.setdefault(name, state)  # Retry unless a newer state arrived
+                return
+            self.stats['batches'] += 1
+            self.stats['writes'] += len(batch)
+    
+    def _run(self):
+        while not self.stopped.is_set():
+            self.urgent.wait(self.interval)
+            self.urgent.clear()
+            self.flush()
+    
+    def close(self):
+        """Flush everything and stop the writer thread"""
+        self.stopped.set()
+        self.urgent.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+        atexit.unregister(self.close)
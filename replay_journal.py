@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded multiplayer session offline
+
+Rebuilds the server from a command journal's snapshot (see
+command_journal.py) and runs every recorded join, command, tick and
+leave through it with no network and no timers, then reports how fast
+that went against the recorded wall-clock time and whether every event
+printed what it printed live. Use it to restore-test a journal, or as
+a regression and load test: record a session once, replay it after
+each change.
+
+Usage: python ssh_server_multiplayer_rpg.py --journal session.journal ...   (record)
+       python replay_journal.py session.journal [--config config]          (replay)
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+from command_journal import read_journal
+
+WORLD_PATH = "config" if os.path.isdir("config") else os.path.dirname(os.path.abspath(__file__))
+
+
+async def replay(path: str, config_path: str, verbose: bool = False):
+    from ssh_server_multiplayer_rpg import MultiplayerGameServer
+    
+    snapshot, entries = read_journal(path)
+    settings = snapshot.get('settings', {})
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:  # The server prints every join and leave
+        server = MultiplayerGameServer(config_path=config_path, sim_radius=settings.get('sim_radius'),
+                                       sprite_table=settings.get('sprite_table', False))
+        server.restore_snapshot(snapshot)
+        stats = await server.replay(entries)
+    return stats, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a command journal offline')
+    parser.add_argument('journal', help='Journal file written by the server with --journal')
+    parser.add_argument('--config', default=WORLD_PATH, help='Config directory the session ran with')
+    parser.add_argument('--verbose', action='store_true', help='Show the server output')
+    args = parser.parse_args()
+    
+    try:
+        stats, entries = asyncio.run(replay(args.journal, args.config, args.verbose))
+    except ImportError as e:
+        print(f"Error: {e} (the multiplayer server needs asyncssh)")
+        sys.exit(2)
+    
+    recorded = entries[-1]['time'] if entries else 0.0
+    seconds = stats['seconds']
+    print(f"Replayed {stats['events']} events ({stats['commands']} commands, {stats['ticks']} ticks) "
+          f"in {seconds:.3f}s")
+    if seconds > 0:
+        speed = f"   {stats['events'] / seconds:,.0f} events/s"
+        if recorded >= 1:  # A real session, not a scripted one
+            speed += f", recorded over {recorded:.1f}s ({recorded / seconds:,.0f}x real time)"
+        print(speed)
+    if stats['mismatches']:
+        entry = entries[stats['first_mismatch']]
+        print(f"❌ {stats['mismatches']} events came out differently; first at event "
+              f"{stats['first_mismatch']} (turn {entry['turn']}): {entry.get('player', '')} "
+              f"{entry.get('command', entry['event'])}")
+        sys.exit(1)
+    print("✅ Every event matched the recording")
+
+
+if __name__ == "__main__":
+    main()
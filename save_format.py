@@ -0,0 +1,257 @@
+"""
+Compact binary save files (.sav)
+
+A save state (the dict save_game() would write as JSON) is stored as:
+    
+    magic b"ZSAV" | version (1 byte) | compression (1 byte) | body
+
+The body, compressed with zlib or lzma if asked, holds an interned string
+table followed by one tagged value tree. Every string - dict keys, object
+and room ids, states - is written once in the table and referenced by a
+varint index, so the field names and ids JSON repeats for every object cost
+a byte or two each. Integers are zigzag varints, floats 8-byte doubles.
+
+Only JSON-style values (dict with str keys, list, str, int, float, bool,
+None) are supported, so a .sav converts to and from JSON without loss.
+save_state()/load_state() are what the engines use: a save named "slot1"
+is slot1.json or slot1.sav depending on the engine's save_format.
+"""
+
+import errno
+import json
+import lzma
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from storage import write_json_atomic
+
+MAGIC = b"ZSAV"
+VERSION = 1
+EXTENSION = ".sav"
+FORMATS = {'json': ".json", 'sav': EXTENSION}  # Save format -> file extension
+
+COMPRESSION = {'none': 0, 'zlib': 1, 'lzma': 2}
+
+# Value tags
+NONE, FALSE, TRUE, INT, FLOAT, STR, LIST, DICT = range(8)
+
+_double = struct.Struct('<d')
+
+
+class SaveFormatError(ValueError):
+    """Not a save file this version understands"""
+
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _encode(value: Any, out: bytearray, strings: Dict[str, int]):
+    if isinstance(value, str):
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        out.append(STR)
+        _write_varint(out, index)
+    elif isinstance(value, dict):
+        out.append(DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise TypeError(f"save keys must be strings, not {type(key).__name__}")
+            index = strings.get(key)
+            if index is None:
+                index = strings[key] = len(strings)
+            _write_varint(out, index)
+            _encode(item, out, strings)
+    elif value is None:
+        out.append(NONE)
+    elif value is True:
+        out.append(TRUE)
+    elif value is False:
+        out.append(FALSE)
+    elif isinstance(value, int):
+        out.append(INT)
+        _write_varint(out, value << 1 if value >= 0 else ((-value) << 1) - 1)  # Zigzag
+    elif isinstance(value, float):
+        out.append(FLOAT)
+        out += _double.pack(value)
+    elif isinstance(value, (list, tuple)):
+        out.append(LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode(item, out, strings)
+    else:
+        raise TypeError(f"can't save a {type(value).__name__}")
+
+
+def _decode(body: bytes) -> Any:
+    """Read the string table, then the value tree"""
+    pos = 0
+    
+    def varint() -> int:
+        nonlocal pos
+        byte = body[pos]
+        pos += 1
+        if byte < 0x80:  # Almost every count, index and small int
+            return byte
+        result, shift = byte & 0x7f, 7
+        while True:
+            byte = body[pos]
+            pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+    
+    strings: List[str] = []
+    for _ in range(varint()):
+        length = varint()
+        strings.append(body[pos:pos + length].decode('utf-8'))
+        pos += length
+    
+    def value() -> Any:
+        nonlocal pos
+        tag = body[pos]
+        pos += 1
+        if tag == STR:
+            return strings[varint()]
+        if tag == DICT:
+            result = {}
+            for _ in range(varint()):
+                key = strings[varint()]
+                result[key] = value()
+            return result
+        if tag == INT:
+            raw = varint()
+            return -((raw + 1) >> 1) if raw & 1 else raw >> 1
+        if tag == LIST:
+            return [value() for _ in range(varint())]
+        if tag == NONE:
+            return None
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        if tag == FLOAT:
+            pos += 8
+            return _double.unpack_from(body, pos - 8)[0]
+        raise SaveFormatError(f"bad value tag {tag} at byte {pos - 1}")
+    
+    return value()
+
+
+def dumps(state: Any, compression: str = 'zlib') -> bytes:
+    """Encode a save state"""
+    if compression not in COMPRESSION:
+        raise ValueError(f"Unknown compression '{compression}' (expected {', '.join(COMPRESSION)})")
+    
+    strings: Dict[str, int] = {}
+    tree = bytearray()
+    _encode(state, tree, strings)
+    
+    body = bytearray()
+    _write_varint(body, len(strings))
+    for string in strings:  # Insertion order = index order
+        encoded = string.encode('utf-8')
+        _write_varint(body, len(encoded))
+        body += encoded
+    body += tree
+    
+    if compression == 'zlib':
+        body = zlib.compress(body, 6)
+    elif compression == 'lzma':
+        body = lzma.compress(body)
+    return MAGIC + bytes((VERSION, COMPRESSION[compression])) + bytes(body)
+
+
+def loads(data: bytes) -> Any:
+    """Decode a save state written by dumps()"""
+    if data[:4] != MAGIC:
+        raise SaveFormatError("not a .sav file")
+    if data[4] != VERSION:
+        raise SaveFormatError(f"save format version {data[4]}, this engine reads version {VERSION}")
+    
+    body = data[6:]
+    if data[5] == COMPRESSION['zlib']:
+        body = zlib.decompress(body)
+    elif data[5] == COMPRESSION['lzma']:
+        body = lzma.decompress(body)
+    elif data[5] != COMPRESSION['none']:
+        raise SaveFormatError(f"unknown compression {data[5]}")
+    
+    try:
+        return _decode(body)
+    except IndexError:
+        raise SaveFormatError("save file is truncated") from None
+
+
+def dump(state: Any, path: str, compression: str = 'zlib'):
+    """Write a .sav file atomically (temp file + fsync + rename)"""
+    data = dumps(state, compression)
+    path = Path(path)
+    temp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except OSError:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+
+def load(path: str) -> Any:
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def save_state(filename: str, state: Dict[str, Any], save_format: str = 'json',
+               compression: str = 'zlib') -> str:
+    """
+    Write a save as filename.json or filename.sav and return the path.
+    The file in the other format, if any, is removed so loading never
+    picks up a stale one.
+    """
+    if save_format not in FORMATS:
+        raise ValueError(f"Unknown save format '{save_format}' (expected {', '.join(FORMATS)})")
+    
+    path = f"{filename}{FORMATS[save_format]}"
+    if save_format == 'sav':
+        dump(state, path, compression)
+    else:
+        write_json_atomic(Path(path), state)
+    for other in FORMATS.values():
+        if other != FORMATS[save_format]:
+            try:
+                os.remove(f"{filename}{other}")
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def load_state(filename: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Read a save written by save_state() in either format: (state, path).
+    If both files exist the newer one wins. FileNotFoundError if neither,
+    with both paths in its filename.
+    """
+    paths = [f"{filename}{extension}" for extension in FORMATS.values()]
+    existing = [path for path in paths if os.path.exists(path)]
+    if not existing:
+        raise FileNotFoundError(errno.ENOENT, "No save file", " or ".join(paths))
+    path = max(existing, key=os.path.getmtime)
+    if path.endswith(EXTENSION):
+        return load(path), path
+    with open(path, 'r') as f:
+        return json.load(f), path
@@ -6,17 +6,24 @@ Now generates dynamic combat art showing attacks, counter-attacks, victories!
 
 import asyncio
 import asyncssh
+import hashlib
+import heapq
 import sys
 import logging
 import os
 from pathlib import Path
-from game_engine_rpg import GameEngineRPG
-from typing import Dict, Optional
+from game_engine_rpg import GameEngineRPG, PlayerContext
+from typing import Callable, Dict, List, Optional
 import json
 import requests
 import base64
 import configparser
 import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from PIL import Image
 from io import BytesIO
 
@@ -81,19 +88,289 @@ logging.basicConfig(
 )
 
 
+def stable_hash(*parts) -> str:
+    """Short content hash that is the same on every run (unlike hash())"""
+    return hashlib.sha1("\x1f".join(str(part) for part in parts).encode('utf-8')).hexdigest()[:16]
+
+
+class ImageFrame:
+    """
+    An image encoded once into base64 and shared by every recipient.
+    
+    chunks() streams it as complete escape sequences: IMAGE+ parts that the
+    client joins up, then a final IMAGE. Each chunk stands alone, so text
+    can go out between chunks without breaking the picture.
+    """
+    
+    def __init__(self, image_data: bytes):
+        self.data = image_data
+        self.encoded = base64.b64encode(image_data).decode('ascii')
+    
+    def __len__(self):
+        return len(self.encoded)
+    
+    def chunks(self, size: int):
+        last = (len(self.encoded) - 1) // size * size if self.encoded else 0
+        for start in range(0, last, size):
+            yield f"\x1b]IMAGE+;{self.encoded[start:start + size]}\x1b\\"
+        yield f"\x1b]IMAGE;{self.encoded[last:]}\x1b\\"
+
+
+class ImageCache:
+    """
+    Two-tier image cache.
+    
+    Memory: LRU of JPEG bytes (and their ImageFrame once an image has been
+    sent), capped at memory_bytes.
+    Disk: {stable_hash(key)}.jpg files in cache_dir, capped at disk_bytes;
+    files unused for max_age seconds are dropped. Hits refresh the file's
+    mtime, so the oldest mtime is always the least recently used file.
+    """
+    
+    def __init__(self, cache_dir: Path, memory_bytes: int, disk_bytes: int, max_age: float):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()  # Used from the event loop and executor threads
+        
+        self.memory = OrderedDict()  # key -> [image_data, ImageFrame or None]
+        self.memory_used = 0
+        self.disk = OrderedDict()    # file name -> size, oldest first
+        self.disk_used = 0
+        self.stats = {'hits_memory': 0, 'hits_disk': 0, 'misses': 0,
+                      'evictions_memory': 0, 'evictions_disk': 0}
+        
+        self.scan_disk()
+    
+    def scan_disk(self):
+        """Index the files already in cache_dir and trim them to the limits"""
+        for path in self.cache_dir.glob('*.tmp'):  # Left over from an interrupted write
+            self.remove_file(path.name)
+        
+        files = []
+        for path in self.cache_dir.glob('*.jpg'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.name, stat.st_size))
+        
+        expired_before = time.time() - self.max_age
+        for mtime, name, size in sorted(files):
+            if mtime < expired_before:
+                self.remove_file(name)
+                self.stats['evictions_disk'] += 1
+            else:
+                self.disk[name] = size
+                self.disk_used += size
+        for name in self.trim_disk():
+            self.remove_file(name)
+    
+    def file_name(self, key: str) -> str:
+        return f"{stable_hash(key)}.jpg"
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry:
+                self.memory.move_to_end(key)
+                self.stats['hits_memory'] += 1
+                return entry[0]
+            
+            name = self.file_name(key)
+            if name not in self.disk:
+                self.stats['misses'] += 1
+                return None
+        
+        # File I/O happens outside the lock, so frame() on the event loop never waits on the disk
+        path = self.cache_dir / name
+        try:
+            if path.stat().st_mtime < time.time() - self.max_age:
+                raise FileNotFoundError(name)
+            with open(path, 'rb') as f:
+                image_data = f.read()
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.disk_used -= self.disk.pop(name, 0)
+                self.stats['misses'] += 1
+            self.remove_file(name)
+            return None
+        
+        with self.lock:
+            if name in self.disk:
+                self.disk.move_to_end(name)
+            self.stats['hits_disk'] += 1
+            self.remember(key, image_data)
+        return image_data
+    
+    def put(self, key: str, image_data: bytes):
+        with self.lock:
+            self.remember(key, image_data)
+        
+        # Write to a temp file and rename, so readers never see half an image
+        name = self.file_name(key)
+        path = self.cache_dir / name
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(image_data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not cache image {key}: {e}")
+            self.remove_file(tmp_path.name)
+            return
+        
+        with self.lock:
+            self.disk_used += len(image_data) - self.disk.pop(name, 0)
+            self.disk[name] = len(image_data)
+            evicted = self.trim_disk()
+        for name in evicted:
+            self.remove_file(name)
+    
+    def frame(self, key: Optional[str], image_data: bytes) -> ImageFrame:
+        """Encoded frame for an image, built at most once while it stays in memory"""
+        with self.lock:
+            entry = self.memory.get(key) if key else None
+            if entry and entry[0] is image_data:
+                if entry[1] is None:
+                    entry[1] = ImageFrame(image_data)
+                    self.memory_used += len(entry[1])
+                    self.trim_memory()
+                return entry[1]
+        return ImageFrame(image_data)
+    
+    def remember(self, key: str, image_data: bytes):
+        entry = self.memory.pop(key, None)
+        if entry:
+            self.memory_used -= len(entry[0]) + len(entry[1] or ())
+        if len(image_data) <= self.memory_bytes:
+            self.memory[key] = [image_data, None]
+            self.memory_used += len(image_data)
+            self.trim_memory()
+    
+    def trim_memory(self):
+        while self.memory_used > self.memory_bytes:
+            _, (image_data, frame) = self.memory.popitem(last=False)
+            self.memory_used -= len(image_data) + len(frame or ())
+            self.stats['evictions_memory'] += 1
+    
+    def trim_disk(self) -> List[str]:
+        """Drop the oldest files from the index until it fits; the caller deletes them"""
+        evicted = []
+        while self.disk_used > self.disk_bytes and self.disk:
+            name, size = self.disk.popitem(last=False)
+            self.disk_used -= size
+            evicted.append(name)
+            self.stats['evictions_disk'] += 1
+        return evicted
+    
+    def remove_file(self, name: str):
+        try:
+            os.remove(self.cache_dir / name)
+        except OSError:
+            pass
+
+
+# Render priorities (lower renders first)
+PRIORITY_COMBAT = 0
+PRIORITY_SCENE = 1
+PRIORITY_PORTRAIT = 2
+
+
+class RenderJob:
+    """One queued render, shared by every caller waiting on the same cache_key"""
+    
+    def __init__(self, prompt: str, cache_key: Optional[str], priority: int, seq: int):
+        self.prompt = prompt
+        self.cache_key = cache_key
+        self.priority = priority
+        self.seq = seq
+        self.future = asyncio.get_running_loop().create_future()
+        self.wanted_checks = []  # None means "always wanted"
+    
+    def is_wanted(self) -> bool:
+        """Still worth rendering if any waiting caller still wants it"""
+        return any(check is None or check() for check in self.wanted_checks)
+    
+    def finish(self, image_data: Optional[bytes]):
+        if not self.future.done():
+            self.future.set_result(image_data)
+
+
+class RenderQueue:
+    """Bounded priority queue of render jobs; when full, the least urgent job gives way"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.heap = []
+        self.ready = asyncio.Event()
+    
+    def __len__(self):
+        return len(self.heap)
+    
+    def put(self, job: RenderJob) -> Optional[RenderJob]:
+        """Queue a job; returns whichever job was turned away (this one or an evicted one)"""
+        if len(self.heap) >= self.maxsize:
+            worst = max(self.heap)
+            if worst[:2] < (job.priority, job.seq):
+                return job
+            self.heap.remove(worst)
+            heapq.heapify(self.heap)
+            heapq.heappush(self.heap, (job.priority, job.seq, job))
+            return worst[2]
+        
+        heapq.heappush(self.heap, (job.priority, job.seq, job))
+        self.ready.set()
+        return None
+    
+    async def get(self) -> RenderJob:
+        while not self.heap:
+            self.ready.clear()
+            await self.ready.wait()
+        return heapq.heappop(self.heap)[2]
+
+
 class StableDiffusionLoadBalancer:
     """Load balancer for multiple SD servers"""
     
-    def __init__(self, config_path: str = "stablediffusion.ini"):
+    EWMA_ALPHA = 0.3  # Weight of the newest latency sample
+    LATENCY_WINDOW = 50  # Samples kept per server for the p95 hedge delay
+    
+    def __init__(self, config_path: str = "stablediffusion.ini", cache_dir: Optional[Path] = None):
         # Use config from install dir, cache in AppData
         self.config_path = APP_PATHS['config'] / config_path
         self.servers = []
         self.current_index = 0
-        self.cache_dir = APP_PATHS['cache']
+        self.cache_dir = Path(cache_dir) if cache_dir else APP_PATHS['cache']
         self.cache_dir.mkdir(exist_ok=True)
         self.settings = {}
+        self.lock = threading.Lock()  # Guards server health; renders run on many threads
         
         self.load_config()
+        self.cache = ImageCache(
+            self.cache_dir,
+            memory_bytes=int(self.settings.get('memory_cache_mb', 64) * 1024 * 1024),
+            disk_bytes=int(self.settings.get('disk_cache_mb', 512) * 1024 * 1024),
+            max_age=self.settings.get('disk_cache_max_age_days', 30) * 86400
+        )
+        
+        # Renders run on a bounded thread pool over pooled HTTP connections,
+        # never on the event loop
+        max_renders = self.settings.get('max_concurrent_renders', 2 * max(1, len(self.servers)))
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(self.servers)), pool_maxsize=max_renders)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_renders, thread_name_prefix='sd-render')
+        
+        # Single-flight render queue (created on first use, inside the event loop)
+        self.render_workers = max_renders
+        self.queue: Optional[RenderQueue] = None
+        self.inflight: Dict[str, RenderJob] = {}
+        self.job_seq = 0
+        self.stats = {'coalesced': 0, 'dropped_stale': 0, 'dropped_full': 0}
     
     def load_config(self):
         """Load SD server configuration"""
@@ -114,7 +391,16 @@ class StableDiffusionLoadBalancer:
                         'port': config.getint(section, 'port', fallback=7860),
                         'weight': config.getint(section, 'weight', fallback=1),
                         'timeout': config.getint(section, 'timeout', fallback=60),
-                        'url': f"http://{config.get(section, 'host')}:{config.getint(section, 'port', fallback=7860)}"
+                        'url': f"http://{config.get(section, 'host')}:{config.getint(section, 'port', fallback=7860)}",
+                        # Runtime health, see get_next_server() and record_result()
+                        'outstanding': 0,
+                        'ewma': None,
+                        'latencies': deque(maxlen=self.LATENCY_WINDOW),
+                        'failures': 0,
+                        'circuit': 'closed',
+                        'open_until': 0.0,
+                        'cooldown': 0.0,
+                        'probing': False
                     }
                     self.servers.append(server)
         
@@ -128,7 +414,18 @@ class StableDiffusionLoadBalancer:
                 'sampler': config.get('settings', 'default_sampler', fallback='DPM++ 2M'),
                 'cache_images': config.getboolean('settings', 'cache_images', fallback=True),
                 'image_format': config.get('settings', 'image_format', fallback='jpg'),
-                'image_quality': config.getint('settings', 'image_quality', fallback=85)
+                'image_quality': config.getint('settings', 'image_quality', fallback=85),
+                'memory_cache_mb': config.getfloat('settings', 'memory_cache_mb', fallback=64),
+                'disk_cache_mb': config.getfloat('settings', 'disk_cache_mb', fallback=512),
+                'disk_cache_max_age_days': config.getfloat('settings', 'disk_cache_max_age_days', fallback=30),
+                'max_concurrent_renders': config.getint('settings', 'max_concurrent_renders',
+                                                        fallback=2 * max(1, len(self.servers))),
+                'failure_threshold': config.getint('settings', 'failure_threshold', fallback=3),
+                'circuit_cooldown': config.getfloat('settings', 'circuit_cooldown', fallback=30),
+                'circuit_max_cooldown': config.getfloat('settings', 'circuit_max_cooldown', fallback=300),
+                'hedge_requests': config.getboolean('settings', 'hedge_requests', fallback=True),
+                'hedge_min_samples': config.getint('settings', 'hedge_min_samples', fallback=10),
+                'render_queue_size': config.getint('settings', 'render_queue_size', fallback=32)
             }
         
         # Load prompt styles
@@ -138,19 +435,91 @@ class StableDiffusionLoadBalancer:
             self.settings['negative_prompt'] = config.get('prompt_style', 'negative_prompt',
                 fallback='blurry, low quality, distorted')
         
+        for server in self.servers:
+            server['weight'] = max(1, server['weight'])
+            server['cooldown'] = self.settings.get('circuit_cooldown', 30)
+        
         if self.servers:
             print(f"ðŸŽ¨ Loaded {len(self.servers)} SD servers")
             for server in self.servers:
                 print(f"   â€¢ {server['name']}: {server['url']}")
     
-    def get_next_server(self) -> Optional[Dict]:
-        """Round-robin server selection"""
-        if not self.servers:
+    def get_next_server(self, exclude=()) -> Optional[Dict]:
+        """
+        Pick a healthy server and reserve a request slot on it.
+        
+        Prefers the fewest outstanding requests per unit of weight, then the
+        lowest latency EWMA, then round-robin order. Servers with an open
+        circuit are skipped until their cooldown ends, after which they take
+        one half-open probe at a time. Pair with record_result().
+        """
+        with self.lock:
+            now = time.monotonic()
+            best = None
+            best_key = None
+            for offset in range(len(self.servers)):
+                index = (self.current_index + offset) % len(self.servers)
+                server = self.servers[index]
+                if server['name'] in exclude or not self._accepts_request(server, now):
+                    continue
+                key = ((server['outstanding'] + 1) / server['weight'], server['ewma'] or 0.0)
+                if best_key is None or key < best_key:
+                    best, best_key, best_index = server, key, index
+            
+            if best is None:
+                return None
+            
+            best['outstanding'] += 1
+            if best['circuit'] == 'half_open':
+                best['probing'] = True
+            self.current_index = (best_index + 1) % len(self.servers)
+            return best
+    
+    def _accepts_request(self, server: Dict, now: float) -> bool:
+        """Circuit state check (caller holds the lock)"""
+        if server['circuit'] == 'open':
+            if now < server['open_until']:
+                return False
+            server['circuit'] = 'half_open'
+            server['probing'] = False
+        if server['circuit'] == 'half_open':
+            return not server['probing']
+        return True
+    
+    def record_result(self, server: Dict, latency: float, success: bool):
+        """Release a slot reserved by get_next_server() and update server health"""
+        with self.lock:
+            server['outstanding'] -= 1
+            server['probing'] = False
+            
+            if success:
+                if server['ewma'] is None:
+                    server['ewma'] = latency
+                else:
+                    server['ewma'] = self.EWMA_ALPHA * latency + (1 - self.EWMA_ALPHA) * server['ewma']
+                server['latencies'].append(latency)
+                server['failures'] = 0
+                if server['circuit'] != 'closed':
+                    print(f"[SD] {server['name']} recovered - circuit closed")
+                server['circuit'] = 'closed'
+                server['cooldown'] = self.settings.get('circuit_cooldown', 30)
+                return
+            
+            server['failures'] += 1
+            if server['circuit'] == 'half_open' or server['failures'] >= self.settings.get('failure_threshold', 3):
+                # Open (or re-open) the circuit, backing off further each time
+                server['circuit'] = 'open'
+                server['open_until'] = time.monotonic() + server['cooldown']
+                print(f"[SD] {server['name']} failing - circuit open for {server['cooldown']:.0f}s")
+                server['cooldown'] = min(server['cooldown'] * 2, self.settings.get('circuit_max_cooldown', 300))
+    
+    def latency_p95(self, server: Dict) -> Optional[float]:
+        """95th percentile of recent successful render times, once there are enough samples"""
+        with self.lock:
+            samples = sorted(server['latencies'])
+        if not samples or len(samples) < self.settings.get('hedge_min_samples', 10):
             return None
-        
-        server = self.servers[self.current_index]
-        self.current_index = (self.current_index + 1) % len(self.servers)
-        return server
+        return samples[int(0.95 * (len(samples) - 1))]
     
     def sanitize_look_to_prompt(self, look_output: str) -> str:
         """Convert LOOK output to SD prompt"""
@@ -178,77 +547,210 @@ class StableDiffusionLoadBalancer:
         
         return prompt.strip()
     
+    def load_cached(self, cache_key: Optional[str]) -> Optional[bytes]:
+        """Cached image for cache_key, if any"""
+        if cache_key and self.settings.get('cache_images', True):
+            image_data = self.cache.get(cache_key)
+            if image_data:
+                print(f"[SD] Using cached image: {cache_key}")
+            return image_data
+        return None
+    
+    def store_cached(self, cache_key: Optional[str], image_data: bytes):
+        """Cache a freshly rendered image"""
+        if cache_key and self.settings.get('cache_images', True):
+            self.cache.put(cache_key, image_data)
+            print(f"[SD] Cached: {cache_key}")
+    
+    def render_on(self, server: Dict, prompt: str) -> Optional[bytes]:
+        """One txt2img request to a server reserved by get_next_server()"""
+        print(f"ðŸŽ¨ Generating: {prompt[:60]}...")
+        
+        started = time.monotonic()
+        image_data = None
+        try:
+            response = self.http.post(
+                f"{server['url']}/sdapi/v1/txt2img",
+                json={
+                    "prompt": prompt,
+                    "negative_prompt": self.settings.get('negative_prompt', ''),
+                    "steps": self.settings.get('steps', 20),
+                    "width": self.settings.get('width', 512),
+                    "height": self.settings.get('height', 512),
+                    "cfg_scale": self.settings.get('cfg', 7),
+                    "sampler_name": self.settings.get('sampler', 'DPM++ 2M')
+                },
+                timeout=server['timeout']
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                
+                png_data = base64.b64decode(result['images'][0])
+                
+                if self.settings.get('image_format') == 'jpg':
+                    img = Image.open(BytesIO(png_data))
+                    jpg_buffer = BytesIO()
+                    img.convert('RGB').save(jpg_buffer, 'JPEG', 
+                                           quality=self.settings.get('image_quality', 85))
+                    image_data = jpg_buffer.getvalue()
+                else:
+                    image_data = png_data
+        except Exception as e:
+            print(f"âŒ SD error: {e}")
+        finally:
+            self.record_result(server, time.monotonic() - started, image_data is not None)
+        
+        return image_data
+    
     def generate_image(self, prompt: str, cache_key: str = None) -> Optional[bytes]:
         """Generate image using load-balanced SD servers"""
         
         # Check cache first
-        if cache_key and self.settings.get('cache_images', True):
-            cache_path = self.cache_dir / f"{cache_key}.jpg"
-            if cache_path.exists():
-                print(f"ðŸŽ¨ Using cached image: {cache_key}")
-                with open(cache_path, 'rb') as f:
-                    return f.read()
-        
-        # Try servers
-        attempts = 0
-        max_attempts = len(self.servers) if self.servers else 0
-        
-        while attempts < max_attempts:
-            server = self.get_next_server()
+        image_data = self.load_cached(cache_key)
+        if image_data:
+            return image_data
+        
+        # Try each healthy server at most once
+        tried = set()
+        while True:
+            server = self.get_next_server(exclude=tried)
             if not server:
-                break
+                return None
+            tried.add(server['name'])
             
-            print(f"ðŸŽ¨ Generating: {prompt[:60]}...")
+            image_data = self.render_on(server, prompt)
+            if image_data:
+                self.store_cached(cache_key, image_data)
+                print(f"âœ… Image generated!")
+                return image_data
+    
+    async def generate_image_async(self, prompt: str, cache_key: str = None) -> Optional[bytes]:
+        """Generate image on the render pool so the event loop keeps serving players"""
+        loop = asyncio.get_running_loop()
+        
+        # Cache I/O stays off the render pool so hits never queue behind renders
+        image_data = await loop.run_in_executor(None, self.load_cached, cache_key)
+        if image_data:
+            return image_data
+        
+        image_data = await self.render_hedged(prompt)
+        if image_data:
+            await loop.run_in_executor(None, self.store_cached, cache_key, image_data)
+            print(f"âœ… Image generated!")
+        return image_data
+    
+    async def render_hedged(self, prompt: str) -> Optional[bytes]:
+        """
+        Render on the best server; if it runs past its p95 latency, also try a
+        second server and take whichever answers first. Failed requests move
+        on to the next healthy server.
+        """
+        loop = asyncio.get_running_loop()
+        tried = set()
+        pending = set()
+        
+        while True:
+            # At most one hedge in flight alongside the original request
+            server = self.get_next_server(exclude=tried) if len(pending) < 2 else None
+            hedge_after = None
+            if server:
+                if pending:
+                    print(f"[SD] Render running past its p95 - hedging to {server['name']}")
+                tried.add(server['name'])
+                pending.add(loop.run_in_executor(self.executor, self.render_on, server, prompt))
+                if self.settings.get('hedge_requests', True):
+                    hedge_after = self.latency_p95(server)
+            elif not pending:
+                return None
             
-            try:
-                response = requests.post(
-                    f"{server['url']}/sdapi/v1/txt2img",
-                    json={
-                        "prompt": prompt,
-                        "negative_prompt": self.settings.get('negative_prompt', ''),
-                        "steps": self.settings.get('steps', 20),
-                        "width": self.settings.get('width', 512),
-                        "height": self.settings.get('height', 512),
-                        "cfg_scale": self.settings.get('cfg', 7),
-                        "sampler_name": self.settings.get('sampler', 'DPM++ 2M')
-                    },
-                    timeout=server['timeout']
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    
-                    png_data = base64.b64decode(result['images'][0])
-                    
-                    if self.settings.get('image_format') == 'jpg':
-                        img = Image.open(BytesIO(png_data))
-                        jpg_buffer = BytesIO()
-                        img.convert('RGB').save(jpg_buffer, 'JPEG', 
-                                               quality=self.settings.get('image_quality', 85))
-                        image_data = jpg_buffer.getvalue()
-                    else:
-                        image_data = png_data
-                    
-                    if cache_key and self.settings.get('cache_images', True):
-                        cache_path = self.cache_dir / f"{cache_key}.jpg"
-                        with open(cache_path, 'wb') as f:
-                            f.write(image_data)
-                        print(f"âœ… Cached: {cache_key}")
-                    
-                    print(f"âœ… Image generated!")
+            done, pending = await asyncio.wait(pending, timeout=hedge_after,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for request in done:
+                image_data = request.result()
+                if image_data:
                     return image_data
-                else:
-                    attempts += 1
-                    
+    
+    async def render(self, prompt: str, cache_key: str = None, priority: int = PRIORITY_SCENE,
+                     wanted: Optional[Callable[[], bool]] = None) -> Optional[bytes]:
+        """
+        Queue a render and wait for it.
+        
+        Callers asking for a cache_key that is already queued or rendering
+        share that job instead of sending another txt2img request. Combat
+        renders go ahead of scenes and portraits. `wanted` is checked just
+        before rendering; if no waiting caller still wants the image (e.g.
+        the player left the room), it is skipped and None is returned.
+        """
+        job = self.inflight.get(cache_key) if cache_key else None
+        if job:
+            self.stats['coalesced'] += 1
+            job.wanted_checks.append(wanted)
+            return await asyncio.shield(job.future)
+        
+        self.job_seq += 1
+        job = RenderJob(prompt, cache_key, priority, self.job_seq)
+        job.wanted_checks.append(wanted)
+        if cache_key:
+            self.inflight[cache_key] = job
+        
+        # Cache hits skip the queue
+        loop = asyncio.get_running_loop()
+        image_data = await loop.run_in_executor(None, self.load_cached, cache_key)
+        if image_data:
+            self._finish(job, image_data)
+            return image_data
+        
+        self._start_workers()
+        turned_away = self.queue.put(job)
+        if turned_away:
+            print(f"[SD] Render queue full - dropping {turned_away.cache_key or 'render'}")
+            self.stats['dropped_full'] += 1
+            self._finish(turned_away, None)
+        
+        return await asyncio.shield(job.future)
+    
+    def _start_workers(self):
+        if self.queue is None:
+            self.queue = RenderQueue(self.settings.get('render_queue_size', 32))
+            self.workers = [asyncio.create_task(self._render_worker())
+                            for _ in range(self.render_workers)]
+    
+    def _finish(self, job: RenderJob, image_data: Optional[bytes]):
+        if job.cache_key and self.inflight.get(job.cache_key) is job:
+            del self.inflight[job.cache_key]
+        job.finish(image_data)
+    
+    async def _render_worker(self):
+        while True:
+            job = await self.queue.get()
+            if not job.is_wanted():
+                self.stats['dropped_stale'] += 1
+                self._finish(job, None)
+                continue
+            
+            image_data = None
+            try:
+                image_data = await self.generate_image_async(job.prompt, job.cache_key)
             except Exception as e:
-                print(f"âŒ SD error: {e}")
-                attempts += 1
-        
-        return None
+                print(f"[SD] Render failed: {e}")
+            self._finish(job, image_data)
+    
+    def close(self):
+        """Stop render workers and threads and release pooled connections"""
+        if self.queue is not None:
+            for worker in self.workers:
+                worker.cancel()
+        self.executor.shutdown(wait=False)
+        self.http.close()
 
 
 class PlayerSession:
     """Represents one connected player"""
+    
+    IMAGE_CHUNK = 16 * 1024  # Image frames are written and drained this much at a time
+    IMAGE_SKIP_BUFFER = 256 * 1024  # Skip images while this much output is still unsent
+    
     def __init__(self, player_name: str, process):
         self.player_name = player_name
         self.process = process
@@ -257,25 +759,43 @@ class PlayerSession:
         self.inventory = set()
         self.last_message = ""
         self.supports_images = True
+        self.write_lock = asyncio.Lock()  # Keeps text out of the middle of an image chunk
     
     async def send(self, message: str):
         """Send message to this player"""
+        await self.write(message + "\n")
+    
+    async def write(self, text: str):
+        """Write raw text (e.g. a prompt), between image chunks if a frame is streaming"""
         try:
-            self.process.stdout.write(message + "\n")
-            await self.process.stdout.drain()
+            async with self.write_lock:
+                self.process.stdout.write(text)
+                await self.process.stdout.drain()
         except:
             pass
     
-    async def send_image(self, image_data: bytes):
-        """Send image using escape sequence"""
-        if not image_data:
+    def output_backlog(self) -> int:
+        """Bytes written to this player that the connection hasn't sent yet"""
+        try:
+            return self.process.channel.get_write_buffer_size()
+        except Exception:
+            return 0
+    
+    async def send_image(self, frame: ImageFrame):
+        """Stream an image frame in chunks, draining between them and letting text go first"""
+        if not frame:
+            return
+        
+        # A player who can't keep up gets the text, not the pictures
+        if self.output_backlog() > self.IMAGE_SKIP_BUFFER:
+            print(f"[SD] Skipping image for {self.player_name}: output buffer full")
             return
         
         try:
-            b64_image = base64.b64encode(image_data).decode('ascii')
-            escape_seq = f"\x1b]IMAGE;{b64_image}\x1b\\"
-            self.process.stdout.write(escape_seq)
-            await self.process.stdout.drain()
+            for chunk in frame.chunks(self.IMAGE_CHUNK):
+                async with self.write_lock:  # Queued text gets the lock before the next chunk
+                    self.process.stdout.write(chunk)
+                    await self.process.stdout.drain()
         except Exception as e:
             pass
 
@@ -289,15 +809,12 @@ class MultiplayerGameServer:
         
         self.engine = GameEngineRPG(config_path=config_path, player_name="SERVER")
         self.engine.start_game()
+        self.engine.index.discard_player(self.engine.player)  # Only connected players are in rooms
         
         self.players: Dict[str, PlayerSession] = {}
         
-        self.player_locations: Dict[str, str] = {}
-        self.player_inventories: Dict[str, set] = {}
-        self.player_health: Dict[str, int] = {}
-        self.player_pvp_mode: Dict[str, bool] = {}
-        self.player_deaths: Dict[str, int] = {}
-        self.player_kills: Dict[str, int] = {}
+        self.contexts: Dict[str, PlayerContext] = {}  # Each player's location, inventory and health
+        self.player_pvp_mode: Dict[str, bool] = {}  # Kills and deaths are counted on each PlayerContext
         
         self.combat_rules = self.load_combat_rules()
         
@@ -350,26 +867,23 @@ class MultiplayerGameServer:
     def add_player(self, player_name: str, session: PlayerSession):
         """Register new player"""
         self.players[player_name] = session
-        self.player_locations[player_name] = "entrance_hall"
-        self.player_inventories[player_name] = set()
-        self.player_health[player_name] = 100
+        old_ctx = self.contexts.get(player_name)
+        if old_ctx:
+            self.engine.index.discard_player(old_ctx)
+        self.contexts[player_name] = PlayerContext(name=player_name, location="entrance_hall")
+        self.engine.index.add_player(self.contexts[player_name])  # Moves keep the room index current
         self.player_pvp_mode[player_name] = False
-        self.player_deaths[player_name] = 0
-        self.player_kills[player_name] = 0
         
         print(f"âœ… Player joined: {player_name} ({len(self.players)} total)")
     
     def remove_player(self, player_name: str):
         """Remove disconnected player"""
         if player_name in self.players:
-            location = self.player_locations.get(player_name, "unknown")
+            ctx = self.contexts.pop(player_name, None)
+            location = ctx.location if ctx else "unknown"
+            if ctx:
+                self.engine.index.discard_player(ctx)
             del self.players[player_name]
-            if player_name in self.player_locations:
-                del self.player_locations[player_name]
-            if player_name in self.player_inventories:
-                del self.player_inventories[player_name]
-            if player_name in self.player_health:
-                del self.player_health[player_name]
             
             print(f"âŒ Player left: {player_name}")
             
@@ -381,10 +895,13 @@ class MultiplayerGameServer:
     
     def get_players_in_room(self, room_id: str) -> list:
         """Get all players in a room"""
-        return [
-            name for name, loc in self.player_locations.items() 
-            if loc == room_id
-        ]
+        return [name for name in self.engine.index.players_at(room_id) if name in self.players]
+    
+    def is_in_room(self, session: PlayerSession, room_id: Optional[str] = None) -> bool:
+        """Whether this session is still connected (and, if room_id is given, in that room)"""
+        if self.players.get(session.player_name) is not session:
+            return False
+        return room_id is None or self.contexts[session.player_name].location == room_id
     
     async def broadcast_to_room(self, room_id: str, message: str, exclude: Optional[str] = None):
         """Send message to all players in a room"""
@@ -415,8 +932,8 @@ class MultiplayerGameServer:
         if other_players:
             output.append("\nðŸ‘¥ PLAYERS HERE:")
             for other_name in other_players:
-                health = self.player_health.get(other_name, 100)
-                inventory = self.player_inventories.get(other_name, set())
+                health = self.contexts[other_name].health
+                inventory = self.contexts[other_name].inventory
                 pvp_enabled = self.player_pvp_mode.get(other_name, False)
                 
                 items_held = []
@@ -433,16 +950,15 @@ class MultiplayerGameServer:
                 health_bar = f"[{'â–ˆ' * (health // 10)}{'â–’' * ((100 - health) // 10)}]"
                 output.append(f"  ðŸ‘¤ {other_name} {health_bar} {health}/100 HP{holding_text}{pvp_indicator}")
         
-        sprites_here = [s for s in self.engine.sprites.values() 
-                       if s.location == room_id and s.is_alive()]
+        sprites_here = [self.engine.sprites[sprite_id] for sprite_id in self.engine.index.sprites_at(room_id)
+                        if self.engine.sprites[sprite_id].is_alive()]
         if sprites_here:
             output.append("\nðŸš¨ ENEMIES:")
             for sprite in sprites_here:
                 health_bar = f"[{'â–ˆ' * (sprite.health // 10)}{'â–’' * ((sprite.max_health - sprite.health) // 10)}]"
                 output.append(f"  âš”ï¸  {sprite.name} {health_bar} {sprite.health}/{sprite.max_health} HP")
         
-        objects_here = [obj for obj in self.engine.objects.values() 
-                       if obj.location == room_id]
+        objects_here = [self.engine.objects[obj_id] for obj_id in self.engine.index.objects_at(room_id)]
         if objects_here:
             output.append("\nYou can see:")
             for obj in objects_here:
@@ -457,14 +973,14 @@ class MultiplayerGameServer:
         """Generate SD prompt for combat visualization"""
         
         # Get attacker's equipment
-        attacker_inv = self.player_inventories.get(attacker, set())
+        attacker_inv = self.contexts[attacker].inventory if attacker in self.contexts else set()
         attacker_items = []
         for item_id in attacker_inv:
             if item_id in self.engine.objects:
                 attacker_items.append(self.engine.objects[item_id].name)
         
         # Get defender's equipment
-        defender_inv = self.player_inventories.get(defender, set())
+        defender_inv = self.contexts[defender].inventory if defender in self.contexts else set()
         defender_items = []
         for item_id in defender_inv:
             if item_id in self.engine.objects:
@@ -518,14 +1034,19 @@ class MultiplayerGameServer:
             
             print(f"âš”ï¸  Generating combat scene: {combat_state}")
             
-            image_data = self.sd_balancer.generate_image(prompt, cache_key=cache_key)
+            # Only worth rendering while a combatant is still at the fight
+            room = self.contexts[attacker_name].location
+            combatants = [session for session in (attacker_session, defender_session) if session]
+            still_here = lambda: any(self.is_in_room(session, room) for session in combatants)
+            
+            image_data = await self.sd_balancer.render(prompt, cache_key, PRIORITY_COMBAT, still_here)
             
             if image_data:
-                # Send to both combatants!
-                if attacker_session:
-                    await attacker_session.send_image(image_data)
-                if defender_session:
-                    await defender_session.send_image(image_data)
+                # Send to both combatants (if they haven't left)!
+                frame = self.sd_balancer.cache.frame(cache_key, image_data)
+                for session in combatants:
+                    if self.is_in_room(session, room):
+                        await session.send_image(frame)
         except Exception as e:
             print(f"Error generating combat image: {e}")
     
@@ -543,10 +1064,12 @@ class MultiplayerGameServer:
             
             print(f"[COMBAT] Generating NPC combat: {player_name} vs {npc_name}")
             
-            image_data = self.sd_balancer.generate_image(prompt, cache_key=cache_key)
+            room = self.contexts[player_name].location
+            still_here = lambda: player_session is not None and self.is_in_room(player_session, room)
+            image_data = await self.sd_balancer.render(prompt, cache_key, PRIORITY_COMBAT, still_here)
             
-            if image_data and player_session:
-                await player_session.send_image(image_data)
+            if image_data and still_here():
+                await player_session.send_image(self.sd_balancer.cache.frame(cache_key, image_data))
         except Exception as e:
             print(f"Error generating NPC combat image: {e}")
     
@@ -608,16 +1131,18 @@ class MultiplayerGameServer:
         
         return prompt
     
-    async def _generate_and_send_image(self, session: PlayerSession, cache_key: str, prompt: str):
-        """Generate and send image in background"""
+    async def _generate_and_send_image(self, session: PlayerSession, cache_key: str, prompt: str,
+                                       priority: int = PRIORITY_SCENE, room: Optional[str] = None):
+        """Generate and send image in background (room images only while the player is there)"""
         if not self.sd_balancer.servers:
             return
         
         try:
-            image_data = self.sd_balancer.generate_image(prompt, cache_key=cache_key)
+            still_wanted = lambda: self.is_in_room(session, room)
+            image_data = await self.sd_balancer.render(prompt, cache_key, priority, still_wanted)
             
-            if image_data:
-                await session.send_image(image_data)
+            if image_data and still_wanted():
+                await session.send_image(self.sd_balancer.cache.frame(cache_key, image_data))
         except Exception as e:
             print(f"Error: {e}")
     
@@ -626,26 +1151,24 @@ class MultiplayerGameServer:
         if not command.strip():
             return ""
         
-        location = self.player_locations.get(player_name, "entrance_hall")
-        inventory = self.player_inventories.get(player_name, set())
-        health = self.player_health.get(player_name, 100)
-        
-        self.engine.player_location = location
-        self.engine.inventory = inventory.copy()
-        self.engine.player_health = health
+        # Commands act directly on this player's context
+        ctx = self.contexts[player_name]
+        location = ctx.location
+        inventory = ctx.inventory
+        health = ctx.health
         
         cmd_lower = command.lower().strip()
         
         # INVENTORY with character portrait
         if cmd_lower in ['i', 'inv', 'inventory']:
-            result = self.engine.execute_command(command)
+            result = self.engine.execute_command(command, ctx)
             
             session = self.players.get(player_name)
             if session and self.sd_balancer.servers:
                 prompt = self.generate_character_prompt(player_name, inventory, health)
-                inv_hash = hash(frozenset(inventory))
+                inv_hash = stable_hash(*sorted(inventory))
                 cache_key = f"char_{player_name}_{health//20}_{inv_hash}"
-                asyncio.create_task(self._generate_and_send_image(session, cache_key, prompt))
+                asyncio.create_task(self._generate_and_send_image(session, cache_key, prompt, PRIORITY_PORTRAIT))
             
             return result
         
@@ -661,7 +1184,7 @@ class MultiplayerGameServer:
             if target_name in self.players:
                 # Get weapon
                 weapon_name = "fists"
-                attacker_inv = self.player_inventories.get(player_name, set())
+                attacker_inv = ctx.inventory
                 for item_id in attacker_inv:
                     if item_id in self.engine.objects:
                         obj = self.engine.objects[item_id]
@@ -690,14 +1213,16 @@ class MultiplayerGameServer:
                             break
                 
                 # Apply damage to defender
-                defender_health = self.player_health.get(target_name, 100)
-                defender_health -= attacker_damage
-                self.player_health[target_name] = max(0, defender_health)
+                defender = self.contexts[target_name]
+                defender_health = defender.health - attacker_damage
+                defender.health = max(0, defender_health)
                 
                 # Message to attacker
                 result = f"[PVP] You attack {target_name} with your {weapon_name} for {attacker_damage} damage!"
                 if defender_health <= 0:
                     result += f"\n[DEAD] {target_name} has been slain!"
+                    ctx.kills += 1
+                    defender.deaths += 1  # Respawned on the next world turn
                 
                 # Message to defender - MAKE IT STAND OUT!
                 defender_msg = "\n" + "="*60 + "\n"
@@ -707,13 +1232,12 @@ class MultiplayerGameServer:
                 if defender_health <= 0:
                     defender_msg += "    [DEAD] YOU HAVE BEEN SLAIN!\n"
                 else:
-                    defender_msg += f"    [HP] Your Health: {defender_health}/{self.engine.player_max_health}\n"
+                    defender_msg += f"    [HP] Your Health: {defender_health}/{defender.max_health}\n"
                 defender_msg += "="*60 + "\n"
                 
                 # Send notification to defender
                 if defender_session:
-                    defender_session.process.stdout.write(defender_msg + "> ")
-                    await defender_session.process.stdout.drain()
+                    await defender_session.write(defender_msg + "> ")
                 
                 # Broadcast to others in same room (excluding both attacker and defender)
                 await self.broadcast_to_room(
@@ -794,7 +1318,7 @@ class MultiplayerGameServer:
         
         # WHO command
         if cmd_lower == 'who':
-            player_list = [f"  ðŸ‘¤ {name} (in {self.player_locations[name]})" 
+            player_list = [f"  ðŸ‘¤ {name} (in {self.contexts[name].location})" 
                           for name in self.players.keys()]
             return f"Connected players ({len(self.players)}):\n" + "\n".join(player_list)
         
@@ -805,19 +1329,17 @@ class MultiplayerGameServer:
             session = self.players.get(player_name)
             if session and self.sd_balancer.servers:
                 prompt = self.sd_balancer.sanitize_look_to_prompt(text_output)
-                asyncio.create_task(self._generate_and_send_image(session, location, prompt))
+                asyncio.create_task(self._generate_and_send_image(session, location, prompt, room=location))
             
             return text_output
         
         # Movement
         if cmd_lower in ['n', 's', 'e', 'w', 'north', 'south', 'east', 'west']:
             old_location = location
-            result = self.engine.execute_command(command)
-            new_location = self.engine.player_location
+            result = self.engine.execute_command(command, ctx)
+            new_location = ctx.location
             
             if new_location != old_location:
-                self.player_locations[player_name] = new_location
-                
                 await self.broadcast_to_room(
                     old_location,
                     f"ðŸ’¨ {player_name} goes {cmd_lower}.",
@@ -834,21 +1356,17 @@ class MultiplayerGameServer:
                 if session and self.sd_balancer.servers:
                     look_output = self.format_look_for_player(player_name, new_location)
                     prompt = self.sd_balancer.sanitize_look_to_prompt(look_output)
-                    asyncio.create_task(self._generate_and_send_image(session, new_location, prompt))
+                    asyncio.create_task(self._generate_and_send_image(session, new_location, prompt,
+                                                                      room=new_location))
             
             return self.format_look_for_player(player_name, new_location)
         
         # Normal commands
         try:
-            result = self.engine.execute_command(command)
+            result = self.engine.execute_command(command, ctx)
         except Exception as e:
             return f"âš ï¸  Error: {str(e)}"
         
-        # Update state
-        self.player_locations[player_name] = self.engine.player_location
-        self.player_inventories[player_name] = self.engine.inventory.copy()
-        self.player_health[player_name] = self.engine.player_health
-        
         # Generate combat visualization for NPC battles
         if cmd_lower.startswith('attack ') or cmd_lower.startswith('kill ') or cmd_lower.startswith('fight '):
             # Check if attack was against NPC/sprite
@@ -860,7 +1378,7 @@ class MultiplayerGameServer:
                     
                     # Get player's weapon
                     weapon = "fists"
-                    for item_id in self.player_inventories[player_name]:
+                    for item_id in ctx.inventory:
                         if item_id in self.engine.objects:
                             obj = self.engine.objects[item_id]
                             if obj.is_weapon():
@@ -895,17 +1413,15 @@ class MultiplayerGameServer:
         return result
     
     async def process_global_turn(self):
-        """Process game turn effects"""
-        messages = self.engine.process_turn()
+        """
+        Process game turn effects: the world advances once, then sprite
+        attacks and exhaustion reach each connected player
+        """
+        names = sorted(self.contexts)
+        messages, player_messages = self.engine.process_world_turn([self.contexts[name] for name in names])
         
         logging.debug(f"Turn {self.engine.turn_count}: Processed")
         
-        # SAFETY: Ensure messages is a list, not a string
-        if isinstance(messages, str):
-            print(f"WARNING: process_turn returned string instead of list: {repr(messages)}")
-            logging.warning(f"process_turn returned string: {repr(messages)}")
-            messages = [messages] if messages else []
-        
         # Log events
         if messages:
             logging.info(f"Turn {self.engine.turn_count}: {len(messages)} events")
@@ -916,6 +1432,23 @@ class MultiplayerGameServer:
         for msg in messages:
             if any(keyword in msg.lower() for keyword in ['appeared', 'attacks', 'frozen', 'melted', 'transformed', 'changed', 'taunt', '[atk]', '[dead]', 'snarls']):
                 await self.broadcast_to_all(msg)
+        
+        # Attacks, taunts and deaths go to the player they happened to; the dead
+        # drop what they carried and respawn, as in the multiplayer server
+        respawn_loc = self.combat_rules.get('player_vs_player', {}).get('respawn_location', 'entrance_hall')
+        fallen = []
+        for name in names:
+            ctx = self.contexts[name]
+            lines = [msg for msg in player_messages[name] if not msg.startswith("BATTLE_START:")]
+            if ctx.health <= 0:  # Already counted by the engine or the PvP attack
+                fallen.append((name, ctx.location, self.engine.respawn(ctx, respawn_loc)))
+                lines.append(f"[DEAD] You respawn at {respawn_loc} with full health.")
+            if lines and name in self.players:
+                await self.players[name].send("\n".join(lines))
+        for name, location, dropped_items in fallen:
+            await self.broadcast_to_room(location, f"[DEAD] {name} has fallen!", exclude=name)
+            if dropped_items:
+                await self.broadcast_to_room(location, f"[LOOT] {name} dropped: {', '.join(dropped_items)}")
 
 
 # Global server instance
@@ -965,22 +1498,20 @@ async def handle_client(process):
             exclude=player_name
         )
         
-        process.stdout.write(f"\nWelcome, {player_name}!\n")
-        process.stdout.write("Attack others to see BATTLE VISUALIZATION!\n\n")
-        await process.stdout.drain()
+        await session.write(f"\nWelcome, {player_name}!\n")
+        await session.write("Attack others to see BATTLE VISUALIZATION!\n\n")
         
         initial_look = game_server.format_look_for_player(player_name, "entrance_hall")
-        process.stdout.write(initial_look + "\n")
-        await process.stdout.drain()
+        await session.write(initial_look + "\n")
         
         if game_server.sd_balancer.servers:
             prompt = game_server.sd_balancer.sanitize_look_to_prompt(initial_look)
-            asyncio.create_task(game_server._generate_and_send_image(session, "entrance_hall", prompt))
+            asyncio.create_task(game_server._generate_and_send_image(session, "entrance_hall", prompt,
+                                                                     room="entrance_hall"))
         
         # Main loop
         while True:
-            process.stdout.write(f"\n> ")
-            await process.stdout.drain()
+            await session.write(f"\n> ")
             
             try:
                 command = await asyncio.wait_for(process.stdin.readline(), timeout=None)
@@ -993,8 +1524,7 @@ async def handle_client(process):
             command = command.strip()
             
             if command.lower() in ['quit', 'exit', 'q']:
-                process.stdout.write("\nGoodbye!\n")
-                await process.stdout.drain()
+                await session.write("\nGoodbye!\n")
                 break
             
             if command.lower() in ['help', '?']:
@@ -1006,8 +1536,7 @@ Combat: attack [player] - SEE BATTLE VISUALIZATION!
 PvP: pvp (toggle)
 Social: say, tell
 """
-                process.stdout.write(help_text)
-                await process.stdout.drain()
+                await session.write(help_text)
                 continue
             
             if not command:
@@ -1017,16 +1546,14 @@ Social: say, tell
                 result = await game_server.handle_player_command(player_name, command)
                 
                 if result:
-                    process.stdout.write(result + "\n")
-                    await process.stdout.drain()
+                    await session.write(result + "\n")
                 
-                # Process turn effects every turn (transformations need state_turn_count to increment)
+                # Process turn effects every turn (transformations are timed in turns)
                 await game_server.process_global_turn()
             
             except Exception as e:
                 error_msg = f"âš ï¸  Error: {str(e)}\n"
-                process.stdout.write(error_msg)
-                await process.stdout.drain()
+                await session.write(error_msg)
         
     except Exception as e:
         print(f"Client error: {e}")
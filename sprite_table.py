@@ -0,0 +1,146 @@
+"""
+Struct-of-arrays sprite state for bulk AI updates (optional, needs NumPy)
+
+GameEngineRPG(sprite_table=True) mirrors every sprite into one row of a
+SpriteTable. Each turn's aggression rolls, wandering and damage totals are
+then a handful of array operations instead of a Python loop with several
+random.random() calls per sprite. The Sprite objects stay the public API:
+rows follow their attribute changes, and the engine writes moves back to
+the sprites that moved.
+"""
+
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # The engine falls back to the per-sprite AI loop
+    np = None
+
+
+class SpriteTable:
+    """
+    Sprite columns (health, damage, aggression, room index, alive) plus the
+    room graph as a padded exit adjacency array:
+      exits[room, k]    - room index behind the k-th exit (-1 = padding)
+      exit_count[room]  - number of exits
+    Rows of removed sprites are recycled by later adds.
+    """
+    
+    COLUMNS = ('location', 'health', 'damage', 'aggression')  # Sprite fields mirrored here
+    
+    def __init__(self, graph, capacity: int = 1024, seed: Optional[int] = None):
+        if np is None:
+            raise ImportError("SpriteTable needs NumPy (pip install numpy)")
+        
+        # Room ids and exits come from the engine's RoomGraph
+        self.room_ids: List[str] = graph.room_ids
+        self.room_index: Dict[str, int] = graph.index
+        
+        offsets = np.frombuffer(graph.offsets, dtype=np.int32)
+        self.exit_count = np.diff(offsets).astype(np.int32)
+        width = int(self.exit_count.max(initial=0)) or 1
+        self.exits = np.full((len(self.room_ids), width), -1, dtype=np.int32)
+        targets = np.frombuffer(graph.targets, dtype=np.int32)
+        for i in range(len(self.room_ids)):
+            self.exits[i, :self.exit_count[i]] = targets[offsets[i]:offsets[i + 1]]
+        
+        self.rng = np.random.default_rng(seed)
+        self.size = 0  # Rows in use, including freed ones
+        self.free: List[int] = []
+        self.sprites: List = []  # row -> Sprite (None when free)
+        self.rows: Dict[str, int] = {}  # sprite id -> row
+        self.health = self.damage = self.aggression = self.location = self.alive = None
+        self.allocate(capacity)
+    
+    def allocate(self, capacity: int):
+        """Grow the columns to hold capacity rows"""
+        def grow(column, dtype, fill):
+            new = np.full(capacity, fill, dtype=dtype)
+            if column is not None:
+                new[:len(column)] = column
+            return new
+        
+        self.health = grow(self.health, np.int32, 0)
+        self.damage = grow(self.damage, np.int32, 0)
+        self.aggression = grow(self.aggression, np.float32, 0.0)
+        self.location = grow(self.location, np.int32, -1)
+        self.alive = grow(self.alive, np.bool_, False)
+        self.sprites.extend([None] * (capacity - len(self.sprites)))
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    def seed(self, seed: int):
+        """Restart the table's random numbers"""
+        self.rng = np.random.default_rng(seed)
+    
+    def add(self, sprite):
+        """Give a sprite a row; it keeps the row in sync from then on"""
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == len(self.health):
+                self.allocate(2 * len(self.health))
+            row = self.size
+            self.size += 1
+        
+        self.sprites[row] = sprite
+        self.rows[sprite.id] = row
+        for column in self.COLUMNS:
+            self.update(row, column, getattr(sprite, column))
+        object.__setattr__(sprite, '_table', self)
+        object.__setattr__(sprite, '_row', row)
+    
+    def remove(self, sprite):
+        row = self.rows.pop(sprite.id, None)
+        if row is None:
+            return
+        sprite.__dict__.pop('_table', None)
+        sprite.__dict__.pop('_row', None)
+        self.sprites[row] = None
+        self.alive[row] = False
+        self.location[row] = -1
+        self.free.append(row)
+    
+    def update(self, row: int, column: str, value):
+        """Called by Sprite when a mirrored field changes"""
+        if column == 'location':
+            self.location[row] = self.room_index.get(value, -1)  # -1 = not in a room
+        elif column == 'health':
+            self.health[row] = value
+            self.alive[row] = value > 0
+        else:
+            getattr(self, column)[row] = value
+    
+    def dead(self) -> List[int]:
+        """Rows of sprites that are in a room but out of health"""
+        n = self.size
+        return np.flatnonzero(~self.alive[:n] & (self.location[:n] >= 0)).tolist()
+    
+    def step(self, player_rooms, move_chance: float):
+        """
+        One AI turn for every sprite at once.
+        
+        Hostile sprites (aggression > 0.5) sharing a room with a player
+        attack with probability aggression; every other sprite wanders
+        through a random exit with probability move_chance. Returns
+        (attacker rows, moved rows, damage dealt per room).
+        """
+        n = self.size
+        location = self.location[:n]
+        alive = self.alive[:n] & (location >= 0)
+        aggression = self.aggression[:n]
+        rolls = self.rng.random(n)
+        
+        with_player = np.isin(location, np.asarray(player_rooms, dtype=np.int32))
+        attackers = np.flatnonzero(alive & with_player & (aggression > 0.5) & (rolls < aggression))
+        
+        safe_location = np.where(location >= 0, location, 0)
+        exit_count = self.exit_count[safe_location]
+        movers = np.flatnonzero(alive & ~with_player & (exit_count > 0) & (rolls < move_chance))
+        picks = (self.rng.random(len(movers)) * exit_count[movers]).astype(np.int32)
+        location[movers] = self.exits[location[movers], picks]
+        
+        room_damage = np.bincount(location[attackers], weights=self.damage[attackers],
+                                  minlength=len(self.room_ids)).astype(np.int64)
+        return attackers, movers, room_damage
@@ -7,7 +7,7 @@ Allows players to connect via SSH and play the game
 import asyncio
 import asyncssh
 import sys
-from game_engine import GameEngine
+from game_engine import GameEngine, get_world_template
 
 
 class GameSSHServer(asyncssh.SSHServer):
@@ -47,8 +47,8 @@ Welcome, adventurer! Type 'help' for commands, 'quit' to exit.
 """
     process.stdout.write(banner)
     
-    # Initialize game engine for this session
-    engine = GameEngine(config_path="config")
+    # Initialize game engine for this session on top of the shared world
+    engine = GameEngine(template=get_world_template("config"))
     
     # Start game
     process.stdout.write(engine.start_game() + "\n\n")
@@ -139,6 +139,9 @@ async def start_ssh_server(host='0.0.0.0', port=2222):
     print("Players can connect with: ssh -p 2222 player@localhost")
     print("(No password required for demo - press Ctrl+C to stop)\n")
     
+    # Load the shared world once; sessions only keep the objects they change
+    get_world_template("config")
+    
     # Create a simple host key if it doesn't exist
     await asyncssh.create_server(
         GameSSHServer,
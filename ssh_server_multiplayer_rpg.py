@@ -7,30 +7,143 @@ Shared world state, real-time multiplayer!
 
 import asyncio
 import asyncssh
+import bisect
 import sys
+import time
+from collections import deque
+from dataclasses import fields
 from pathlib import Path
-from game_engine_rpg import GameEngineRPG
+from command_journal import CommandJournal, output_checksum, read_journal
+from game_engine_rpg import GameEngineRPG, PlayerContext
+from player_store import PlayerStore
+from storage import PLAYER_STATS, SqliteStorage
 from typing import Dict, Optional
 import json
 
 
 class PlayerSession:
-    """Represents one connected player"""
-    def __init__(self, player_name: str, process):
+    """
+    Represents one connected player
+    
+    Output goes through an outbound queue drained by the session's own
+    writer task, so a slow client only ever delays itself. When more than
+    queue_limit messages are waiting, the queue policy decides what gives:
+      drop_oldest - discard the oldest waiting message
+      coalesce    - fold everything waiting into one "messages skipped" line
+      disconnect  - close the connection
+    """
+    QUEUE_POLICIES = ('drop_oldest', 'coalesce', 'disconnect')
+    
+    def __init__(self, player_name: str, process, queue_limit: int = 256, queue_policy: str = 'drop_oldest'):
         self.player_name = player_name
         self.process = process
         self.location = "entrance_hall"
         self.health = 100
         self.inventory = set()
         self.last_message = ""
+        
+        # Outbound queue
+        self.queue_limit = queue_limit
+        self.queue_policy = queue_policy
+        self.outbox = deque()
+        self.pending = asyncio.Event()  # Set while the outbox has messages
+        self.idle = asyncio.Event()     # Set once everything queued has been written
+        self.idle.set()
+        self.writer = None
+        self.closed = False
+        self.stats = {'sent': 0, 'dropped': 0, 'coalesced': 0, 'max_depth': 0}
+    
+    def post(self, text: str):
+        """Queue text for this player without waiting for it to be written"""
+        if self.closed:
+            return
+        
+        if len(self.outbox) >= self.queue_limit:
+            if self.queue_policy == 'disconnect':
+                print(f"⚠️  {self.player_name} is too far behind ({len(self.outbox)} messages queued) - disconnecting")
+                self.close()
+                return
+            if self.queue_policy == 'coalesce':
+                skipped = len(self.outbox)
+                self.outbox.clear()
+                self.outbox.append(f"... {skipped} messages skipped ...\n")
+                self.stats['coalesced'] += skipped
+            else:
+                self.outbox.popleft()
+                self.stats['dropped'] += 1
+        
+        self.outbox.append(text)
+        self.stats['max_depth'] = max(self.stats['max_depth'], len(self.outbox))
+        self.idle.clear()
+        self.pending.set()
+        if self.writer is None:
+            self.writer = asyncio.create_task(self.write_loop())
     
     async def send(self, message: str):
         """Send message to this player"""
+        self.post(message + "\n")
+    
+    async def write(self, text: str):
+        """Write text (e.g. a command result or the prompt) and wait until it has gone out"""
+        self.post(text)
+        await self.flush()
+    
+    async def flush(self):
+        """Wait until everything queued so far has been written"""
+        if not self.closed:
+            await self.idle.wait()
+    
+    async def write_loop(self):
+        """Writer task: send queued messages in batches, waiting on the client's window"""
+        while not self.closed:
+            await self.pending.wait()
+            while self.outbox:
+                batch = "".join(self.outbox)
+                count = len(self.outbox)
+                self.outbox.clear()
+                try:
+                    self.process.stdout.write(batch)
+                    await self.process.stdout.drain()
+                except Exception:
+                    self.close()  # Player disconnected
+                    return
+                self.stats['sent'] += count
+            self.pending.clear()
+            self.idle.set()
+    
+    def close(self):
+        """Stop writing to this player and hang up"""
+        if self.closed:
+            return
+        self.closed = True
+        self.outbox.clear()
+        self.idle.set()
+        self.pending.set()
         try:
-            self.process.stdout.write(message + "\n")
-            await self.process.stdout.drain()
-        except:
-            pass  # Player disconnected
+            self.process.close()
+        except Exception:
+            pass
+
+
+class HeadlessSession(PlayerSession):
+    """
+    A player with no connection, for journal replays and load tests.
+    Output is counted (and kept if asked) instead of written anywhere.
+    """
+    
+    def __init__(self, player_name: str, keep_output: bool = False):
+        super().__init__(player_name, process=None)
+        self.output = [] if keep_output else None
+    
+    def post(self, text: str):
+        if self.closed:
+            return
+        self.stats['sent'] += 1
+        if self.output is not None:
+            self.output.append(text)
+    
+    def close(self):
+        self.closed = True
 
 
 class MultiplayerGameServer:
@@ -38,23 +151,53 @@ class MultiplayerGameServer:
     Shared game server for all players
     ONE world, many players
     """
-    def __init__(self, config_path: str = "config"):
+    TICK_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)  # Tick duration histogram bounds
+    
+    def __init__(self, config_path: str = "config", queue_limit: int = 256, queue_policy: str = 'drop_oldest',
+                 tick_rate: float = 1.0, max_catchup_ticks: int = 3, sim_radius: Optional[int] = None,
+                 sprite_table: bool = False, db_path: Optional[str] = None, save_interval: float = 5.0,
+                 seed: Optional[int] = None):
         self.config_path = config_path
         
+        # Fixed-rate world simulation (see run_world_ticks)
+        self.tick_rate = tick_rate
+        self.max_catchup_ticks = max_catchup_ticks
+        self.tick_stats = {'ticks': 0, 'overruns': 0, 'skipped': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                           'histogram': [0] * (len(self.TICK_BUCKETS_MS) + 1)}
+        
+        # Per-player outbound queue settings (see PlayerSession)
+        self.queue_limit = queue_limit
+        self.queue_policy = queue_policy
+        
         # Shared world engine (one for all players!)
-        self.engine = GameEngineRPG(config_path=config_path, player_name="SERVER")
+        self.engine = GameEngineRPG(config_path=config_path, player_name="SERVER", sim_radius=sim_radius,
+                                   sprite_table=sprite_table, seed=seed)
         self.engine.start_game()
+        self.engine.index.discard_player(self.engine.player)  # Only connected players are in rooms
+        
+        # Optional SQLite persistence: the world and players survive restarts
+        self.save_interval = save_interval
+        self.storage: Optional[SqliteStorage] = None
+        self.player_store: Optional[PlayerStore] = None
+        if db_path:
+            self.storage = SqliteStorage(db_path)
+            self.player_store = PlayerStore(self.storage, save_interval)
+            world = self.storage.load_world()
+            if world is not None:
+                self.engine.restore_world_state(world)
+                self.engine.turn_count = world['turn_count']
+                print(f"💾 World restored from {db_path} (turn {world['turn_count']})")
+        
+        # Optional command journal for restarts and replays (see open_journal)
+        self.journal: Optional[CommandJournal] = None
         
         # Track all connected players
         self.players: Dict[str, PlayerSession] = {}
         
-        # Track player states
-        self.player_locations: Dict[str, str] = {}
-        self.player_inventories: Dict[str, set] = {}
-        self.player_health: Dict[str, int] = {}
+        # Track player states (each player's location, inventory and health)
+        self.contexts: Dict[str, PlayerContext] = {}
         self.player_pvp_mode: Dict[str, bool] = {}  # Track PvP enabled status
-        self.player_deaths: Dict[str, int] = {}  # Track death count
-        self.player_kills: Dict[str, int] = {}  # Track kills
+        # Kills and deaths (PvP and sprites alike) are counted on each PlayerContext
         
         # Load combat rules
         self.combat_rules = self.load_combat_rules()
@@ -106,34 +249,219 @@ class MultiplayerGameServer:
     def add_player(self, player_name: str, session: PlayerSession):
         """Register new player"""
         self.players[player_name] = session
-        self.player_locations[player_name] = "entrance_hall"
-        self.player_inventories[player_name] = set()
-        self.player_health[player_name] = 100
+        old_ctx = self.contexts.get(player_name)
+        if old_ctx:
+            self.engine.index.discard_player(old_ctx)
+        self.contexts[player_name] = PlayerContext(name=player_name, location="entrance_hall")
+        self.engine.index.add_player(self.contexts[player_name])  # Moves keep the room index current
         self.player_pvp_mode[player_name] = False  # PvP disabled by default
-        self.player_deaths[player_name] = 0
-        self.player_kills[player_name] = 0
+        if self.player_store:
+            self.restore_player(player_name)
+        if self.journal:
+            self.record('join', player=player_name, state=self.player_snapshot(player_name))
         
         print(f"✅ Player joined: {player_name} ({len(self.players)} total)")
     
+    def player_state(self, player_name: str) -> Dict:
+        """A player's persistent state (see storage.py)"""
+        ctx = self.contexts[player_name]
+        return {
+            'name': player_name,
+            'health': ctx.health,
+            'max_health': ctx.max_health,
+            'location': ctx.location,
+            'inventory': sorted(ctx.inventory),
+            'kills': ctx.kills,
+            'deaths': ctx.deaths,
+            'potions_consumed': ctx.potions_consumed
+        }
+    
+    def restore_player(self, player_name: str):
+        """Pick a returning player up where they left off"""
+        state = self.player_store.load(player_name)
+        if state is None:
+            return
+        ctx = self.contexts[player_name]
+        if state.get('location') in self.engine.rooms:
+            ctx.location = state['location']
+        ctx.health = state.get('health', ctx.health)
+        ctx.max_health = state.get('max_health', ctx.max_health)
+        ctx.potions_consumed = state.get('potions_consumed', 0)
+        
+        # Only items still carried (and not by someone else) come back
+        held = set().union(*(other.inventory for name, other in self.contexts.items() if name != player_name))
+        ctx.inventory = {item_id for item_id in state.get('inventory', [])
+                         if item_id in self.engine.objects and item_id not in held
+                         and self.engine.objects[item_id].location == 'inventory'}
+        ctx.kills = state.get('kills', 0)
+        ctx.deaths = state.get('deaths', 0)
+    
+    def save_players(self):
+        """Queue every connected player's state for the player store"""
+        if self.player_store:
+            for player_name in self.players:
+                self.player_store.save(player_name, self.player_state(player_name))
+    
+    async def save_world(self):
+        """Collect the world's changes on the loop, write them from a worker thread"""
+        if self.storage:
+            self.save_players()
+            changes = self.engine.world_changes()
+            try:
+                await asyncio.to_thread(self.storage.save_world, changes)
+            except Exception:
+                self.engine.forget_writer(('storage',))  # Write everything next time
+                raise
+    
+    async def run_persistence(self):
+        """Save players and the world every save_interval seconds"""
+        while True:
+            await asyncio.sleep(self.save_interval)
+            try:
+                await self.save_world()
+            except Exception as e:
+                print(f"⚠️  Save failed: {e}")
+    
+    def close(self):
+        """Write everything out and close the database and journal"""
+        if self.journal:
+            self.journal.close()
+        if self.storage:
+            self.save_players()
+            self.player_store.close()
+            self.storage.save_world(self.engine.world_changes())
+            self.storage.close()
+    
+    @staticmethod
+    def context_state(ctx: PlayerContext) -> Dict:
+        state = {field.name: getattr(ctx, field.name) for field in fields(ctx)}
+        state['inventory'] = sorted(ctx.inventory)
+        return state
+    
+    @staticmethod
+    def apply_context_state(ctx: PlayerContext, state: Dict):
+        for field in fields(ctx):
+            if field.name != 'name' and field.name in state:
+                setattr(ctx, field.name, state[field.name])
+        ctx.inventory = set(state.get('inventory', ()))
+    
+    def player_snapshot(self, player_name: str) -> Dict:
+        """A player's context (kills and deaths included) and PvP mode, as the journal records them"""
+        state = self.context_state(self.contexts[player_name])
+        state['pvp'] = self.player_pvp_mode.get(player_name, False)
+        return state
+    
+    def apply_player_snapshot(self, player_name: str, state: Dict):
+        self.apply_context_state(self.contexts[player_name], state)
+        self.player_pvp_mode[player_name] = state['pvp']
+    
+    def snapshot(self) -> Dict:
+        """
+        Server state for the start of a journal (see command_journal.py).
+        
+        The location index, sprite table and random generator are rebuilt
+        first, the same way restore_snapshot() builds them, so a restored
+        server carries on exactly as this one does.
+        """
+        engine = self.engine
+        for player_name in self.players:  # Index players in join order
+            engine.index.discard_player(self.contexts[player_name])
+            engine.index.add_player(self.contexts[player_name])
+        engine.reindex()
+        engine.reseed(engine.rng.getrandbits(32))
+        return {
+            'seed': engine.seed,
+            'settings': {'sim_radius': engine.sim_radius, 'sprite_table': engine.use_sprite_table},
+            'world': engine.world_state(),
+            'server_player': self.context_state(engine.player),
+            'players': {player_name: self.player_snapshot(player_name) for player_name in self.players}
+        }
+    
+    def restore_snapshot(self, snapshot: Dict):
+        """Put the world back as snapshot() recorded it; its players rejoin as headless sessions"""
+        engine = self.engine
+        engine.turn_count = snapshot['world']['turn_count']
+        engine.restore_world_state(snapshot['world'])
+        self.apply_context_state(engine.player, snapshot['server_player'])
+        for player_name, state in snapshot['players'].items():
+            self.add_player(player_name, HeadlessSession(player_name))
+            self.apply_player_snapshot(player_name, state)
+        engine.reseed(snapshot['seed'])
+    
+    def record(self, event: str, **details):
+        """Journal an event, starting the journal over from a snapshot when one is due"""
+        self.journal.record(event, self.engine.turn_count, **details)
+        if self.journal.snapshot_due:
+            self.journal.start(self.snapshot())
+    
+    async def replay(self, entries: list) -> Dict:
+        """
+        Run journaled events against this server as fast as it can go.
+        Players who join get headless sessions. Returns counts, the time
+        taken and the first event whose output differs from the recording.
+        """
+        stats = {'events': 0, 'commands': 0, 'ticks': 0, 'mismatches': 0, 'first_mismatch': None}
+        started = time.perf_counter()
+        for i, entry in enumerate(entries):
+            event, player_name, output = entry['event'], entry.get('player'), None
+            if event == 'command':
+                output = await self.handle_player_command(player_name, entry['command'])
+                stats['commands'] += 1
+            elif event == 'tick':
+                output = "\n".join(await self.process_global_turn())
+                stats['ticks'] += 1
+            elif event == 'join':
+                self.add_player(player_name, HeadlessSession(player_name))
+                self.apply_player_snapshot(player_name, entry['state'])
+            elif event == 'leave':
+                self.remove_player(player_name)
+                await asyncio.sleep(0)  # Let the departure broadcast run
+            else:
+                raise ValueError(f"Unknown journal event '{event}'")
+            
+            if output is not None and output_checksum(output) != entry.get('out'):
+                stats['mismatches'] += 1
+                if stats['first_mismatch'] is None:
+                    stats['first_mismatch'] = i
+            stats['events'] += 1
+        stats['seconds'] = time.perf_counter() - started
+        return stats
+    
+    async def open_journal(self, path: str, snapshot_entries: int = 10000) -> Optional[Dict]:
+        """
+        Journal every event to path from now on. If path already holds a
+        journal (the server stopped or crashed), its snapshot is restored
+        and its events replayed first, and the replay stats returned.
+        """
+        stats = None
+        if Path(path).exists():
+            snapshot, entries = read_journal(path)
+            self.restore_snapshot(snapshot)
+            stats = await self.replay(entries)
+            for player_name in list(self.players):  # Nobody is connected yet
+                self.remove_player(player_name)
+            await asyncio.sleep(0)
+        self.journal = CommandJournal(path, snapshot_entries)
+        self.journal.start(self.snapshot())
+        return stats
+    
     def remove_player(self, player_name: str):
         """Remove disconnected player"""
         if player_name in self.players:
-            location = self.player_locations.get(player_name, "unknown")
-            del self.players[player_name]
-            if player_name in self.player_locations:
-                del self.player_locations[player_name]
-            if player_name in self.player_inventories:
-                del self.player_inventories[player_name]
-            if player_name in self.player_health:
-                del self.player_health[player_name]
+            if self.player_store:
+                # The store's writer thread flushes it now, and logs it if that fails
+                self.player_store.save(player_name, self.player_state(player_name), urgent=True)
+            ctx = self.contexts.pop(player_name, None)
+            location = ctx.location if ctx else "unknown"
+            if ctx:
+                self.engine.index.discard_player(ctx)
+            self.players.pop(player_name).close()
             if player_name in self.player_pvp_mode:
                 del self.player_pvp_mode[player_name]
-            if player_name in self.player_deaths:
-                del self.player_deaths[player_name]
-            if player_name in self.player_kills:
-                del self.player_kills[player_name]
             
             print(f"❌ Player left: {player_name} ({len(self.players)} remaining)")
+            if self.journal:
+                self.record('leave', player=player_name)
             
             # Notify others in that location
             asyncio.create_task(self.broadcast_to_room(
@@ -144,23 +472,36 @@ class MultiplayerGameServer:
     
     def get_players_in_room(self, room_id: str) -> list:
         """Get all players in a specific room"""
-        return [
-            name for name, loc in self.player_locations.items() 
-            if loc == room_id
-        ]
+        return [name for name in self.engine.index.players_at(room_id) if name in self.players]
     
     async def broadcast_to_room(self, room_id: str, message: str, exclude: Optional[str] = None):
-        """Send message to all players in a room"""
+        """Send message to all players in a room (queued; each player's writer delivers it)"""
         players_here = self.get_players_in_room(room_id)
+        line = message + "\n"
         for player_name in players_here:
             if player_name != exclude and player_name in self.players:
-                await self.players[player_name].send(message)
+                self.players[player_name].post(line)
     
     async def broadcast_to_all(self, message: str, exclude: Optional[str] = None):
-        """Send message to all connected players"""
-        for player_name, session in self.players.items():
+        """Send message to all connected players (queued; each player's writer delivers it)"""
+        line = message + "\n"
+        for player_name, session in list(self.players.items()):
             if player_name != exclude:
-                await session.send(message)
+                session.post(line)
+    
+    def queue_metrics(self) -> Dict:
+        """Outbound queue depth and drop counters across connected players"""
+        sessions = list(self.players.values())
+        depths = [len(session.outbox) for session in sessions]
+        return {
+            'players': len(sessions),
+            'queued': sum(depths),
+            'deepest': max(depths, default=0),
+            'max_depth': max((session.stats['max_depth'] for session in sessions), default=0),
+            'sent': sum(session.stats['sent'] for session in sessions),
+            'dropped': sum(session.stats['dropped'] for session in sessions),
+            'coalesced': sum(session.stats['coalesced'] for session in sessions)
+        }
     
     def format_look_for_player(self, player_name: str, room_id: str) -> str:
         """Generate look output including other players"""
@@ -180,13 +521,13 @@ class MultiplayerGameServer:
         if other_players:
             output.append("\n👥 PLAYERS HERE:")
             for other_name in other_players:
-                health = self.player_health.get(other_name, 100)
-                inventory = self.player_inventories.get(other_name, set())
+                health = self.contexts[other_name].health
+                inventory = self.contexts[other_name].inventory
                 pvp_enabled = self.player_pvp_mode.get(other_name, False)
                 
                 # Show what they're holding
                 items_held = []
-                for item_id in inventory:
+                for item_id in sorted(inventory):
                     if item_id in self.engine.objects:
                         items_held.append(self.engine.objects[item_id].name)
                 
@@ -201,22 +542,21 @@ class MultiplayerGameServer:
                 output.append(f"  👤 {other_name} {health_bar} {health}/100 HP{holding_text}{pvp_indicator}")
         
         # List sprites in room
-        sprites_here = [s for s in self.engine.sprites.values() 
-                       if s.location == room_id and s.is_alive()]
+        sprites_here = [self.engine.sprites[sprite_id] for sprite_id in self.engine.index.sprites_at(room_id)
+                        if self.engine.sprites[sprite_id].is_alive()]
         if sprites_here:
             output.append("\n🚨 ENEMIES:")
             for sprite in sprites_here:
                 health_bar = f"[{'█' * (sprite.health // 10)}{'░' * ((sprite.max_health - sprite.health) // 10)}]"
                 items_held = ""
                 if sprite.inventory:
-                    item_names = [self.engine.objects[id].name for id in sprite.inventory if id in self.engine.objects]
+                    item_names = [self.engine.objects[id].name for id in sorted(sprite.inventory) if id in self.engine.objects]
                     if item_names:
                         items_held = f" (holding: {', '.join(item_names)})"
                 output.append(f"  ⚔️  {sprite.name} {health_bar} {sprite.health}/{sprite.max_health} HP{items_held}")
         
         # List objects in room
-        objects_here = [obj for obj in self.engine.objects.values() 
-                       if obj.location == room_id]
+        objects_here = [self.engine.objects[obj_id] for obj_id in self.engine.index.objects_at(room_id)]
         if objects_here:
             output.append("\nYou can see:")
             for obj in objects_here:
@@ -227,19 +567,19 @@ class MultiplayerGameServer:
         return "\n".join(output)
     
     async def handle_player_command(self, player_name: str, command: str) -> str:
-        """Execute command for a specific player"""
+        """Execute command for a specific player (and journal it)"""
+        result = await self.run_player_command(player_name, command)
+        if self.journal and command.strip():
+            self.record('command', player=player_name, command=command, out=output_checksum(result))
+        return result
+    
+    async def run_player_command(self, player_name: str, command: str) -> str:
         if not command.strip():
             return ""
         
-        # Get player's current state
-        location = self.player_locations.get(player_name, "entrance_hall")
-        inventory = self.player_inventories.get(player_name, set())
-        health = self.player_health.get(player_name, 100)
-        
-        # Set engine state to this player's state
-        self.engine.player_location = location
-        self.engine.inventory = inventory.copy()
-        self.engine.player_health = health
+        # Commands act directly on this player's context
+        ctx = self.contexts[player_name]
+        location = ctx.location
         
         # Handle special multiplayer commands
         cmd_lower = command.lower().strip()
@@ -302,8 +642,8 @@ class MultiplayerGameServer:
         
         if cmd_lower.startswith('stats'):
             # Show PvP stats
-            kills = self.player_kills.get(player_name, 0)
-            deaths = self.player_deaths.get(player_name, 0)
+            kills = ctx.kills
+            deaths = ctx.deaths
             pvp_mode = self.player_pvp_mode.get(player_name, False)
             kd_ratio = kills / deaths if deaths > 0 else kills
             
@@ -316,23 +656,36 @@ class MultiplayerGameServer:
 """
         
         if cmd_lower == 'who':
-            player_list = [f"  👤 {name} (in {self.player_locations[name]})" 
+            player_list = [f"  👤 {name} (in {self.contexts[name].location})" 
                           for name in self.players.keys()]
             return f"Connected players ({len(self.players)}):\n" + "\n".join(player_list)
         
+        if cmd_lower == 'netstats':
+            metrics = self.queue_metrics()
+            return f"""
+📡 Outbound queues ({metrics['players']} players, limit {self.queue_limit}, policy {self.queue_policy}):
+   Queued now: {metrics['queued']} (deepest {metrics['deepest']}, peak {metrics['max_depth']})
+   Sent: {metrics['sent']}  Dropped: {metrics['dropped']}  Coalesced: {metrics['coalesced']}
+"""
+        
+        if cmd_lower == 'tickstats':
+            return self.format_tick_stats()
+        
+        if cmd_lower.split()[0] == 'leaderboard':
+            parts = cmd_lower.split()
+            return await self.format_leaderboard(parts[1] if len(parts) > 1 else 'kills')
+        
         if cmd_lower in ['look', 'l']:
             return self.format_look_for_player(player_name, location)
         
         # Handle movement - notify others
         if cmd_lower in ['n', 's', 'e', 'w', 'north', 'south', 'east', 'west', 'up', 'down', 'u', 'd']:
             old_location = location
-            result = self.engine.execute_command(command)
-            new_location = self.engine.player_location
+            result = self.engine.execute_command(command, ctx)
+            new_location = ctx.location
             
             if new_location != old_location:
                 # Player moved!
-                self.player_locations[player_name] = new_location
-                
                 # Notify old room
                 await self.broadcast_to_room(
                     old_location,
@@ -352,16 +705,11 @@ class MultiplayerGameServer:
         
         # Execute normal command (sprites, objects, etc.)
         try:
-            result = self.engine.execute_command(command)
+            result = self.engine.execute_command(command, ctx)
         except Exception as e:
             # If engine command fails, return helpful error
             return f"⚠️  Command error: {str(e)}"
         
-        # Update player state
-        self.player_locations[player_name] = self.engine.player_location
-        self.player_inventories[player_name] = self.engine.inventory.copy()
-        self.player_health[player_name] = self.engine.player_health
-        
         # Notify room if item taken/dropped
         if cmd_lower.startswith('take ') or cmd_lower.startswith('get '):
             if "Taken:" in result:
@@ -403,20 +751,22 @@ class MultiplayerGameServer:
                 return f"⚠️  {target_name} has PvP disabled. They are protected."
         
         # Check same room
-        attacker_loc = self.player_locations.get(attacker_name)
-        target_loc = self.player_locations.get(target_name)
+        attacker = self.contexts[attacker_name]
+        target = self.contexts[target_name]
+        attacker_loc = attacker.location
+        target_loc = target.location
         
         if attacker_loc != target_loc:
             return f"{target_name} is not here."
         
         # Get attacker's weapon
-        attacker_inv = self.player_inventories.get(attacker_name, set())
+        attacker_inv = attacker.inventory
         weapon = None
         weapon_damage = 0
         
         if weapon_name:
             # Find specific weapon
-            for item_id in attacker_inv:
+            for item_id in sorted(attacker_inv):
                 if item_id in self.engine.objects:
                     obj = self.engine.objects[item_id]
                     if weapon_name.lower() in obj.name.lower() and obj.is_weapon():
@@ -428,7 +778,7 @@ class MultiplayerGameServer:
                 return f"You don't have a {weapon_name}."
         else:
             # Find any weapon
-            for item_id in attacker_inv:
+            for item_id in sorted(attacker_inv):
                 if item_id in self.engine.objects:
                     obj = self.engine.objects[item_id]
                     if obj.is_weapon():
@@ -442,9 +792,8 @@ class MultiplayerGameServer:
         total_damage = int(base_damage + (weapon_damage * weapon_mult))
         
         # Apply damage
-        target_health = self.player_health.get(target_name, 100)
-        target_health -= total_damage
-        self.player_health[target_name] = max(0, target_health)
+        target_health = target.health - total_damage
+        target.health = max(0, target_health)
         
         # Weapon name for message
         weapon_text = f" with {weapon.name}" if weapon else " with your fists"
@@ -452,23 +801,12 @@ class MultiplayerGameServer:
         # Build response
         if target_health <= 0:
             # Target killed!
-            self.player_kills[attacker_name] = self.player_kills.get(attacker_name, 0) + 1
-            self.player_deaths[target_name] = self.player_deaths.get(target_name, 0) + 1
+            attacker.kills += 1
+            target.deaths += 1
             
-            # Drop target's items
-            target_inv = self.player_inventories.get(target_name, set())
-            dropped_items = []
-            for item_id in list(target_inv):
-                if item_id in self.engine.objects:
-                    self.engine.objects[item_id].location = target_loc
-                    dropped_items.append(self.engine.objects[item_id].name)
-                    target_inv.remove(item_id)
-            
-            # Respawn target
+            # Drop target's items and respawn them
             respawn_loc = pvp_rules.get('respawn_location', 'entrance_hall')
-            self.player_locations[target_name] = respawn_loc
-            self.player_health[target_name] = 100
-            self.player_inventories[target_name] = set()
+            dropped_items = self.engine.respawn(target, respawn_loc)
             
             # Broadcast death
             await self.broadcast_to_room(
@@ -517,14 +855,127 @@ class MultiplayerGameServer:
             
             return f"⚔️  You attack {target_name}{weapon_text} for {total_damage} damage!\n{target_name}: {health_bar} {target_health}/100 HP"
     
-    async def process_global_turn(self):
-        """Process game turn effects (spawns, transformations, sprite AI)"""
-        messages = self.engine.process_turn()
+    async def process_global_turn(self) -> list:
+        """
+        Process game turn effects: the world (transformations, spawns, sprite
+        movement) advances once, then sprite attacks and exhaustion reach each
+        connected player. Players who die respawn. Returns everything the
+        turn said: the world's messages, then each player's in name order.
+        """
+        names = sorted(self.contexts)
+        messages, player_messages = self.engine.process_world_turn([self.contexts[name] for name in names])
+        
+        respawn_loc = self.combat_rules.get('player_vs_player', {}).get('respawn_location', 'entrance_hall')
+        fallen = []
+        for name in names:
+            ctx = self.contexts[name]
+            if ctx.health <= 0:  # The engine has counted the death
+                fallen.append((name, ctx.location, self.engine.respawn(ctx, respawn_loc)))
+                player_messages[name].append(f"💀 You respawn at {respawn_loc} with full health.")
+        
+        output = messages + [msg for name in names for msg in player_messages[name]]
+        if self.journal:
+            self.record('tick', out=output_checksum("\n".join(output)))
         
         # Broadcast important events to everyone
         for msg in messages:
-            if "appeared" in msg or "materialized" in msg or "attacks" in msg:
+            if "appeared" in msg or "materialized" in msg:
                 await self.broadcast_to_all(msg)
+        
+        # Attacks, taunts and deaths go to the players they happened to
+        for name in names:
+            lines = [msg for msg in player_messages[name] if not msg.startswith("BATTLE_START:")]
+            if lines and name in self.players:
+                await self.players[name].send("\n".join(lines))
+        for name, location, dropped_items in fallen:
+            await self.broadcast_to_room(location, f"💀 {name} has fallen!", exclude=name)
+            if dropped_items:
+                await self.broadcast_to_room(location, f"💰 {name} dropped: {', '.join(dropped_items)}")
+        return output
+    
+    async def run_world_ticks(self, clock=None, sleep=asyncio.sleep):
+        """
+        Run the world at tick_rate turns per second, however often players type.
+        
+        A late tick is followed by the missed ones back to back, up to
+        max_catchup_ticks; any more than that are skipped so a slow patch
+        can't snowball.
+        
+        clock and sleep default to the event loop's time and asyncio.sleep;
+        tests pass a fake pair to drive the loop without waiting. A fake
+        clock also times the ticks themselves.
+        """
+        timer = clock or time.perf_counter
+        clock = clock or asyncio.get_running_loop().time
+        interval = 1.0 / self.tick_rate
+        next_tick = clock() + interval
+        
+        while True:
+            delay = next_tick - clock()
+            if delay > 0:
+                await sleep(delay)
+            else:
+                await sleep(0)  # Let player commands in between catch-up ticks
+            
+            behind = int((clock() - next_tick) / interval)
+            if behind > self.max_catchup_ticks:
+                skipped = behind - self.max_catchup_ticks
+                self.tick_stats['skipped'] += skipped
+                next_tick += skipped * interval
+            
+            await self.world_tick(interval, timer)
+            next_tick += interval
+    
+    async def world_tick(self, budget: float, timer=time.perf_counter):
+        """One world turn, timed"""
+        started = timer()
+        try:
+            await self.process_global_turn()
+        except Exception as e:
+            print(f"⚠️  World tick error: {e}")
+        self.record_tick((timer() - started) * 1000, budget * 1000)
+    
+    def record_tick(self, elapsed_ms: float, budget_ms: float):
+        stats = self.tick_stats
+        stats['ticks'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        stats['histogram'][bisect.bisect_left(self.TICK_BUCKETS_MS, elapsed_ms)] += 1
+        if elapsed_ms > budget_ms:
+            stats['overruns'] += 1
+            print(f"⚠️  World tick {stats['ticks']} took {elapsed_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+    
+    async def format_leaderboard(self, stat: str) -> str:
+        """Top players by a stat: everyone in the database, or just those online"""
+        if stat not in PLAYER_STATS:
+            return f"Leaderboards: {', '.join(PLAYER_STATS)}"
+        if self.storage:
+            self.save_players()
+            await asyncio.to_thread(self.player_store.flush)
+            rows = await asyncio.to_thread(self.storage.leaderboard, stat, 10)
+        else:
+            rows = sorted(((name, self.player_state(name).get(stat, 0)) for name in self.players),
+                          key=lambda row: (-row[1], row[0]))[:10]
+        lines = [f"🏆 Top players by {stat}:"]
+        for rank, (name, value) in enumerate(rows, 1):
+            lines.append(f"   {rank:>2}. {name:<20} {value}")
+        return "\n".join(lines)
+    
+    def format_tick_stats(self) -> str:
+        stats = self.tick_stats
+        average = stats['total_ms'] / stats['ticks'] if stats['ticks'] else 0.0
+        lines = [f"⏱️  World ticks at {self.tick_rate:g}/s: {stats['ticks']} run, "
+                 f"{stats['overruns']} overran, {stats['skipped']} skipped",
+                 f"   Average {average:.2f} ms, max {stats['max_ms']:.2f} ms"]
+        if self.engine.sim_radius is not None:
+            sim = self.engine.sim_stats
+            lines.append(f"   Sprites within {self.engine.sim_radius} exits of players: "
+                         f"{sim['simulated']} sprite turns, {sim['fast_forwarded']} fast-forwards")
+        bounds = [f"<={ms} ms" for ms in self.TICK_BUCKETS_MS] + [f">{self.TICK_BUCKETS_MS[-1]} ms"]
+        for bound, count in zip(bounds, stats['histogram']):
+            if count:
+                lines.append(f"   {bound:>10}: {count}")
+        return "\n".join(lines)
 
 
 # Global server instance
@@ -568,7 +1019,7 @@ async def handle_client(process):
         player_name = player_name.strip() or f"Player{len(game_server.players) + 1}"
         
         # Create session
-        session = PlayerSession(player_name, process)
+        session = PlayerSession(player_name, process, game_server.queue_limit, game_server.queue_policy)
         game_server.add_player(player_name, session)
         
         # Announce join
@@ -578,20 +1029,17 @@ async def handle_client(process):
         )
         
         # Show welcome
-        process.stdout.write(f"\nWelcome, {player_name}!\n")
-        process.stdout.write("Type 'help' for commands, 'who' to see players, 'quit' to exit.\n\n")
-        await process.stdout.drain()
+        await session.write(f"\nWelcome, {player_name}!\n"
+                            "Type 'help' for commands, 'who' to see players, 'quit' to exit.\n\n")
         
         # Show initial room
         initial_look = game_server.format_look_for_player(player_name, "entrance_hall")
-        process.stdout.write(initial_look + "\n")
-        await process.stdout.drain()
+        await session.write(initial_look + "\n")
         
         # Main command loop
-        while True:
+        while not session.closed:
             # Prompt
-            process.stdout.write(f"\n> ")
-            await process.stdout.drain()
+            await session.write(f"\n> ")
             
             # Get command
             try:
@@ -605,8 +1053,7 @@ async def handle_client(process):
             command = command.strip()
             
             if command.lower() in ['quit', 'exit', 'q']:
-                process.stdout.write("\nGoodbye!\n")
-                await process.stdout.drain()
+                await session.write("\nGoodbye!\n")
                 break
             
             if command.lower() in ['help', '?']:
@@ -618,7 +1065,7 @@ Actions: look/l, examine [obj], take [obj], drop [obj], inventory/i
 Combat: attack [enemy], attack [enemy] with [weapon], flee
 Social: say [message], who (list players)
 Items: drink [potion], use [object]
-Meta: help, quit
+Meta: help, netstats, tickstats, leaderboard [kills|deaths], quit
 
 PvP COMBAT:
 ===========
@@ -635,8 +1082,7 @@ MULTIPLAYER:
 - Real-time shared world!
 - Enable PvP to battle other players!
 """
-                process.stdout.write(help_text)
-                await process.stdout.drain()
+                await session.write(help_text)
                 continue
             
             if not command:
@@ -647,18 +1093,12 @@ MULTIPLAYER:
                 result = await game_server.handle_player_command(player_name, command)
                 
                 if result:
-                    process.stdout.write(result + "\n")
-                    await process.stdout.drain()
-                
-                # Process global turn effects occasionally
-                if game_server.engine.turn_count % 3 == 0:
-                    await game_server.process_global_turn()
+                    await session.write(result + "\n")
             
             except Exception as e:
                 # Don't disconnect on command error - just show error
                 error_msg = f"⚠️  Error executing command: {str(e)}\n"
-                process.stdout.write(error_msg)
-                await process.stdout.drain()
+                await session.write(error_msg)
                 print(f"Command error for {player_name}: {e}")
         
     except Exception as e:
@@ -671,7 +1111,10 @@ MULTIPLAYER:
             await game_server.broadcast_to_all(f"👋 {player_name} has left the game.")
 
 
-async def start_server(host='0.0.0.0', port=2222, config_path='config'):
+async def start_server(host='0.0.0.0', port=2222, config_path='config',
+                       queue_limit=256, queue_policy='drop_oldest', tick_rate=1.0, max_catchup_ticks=3,
+                       sim_radius=None, sprite_table=False, db_path=None, save_interval=5.0,
+                       seed=None, journal_path=None, snapshot_entries=10000):
     """Start the multiplayer SSH server"""
     global game_server
     
@@ -689,7 +1132,16 @@ async def start_server(host='0.0.0.0', port=2222, config_path='config'):
         print("\nOr the server will generate a temporary key.")
     
     # Initialize game server
-    game_server = MultiplayerGameServer(config_path=config_path)
+    game_server = MultiplayerGameServer(config_path=config_path, queue_limit=queue_limit,
+                                        queue_policy=queue_policy, tick_rate=tick_rate,
+                                        max_catchup_ticks=max_catchup_ticks, sim_radius=sim_radius,
+                                        sprite_table=sprite_table, db_path=db_path,
+                                        save_interval=save_interval, seed=seed)
+    if journal_path:
+        stats = await game_server.open_journal(journal_path, snapshot_entries)
+        if stats:
+            print(f"📜 Replayed {stats['events']} journal events in {stats['seconds']:.2f}s")
+        print(f"📜 Journaling to {journal_path} (world seed {game_server.engine.seed})")
     
     print(f"\n🚀 Starting SSH server on {host}:{port}")
     print(f"📁 Config loaded from: {config_path}/")
@@ -712,6 +1164,13 @@ async def start_server(host='0.0.0.0', port=2222, config_path='config'):
         
         print("✅ Server is running! Waiting for players...\n")
         
+        # World simulation runs on its own clock
+        world_ticks = asyncio.create_task(game_server.run_world_ticks())
+        print(f"⏱️  World ticking at {tick_rate:g} turns/second\n")
+        if db_path:
+            persistence = asyncio.create_task(game_server.run_persistence())
+            print(f"💾 Saving to {db_path} every {save_interval:g}s\n")
+        
         # Run forever
         await asyncio.Future()
         
@@ -719,6 +1178,8 @@ async def start_server(host='0.0.0.0', port=2222, config_path='config'):
         print("\n\n🛑 Server shutting down...")
     except Exception as e:
         print(f"\n❌ Server error: {e}")
+    finally:
+        game_server.close()
 
 
 def main():
@@ -729,11 +1190,32 @@ def main():
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', type=int, default=2222, help='Port to listen on')
     parser.add_argument('--config', default='config', help='Config directory')
+    parser.add_argument('--queue-limit', type=int, default=256,
+                        help='Messages queued for a slow player before the queue policy applies')
+    parser.add_argument('--queue-policy', default='drop_oldest', choices=PlayerSession.QUEUE_POLICIES,
+                        help='What to do with a player whose queue is full')
+    parser.add_argument('--tick-rate', type=float, default=1.0, help='World turns per second')
+    parser.add_argument('--max-catchup', type=int, default=3,
+                        help='Missed world ticks to run after a stall before skipping the rest')
+    parser.add_argument('--sim-radius', type=int, default=None,
+                        help='Only simulate sprites within this many exits of a player (default: all)')
+    parser.add_argument('--sprite-table', action='store_true',
+                        help='Run sprite AI as batched NumPy array updates (ignores --sim-radius)')
+    parser.add_argument('--db', default=None,
+                        help='SQLite file for players, world state and leaderboards (default: nothing is saved)')
+    parser.add_argument('--save-interval', type=float, default=5.0, help='Seconds between saves with --db')
+    parser.add_argument('--seed', type=int, default=None, help='World random seed (default: random)')
+    parser.add_argument('--journal', default=None,
+                        help='Command journal file; an existing one is replayed on startup (see command_journal.py)')
+    parser.add_argument('--snapshot-entries', type=int, default=10000,
+                        help='Journal events between snapshots')
     
     args = parser.parse_args()
     
     try:
-        asyncio.run(start_server(args.host, args.port, args.config))
+        asyncio.run(start_server(args.host, args.port, args.config, args.queue_limit, args.queue_policy,
+                                 args.tick_rate, args.max_catchup, args.sim_radius, args.sprite_table,
+                                 args.db, args.save_interval, args.seed, args.journal, args.snapshot_entries))
     except KeyboardInterrupt:
         print("\nShutdown complete.")
 
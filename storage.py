@@ -0,0 +1,298 @@
+"""
+Persistence backends for players, the world state and leaderboards
+
+Storage is the interface the engine, PlayerStore and the multiplayer server
+write through. JsonStorage keeps the original layout under multiplayer_root
+(players/<name>/player.json, world/world_state.json); SqliteStorage keeps
+everything in one SQLite database in WAL mode, with the stats columns
+indexed so leaderboards don't have to read every player.
+
+Player states are the dicts built by save_player_state(). save_world() takes
+the changes built by GameEngineRPG.world_changes(): every object and sprite
+the first time, then only the ones that changed plus the ids of removed
+sprites. Object records carry state_entered_turn on the 'scheduler_turn'
+timeline, so rows that were not rewritten stay right as turns pass.
+load_world() returns {'turn_count', 'sprite_serial', 'objects': {id: {...}},
+'sprites': {id: {...}}} as built by GameEngineRPG.world_state().
+"""
+
+import abc
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+PLAYER_STATS = ('kills', 'deaths', 'potions_consumed', 'turn_count')  # Leaderboard columns
+
+
+def write_json_atomic(path: Path, data: Any):
+    """Replace a JSON file via temp file + fsync + rename, so it is never half-written"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except OSError:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+
+def with_state_ages(world: Dict[str, Any]) -> Dict[str, Any]:
+    """A stored world as world_state() builds it: state_entered_turn becomes state_turn_count"""
+    scheduler_turn = world.pop('scheduler_turn', 0)
+    for record in world['objects'].values():
+        if 'state_entered_turn' in record:  # Worlds stored before the change tracking have ages
+            record['state_turn_count'] = scheduler_turn - record.pop('state_entered_turn')
+    return world
+
+
+class Storage(abc.ABC):
+    """Where player and world state is kept"""
+    
+    @abc.abstractmethod
+    def save_players(self, states: Dict[str, Dict[str, Any]]):
+        """Store a batch of player states (name -> state) together"""
+    
+    @abc.abstractmethod
+    def load_player(self, player_name: str) -> Optional[Dict[str, Any]]:
+        pass
+    
+    @abc.abstractmethod
+    def save_world(self, changes: Dict[str, Any]):
+        """Apply GameEngineRPG.world_changes(); a 'full' one replaces the stored world"""
+    
+    @abc.abstractmethod
+    def load_world(self) -> Optional[Dict[str, Any]]:
+        pass
+    
+    @abc.abstractmethod
+    def leaderboard(self, stat: str = 'kills', limit: int = 10) -> List[Tuple[str, int]]:
+        """(player name, value) for the top players by one of PLAYER_STATS"""
+    
+    def close(self):
+        pass
+    
+    @staticmethod
+    def check_stat(stat: str):
+        if stat not in PLAYER_STATS:
+            raise ValueError(f"Unknown stat '{stat}' (expected one of {', '.join(PLAYER_STATS)})")
+
+
+class JsonStorage(Storage):
+    """One JSON file per player plus world/world_state.json (the original layout)"""
+    
+    def __init__(self, root: Path):
+        self.root = Path(root)
+    
+    def player_path(self, player_name: str) -> Path:
+        return self.root / "players" / player_name / "player.json"
+    
+    @property
+    def world_path(self) -> Path:
+        return self.root / "world" / "world_state.json"
+    
+    @staticmethod
+    def _read(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def save_players(self, states: Dict[str, Dict[str, Any]]):
+        for player_name, state in states.items():
+            write_json_atomic(self.player_path(player_name), state)
+    
+    def load_player(self, player_name: str) -> Optional[Dict[str, Any]]:
+        return self._read(self.player_path(player_name))
+    
+    def save_world(self, changes: Dict[str, Any]):
+        """One file, so changes are merged into the stored world and it is rewritten"""
+        world = None if changes['full'] else self._read(self.world_path)
+        if world is None or 'scheduler_turn' not in world:  # Missing, or stored with ages
+            world = {'objects': {}, 'sprites': {}}
+            if not changes['full']:
+                print("Warning: no stored world to apply changes to, writing only the changed part")
+        world['objects'].update(changes['objects'])
+        world['sprites'].update(changes['sprites'])
+        for sprite_id in changes['removed_sprites']:
+            world['sprites'].pop(sprite_id, None)
+        for key in ('turn_count', 'scheduler_turn', 'sprite_serial'):
+            world[key] = changes[key]
+        write_json_atomic(self.world_path, world)
+    
+    def load_world(self) -> Optional[Dict[str, Any]]:
+        world = self._read(self.world_path)
+        if world is None or 'objects' not in world:  # Placeholder from older versions
+            return None
+        return with_state_ages(world)
+    
+    def leaderboard(self, stat: str = 'kills', limit: int = 10) -> List[Tuple[str, int]]:
+        """Reads every player file"""
+        self.check_stat(stat)
+        rows = []
+        for path in (self.root / "players").glob("*/player.json"):
+            state = self._read(path) or {}
+            rows.append((state.get('name', path.parent.name), state.get(stat, 0)))
+        rows.sort(key=lambda row: (-row[1], row[0]))
+        return rows[:limit]
+
+
+class SqliteStorage(Storage):
+    """
+    Players, world objects and sprites in one SQLite database.
+    
+    WAL mode lets leaderboard reads run while a batch is being written.
+    Every batch is one transaction of executemany() calls with fixed,
+    parameterised SQL, which sqlite3 compiles once and reuses from its
+    statement cache. World saves upsert only the objects and sprites
+    that changed, keyed by id. The connection is shared between threads (the
+    PlayerStore writer and the game loop) behind a lock.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS players (
+            name TEXT PRIMARY KEY,
+            location TEXT,
+            kills INTEGER NOT NULL DEFAULT 0,
+            deaths INTEGER NOT NULL DEFAULT 0,
+            potions_consumed INTEGER NOT NULL DEFAULT 0,
+            turn_count INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS players_by_kills ON players (kills DESC, name);
+        CREATE INDEX IF NOT EXISTS players_by_deaths ON players (deaths DESC, name);
+        CREATE INDEX IF NOT EXISTS players_by_potions ON players (potions_consumed DESC, name);
+        CREATE INDEX IF NOT EXISTS players_by_turns ON players (turn_count DESC, name);
+        CREATE TABLE IF NOT EXISTS objects (
+            id TEXT PRIMARY KEY,
+            location TEXT,
+            state TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sprites (
+            id TEXT PRIMARY KEY,
+            location TEXT,
+            state TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS sprites_by_location ON sprites (location);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+    
+    UPSERT_PLAYER = """
+        INSERT INTO players (name, location, kills, deaths, potions_consumed, turn_count, state)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            location = excluded.location, kills = excluded.kills, deaths = excluded.deaths,
+            potions_consumed = excluded.potions_consumed, turn_count = excluded.turn_count,
+            state = excluded.state
+    """
+    SELECT_PLAYER = "SELECT state FROM players WHERE name = ?"
+    UPSERT_OBJECT = """
+        INSERT INTO objects (id, location, state) VALUES (?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET location = excluded.location, state = excluded.state
+    """
+    UPSERT_SPRITE = """
+        INSERT INTO sprites (id, location, state) VALUES (?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET location = excluded.location, state = excluded.state
+    """
+    DELETE_OBJECT = "DELETE FROM objects WHERE id = ?"
+    DELETE_SPRITE = "DELETE FROM sprites WHERE id = ?"
+    WORLD_META = ('turn_count', 'scheduler_turn', 'sprite_serial')
+    SET_META = "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)"
+    
+    def __init__(self, path):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")  # Always consistent; a power cut may lose the last commits
+            self.conn.executescript(self.SCHEMA)
+    
+    def save_players(self, states: Dict[str, Dict[str, Any]]):
+        rows = [(name, state.get('location'), state.get('kills', 0), state.get('deaths', 0),
+                 state.get('potions_consumed', 0), state.get('turn_count', 0), json.dumps(state))
+                for name, state in states.items()]
+        with self.lock, self.conn:
+            self.conn.executemany(self.UPSERT_PLAYER, rows)
+    
+    def load_player(self, player_name: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(self.SELECT_PLAYER, (player_name,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def save_world(self, changes: Dict[str, Any]):
+        objects = [(obj_id, state.get('location'), json.dumps(state))
+                   for obj_id, state in changes['objects'].items()]
+        sprites = [(sprite_id, state.get('location'), json.dumps(state))
+                   for sprite_id, state in changes['sprites'].items()]
+        with self.lock, self.conn:
+            if changes['full']:  # Rows the world no longer has
+                stale_objects = [row for row in self.conn.execute("SELECT id FROM objects")
+                                 if row[0] not in changes['objects']]
+                stale_sprites = [row for row in self.conn.execute("SELECT id FROM sprites")
+                                 if row[0] not in changes['sprites']]
+            else:
+                stale_objects = []
+                stale_sprites = [(sprite_id,) for sprite_id in changes['removed_sprites']]
+            self.conn.executemany(self.DELETE_OBJECT, stale_objects)
+            self.conn.executemany(self.DELETE_SPRITE, stale_sprites)
+            self.conn.executemany(self.UPSERT_OBJECT, objects)
+            self.conn.executemany(self.UPSERT_SPRITE, sprites)
+            self.conn.executemany(self.SET_META, [(key, str(changes[key])) for key in self.WORLD_META])
+    
+    def load_world(self) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            meta = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+            if 'turn_count' not in meta:
+                return None
+            objects = self.conn.execute("SELECT id, state FROM objects").fetchall()
+            sprites = self.conn.execute("SELECT id, state FROM sprites").fetchall()
+        world = {
+            'turn_count': int(meta['turn_count']),
+            'scheduler_turn': int(meta.get('scheduler_turn', 0)),
+            'objects': {obj_id: json.loads(state) for obj_id, state in objects},
+            'sprites': {sprite_id: json.loads(state) for sprite_id, state in sprites}
+        }
+        if 'sprite_serial' in meta:
+            world['sprite_serial'] = int(meta['sprite_serial'])
+        return with_state_ages(world)
+    
+    def sprites_at(self, location: str) -> List[str]:
+        """Ids of stored sprites in a room (indexed, no world load needed)"""
+        with self.lock:
+            rows = self.conn.execute("SELECT id FROM sprites WHERE location = ? ORDER BY id",
+                                     (location,)).fetchall()
+        return [row[0] for row in rows]
+    
+    def leaderboard(self, stat: str = 'kills', limit: int = 10) -> List[Tuple[str, int]]:
+        self.check_stat(stat)  # Column names can't be parameters; only known ones get here
+        with self.lock:
+            return self.conn.execute(f"SELECT name, {stat} FROM players ORDER BY {stat} DESC, name LIMIT ?",
+                                     (limit,)).fetchall()
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def open_storage(backend: str, root: Path) -> Storage:
+    """'json' for player/world files under root, 'sqlite' for root/game.db"""
+    if backend == 'json':
+        return JsonStorage(root)
+    if backend == 'sqlite':
+        return SqliteStorage(Path(root) / "game.db")
+    raise ValueError(f"Unknown storage backend '{backend}' (expected json or sqlite)")
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Test script for the BATTLE_VIZ image pipeline
+Runs the Stable Diffusion client against local stub txt2img servers
+"""
+
+import asyncio
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+
+try:
+    from PIL import Image
+    from speech_ssh_server_BATTLE_VIZ import (StableDiffusionLoadBalancer, ImageCache, ImageFrame,
+                                              PlayerSession, stable_hash,
+                                              PRIORITY_COMBAT, PRIORITY_SCENE, PRIORITY_PORTRAIT)
+except ImportError as e:  # asyncssh, requests or Pillow not installed
+    StableDiffusionLoadBalancer = None
+    MISSING_DEPENDENCY = str(e)
+
+
+class StubSDServer:
+    """Minimal /sdapi/v1/txt2img server that answers after a delay"""
+    
+    def __init__(self, delay: float = 0.0, status: int = 200):
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8), (200, 40, 40)).save(buffer, 'PNG')
+        self.png_b64 = base64.b64encode(buffer.getvalue()).decode('ascii')
+        
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.requests += 1
+                time.sleep(stub.delay)
+                body = json.dumps({'images': [stub.png_b64]}).encode()
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeProcess:
+    """Just enough of an SSH process to capture what a PlayerSession writes"""
+    
+    def __init__(self, backlog: int = 0):
+        self.writes = []
+        self.drains = 0
+        self.backlog = backlog
+        self.stdout = self
+        self.channel = self
+    
+    def write(self, text: str):
+        self.writes.append(text)
+    
+    async def drain(self):
+        self.drains += 1
+        await asyncio.sleep(0)
+    
+    def get_write_buffer_size(self) -> int:
+        return self.backlog
+
+
+def make_balancer(workdir: str, stubs, extra_settings: str = "") -> "StableDiffusionLoadBalancer":
+    """Write a stablediffusion.ini pointing at the stubs and load it"""
+    lines = []
+    for i, stub in enumerate(stubs, 1):
+        lines += [f"[SD{i}]", "host = 127.0.0.1", f"port = {stub.port}", "timeout = 5", ""]
+    lines += ["[settings]", "cache_images = false", "image_format = jpg", extra_settings]
+    
+    config_file = os.path.join(workdir, "stablediffusion.ini")
+    with open(config_file, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    
+    return StableDiffusionLoadBalancer(config_file, cache_dir=os.path.join(workdir, "cache"))
+
+
+def test_async_render_keeps_loop_responsive():
+    """Test that a slow render doesn't freeze the event loop"""
+    print("\n🧪 Testing Non-blocking Image Generation\n")
+    
+    if StableDiffusionLoadBalancer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    workdir = tempfile.mkdtemp()
+    stub = StubSDServer(delay=0.5)
+    balancer = make_balancer(workdir, [stub])
+    
+    async def scenario():
+        ticks = 0
+        
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.02)
+                ticks += 1
+        
+        ticking = asyncio.create_task(ticker())
+        image = await balancer.generate_image_async("a dark dungeon", cache_key="room")
+        ticking.cancel()
+        return image, ticks
+    
+    try:
+        image, ticks = asyncio.run(scenario())
+    finally:
+        balancer.close()
+        stub.stop()
+        shutil.rmtree(workdir)
+    
+    assert image and image[:2] == b'\xff\xd8', "Expected a JPEG"
+    assert ticks >= 10, f"Event loop only ticked {ticks} times during the render"
+    print(f"   ✅ Got {len(image)} byte JPEG; loop ticked {ticks} times while rendering")
+    
+    print("\n✅ Non-blocking generation working correctly!")
+    return True
+
+
+def test_weighted_least_outstanding():
+    """Test that concurrent renders spread by weight and outstanding requests"""
+    print("\n🧪 Testing Weighted Load Balancing\n")
+    
+    if StableDiffusionLoadBalancer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    workdir = tempfile.mkdtemp()
+    big, small = StubSDServer(delay=0.2), StubSDServer(delay=0.2)
+    balancer = make_balancer(workdir, [big, small], "max_concurrent_renders = 8")
+    balancer.servers[0]['weight'] = 3
+    
+    async def scenario():
+        return await asyncio.gather(*[balancer.generate_image_async(f"scene {i}") for i in range(8)])
+    
+    try:
+        images = asyncio.run(scenario())
+    finally:
+        balancer.close()
+        big.stop()
+        small.stop()
+        shutil.rmtree(workdir)
+    
+    assert all(images)
+    assert big.requests + small.requests == 8
+    assert big.requests >= 5 and small.requests >= 1, (big.requests, small.requests)
+    print(f"   ✅ weight 3 server took {big.requests}, weight 1 server took {small.requests}")
+    
+    print("\n✅ Weighted load balancing working correctly!")
+    return True
+
+
+def test_circuit_breaker():
+    """Test that a failing server is taken out of rotation"""
+    print("\n🧪 Testing Circuit Breaker\n")
+    
+    if StableDiffusionLoadBalancer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    workdir = tempfile.mkdtemp()
+    broken, healthy = StubSDServer(status=500), StubSDServer()
+    balancer = make_balancer(workdir, [broken, healthy], "failure_threshold = 2\ncircuit_cooldown = 0.3")
+    
+    try:
+        print("1️⃣  Rendering while one server returns errors...")
+        images = [balancer.generate_image(f"scene {i}") for i in range(6)]
+        assert all(images)
+        assert broken.requests == 2, broken.requests
+        assert balancer.servers[0]['circuit'] == 'open'
+        print(f"   ✅ Broken server tried {broken.requests} times, then skipped")
+        
+        print("\n2️⃣  Half-open probe after the cooldown...")
+        time.sleep(0.35)
+        broken.status = 200
+        balancer.servers[1]['outstanding'] += 5  # Make the probe the obvious pick
+        assert balancer.generate_image("probe")
+        assert balancer.servers[0]['circuit'] == 'closed'
+        print("   ✅ Recovered server back in rotation")
+    finally:
+        balancer.close()
+        broken.stop()
+        healthy.stop()
+        shutil.rmtree(workdir)
+    
+    print("\n✅ Circuit breaker working correctly!")
+    return True
+
+
+def test_hedged_request():
+    """Test that a render stuck past p95 is hedged to another server"""
+    print("\n🧪 Testing Hedged Requests\n")
+    
+    if StableDiffusionLoadBalancer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    workdir = tempfile.mkdtemp()
+    usual, backup = StubSDServer(delay=0.05), StubSDServer(delay=0.05)
+    balancer = make_balancer(workdir, [usual, backup], "hedge_min_samples = 3")
+    balancer.servers[0]['weight'] = 10
+    
+    async def scenario():
+        for i in range(3):
+            await balancer.generate_image_async(f"warm up {i}")
+        usual.delay = 1.0
+        started = time.monotonic()
+        image = await balancer.generate_image_async("stalled scene")
+        return image, time.monotonic() - started
+    
+    try:
+        image, elapsed = asyncio.run(scenario())
+    finally:
+        balancer.close()
+        usual.stop()
+        backup.stop()
+        shutil.rmtree(workdir)
+    
+    assert image
+    assert backup.requests == 1, backup.requests
+    assert elapsed < 0.8, elapsed
+    print(f"   ✅ Stalled render answered by the backup in {elapsed:.2f}s")
+    
+    print("\n✅ Hedged requests working correctly!")
+    return True
+
+
+def test_render_coalescing():
+    """Test that concurrent renders of one cache_key share a single request"""
+    print("\n🧪 Testing Render Coalescing\n")
+    
+    if StableDiffusionLoadBalancer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    workdir = tempfile.mkdtemp()
+    stub = StubSDServer(delay=0.2)
+    balancer = make_balancer(workdir, [stub])
+    
+    async def scenario():
+        return await asyncio.gather(*[balancer.render("the great hall", "great_hall") for _ in range(5)])
+    
+    try:
+        images = asyncio.run(scenario())
+    finally:
+        balancer.close()
+        stub.stop()
+        shutil.rmtree(workdir)
+    
+    assert all(image == images[0] for image in images) and images[0]
+    assert stub.requests == 1, stub.requests
+    assert balancer.stats['coalesced'] == 4
+    assert not balancer.inflight
+    print(f"   ✅ 5 players, {stub.requests} txt2img request")
+    
+    print("\n✅ Render coalescing working correctly!")
+    return True
+
+
+def test_render_priority_and_stale():
+    """Test that combat renders go first, the queue is bounded, and stale renders are skipped"""
+    print("\n🧪 Testing Render Queue\n")
+    
+    if StableDiffusionLoadBalancer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    workdir = tempfile.mkdtemp()
+    stub = StubSDServer(delay=0.1)
+    balancer = make_balancer(workdir, [stub], "max_concurrent_renders = 1\nrender_queue_size = 2")
+    order = []
+    
+    async def render(name, priority, wanted=None):
+        image = await balancer.render(name, name, priority, wanted)
+        if image:
+            order.append(name)
+        return image
+    
+    async def scenario():
+        busy = asyncio.create_task(render("busy", PRIORITY_SCENE))
+        await asyncio.sleep(0.05)  # The only worker is now rendering
+        queued = [
+            asyncio.create_task(render("portrait", PRIORITY_PORTRAIT)),
+            asyncio.create_task(render("left room", PRIORITY_SCENE, lambda: False)),
+            asyncio.create_task(render("combat", PRIORITY_COMBAT)),
+        ]
+        return await asyncio.gather(busy, *queued)
+    
+    try:
+        busy, portrait, left_room, combat = asyncio.run(scenario())
+    finally:
+        balancer.close()
+        stub.stop()
+        shutil.rmtree(workdir)
+    
+    assert busy and combat
+    assert portrait is None and balancer.stats['dropped_full'] == 1
+    print("   ✅ Full queue dropped the portrait to make room for combat")
+    assert left_room is None and balancer.stats['dropped_stale'] == 1
+    print("   ✅ Render for a player who left was skipped")
+    assert order == ["busy", "combat"], order
+    assert stub.requests == 2, stub.requests
+    print(f"   ✅ Render order: {order}")
+    
+    print("\n✅ Render queue working correctly!")
+    return True
+
+
+def test_image_cache():
+    """Test the memory and disk cache tiers, their limits and counters"""
+    print("\n🧪 Testing Image Cache\n")
+    
+    if StableDiffusionLoadBalancer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    workdir = tempfile.mkdtemp()
+    cache_dir = Path(workdir)
+    image = lambda n: bytes([n]) * 1000
+    
+    try:
+        print("1️⃣  Memory tier...")
+        cache = ImageCache(cache_dir, memory_bytes=2500, disk_bytes=3500, max_age=3600)
+        for n in range(3):
+            cache.put(f"room{n}", image(n))
+        assert cache.get("room2") == image(2) and cache.stats['hits_memory'] == 1
+        assert cache.stats['evictions_memory'] == 1, cache.stats
+        frame = cache.frame("room2", cache.get("room2"))
+        assert cache.frame("room2", cache.get("room2")) is frame
+        print(f"   ✅ {len(cache.memory)} images in {cache.memory_used} bytes, encoded frame reused")
+        
+        print("\n2️⃣  Disk tier...")
+        assert cache.get("room0") == image(0) and cache.stats['hits_disk'] == 1
+        cache.put("room3", image(3))
+        assert cache.stats['evictions_disk'] == 1 and len(list(cache_dir.glob('*.jpg'))) == 3
+        assert cache.get("missing") is None and cache.stats['misses'] == 1
+        assert not list(cache_dir.glob('*.tmp'))
+        print(f"   ✅ Oldest file evicted, {cache.disk_used} bytes on disk")
+        
+        print("\n3️⃣  Restart and expiry...")
+        old_file = cache_dir / cache.file_name("room2")
+        os.utime(old_file, (time.time() - 7200, time.time() - 7200))
+        cache = ImageCache(cache_dir, memory_bytes=2500, disk_bytes=3500, max_age=3600)
+        assert cache.get("room3") == image(3) and cache.stats['hits_disk'] == 1
+        assert cache.get("room2") is None and not old_file.exists()
+        print("   ✅ Existing files reused after restart, stale ones dropped")
+        
+        print("\n4️⃣  Disk I/O outside the lock...")
+        held = []
+        replace, utime = os.replace, os.utime
+        os.replace = lambda *args: (held.append(cache.lock.locked()), replace(*args))
+        os.utime = lambda *args: (held.append(cache.lock.locked()), utime(*args))
+        try:
+            cache.put("room4", image(4))
+            cache.memory.clear()
+            cache.memory_used = 0
+            assert cache.get("room4") == image(4)
+        finally:
+            os.replace, os.utime = replace, utime
+        assert held == [False, False], held
+        print("   ✅ Reads and writes don't block frame() on the event loop")
+        
+        assert stable_hash(*sorted(["sword", "lamp"])) == stable_hash(*sorted(["lamp", "sword"]))
+        print(f"   ✅ Inventory key is stable: {stable_hash('lamp', 'sword')}")
+    finally:
+        shutil.rmtree(workdir)
+    
+    print("\n✅ Image cache working correctly!")
+    return True
+
+
+def test_image_frames():
+    """Test that image frames are encoded once and streamed in chunks"""
+    print("\n🧪 Testing Image Frames\n")
+    
+    if StableDiffusionLoadBalancer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    workdir = tempfile.mkdtemp()
+    try:
+        cache = ImageCache(Path(workdir), memory_bytes=10**6, disk_bytes=10**6, max_age=3600)
+        image_data = os.urandom(100 * 1024)
+        cache.put("combat", image_data)
+        frame = cache.frame("combat", cache.get("combat"))
+        assert cache.frame("combat", cache.get("combat")) is frame
+        print(f"   ✅ One {len(frame)} byte frame shared by both combatants")
+    finally:
+        shutil.rmtree(workdir)
+    
+    attacker, defender = FakeProcess(), FakeProcess()
+    lagging = FakeProcess(backlog=PlayerSession.IMAGE_SKIP_BUFFER + 1)
+    sessions = [PlayerSession(name, process) for name, process in
+                (("attacker", attacker), ("defender", defender), ("lagging", lagging))]
+    
+    finished = []
+    
+    async def finish(name, coroutine):
+        await coroutine
+        finished.append(name)
+    
+    async def scenario():
+        images = [asyncio.create_task(finish(session.player_name, session.send_image(frame)))
+                  for session in sessions]
+        await asyncio.sleep(0)  # The attacker's frame is now streaming
+        await finish("text", sessions[0].send("You hit the troll!"))
+        await asyncio.gather(*images)
+    
+    asyncio.run(scenario())
+    
+    expected_chunks = -(-len(frame) // PlayerSession.IMAGE_CHUNK)
+    assert len(attacker.writes) == expected_chunks + 1, len(attacker.writes)
+    assert attacker.drains == expected_chunks + 1
+    assert finished.index("text") < finished.index("attacker"), finished
+    text_at = attacker.writes.index("You hit the troll!\n")
+    assert 0 < text_at < expected_chunks, text_at
+    print(f"   ✅ Streamed in {expected_chunks} chunks, text sent after chunk {text_at} of the frame")
+    
+    for process in (attacker, defender):
+        chunks = [write for write in process.writes if write.startswith("\x1b]IMAGE")]
+        assert all(chunk.startswith("\x1b]IMAGE+;") for chunk in chunks[:-1])
+        assert chunks[-1].startswith("\x1b]IMAGE;") and all(chunk.endswith("\x1b\\") for chunk in chunks)
+        encoded = "".join(chunk[chunk.index(";") + 1:-2] for chunk in chunks)
+        assert base64.b64decode(encoded) == image_data
+    print("   ✅ Every chunk is a complete escape; the parts join up into the image")
+    assert list(ImageFrame(b"tiny").chunks(PlayerSession.IMAGE_CHUNK)) == ["\x1b]IMAGE;dGlueQ==\x1b\\"]
+    assert not lagging.writes
+    print("   ✅ Player with a full output buffer skipped")
+    
+    print("\n✅ Image frames working correctly!")
+    return True
+
+
+def main():
+    print("=" * 60)
+    print("  BATTLE_VIZ IMAGE PIPELINE - TEST SUITE")
+    print("=" * 60)
+    
+    tests = [
+        ("Non-blocking Generation", test_async_render_keeps_loop_responsive),
+        ("Weighted Load Balancing", test_weighted_least_outstanding),
+        ("Circuit Breaker", test_circuit_breaker),
+        ("Hedged Requests", test_hedged_request),
+        ("Render Coalescing", test_render_coalescing),
+        ("Render Queue", test_render_priority_and_stale),
+        ("Image Cache", test_image_cache),
+        ("Image Frames", test_image_frames),
+    ]
+    
+    results = []
+    for test_name, test_func in tests:
+        print("\n" + "=" * 60)
+        try:
+            results.append((test_name, test_func()))
+        except Exception as e:
+            print(f"\n❌ EXCEPTION in {test_name}: {e}")
+            results.append((test_name, False))
+    
+    print("\n" + "=" * 60)
+    for test_name, result in results:
+        print(f"{'✅ PASS' if result else '❌ FAIL'}  {test_name}")
+    passed = sum(1 for _, result in results if result)
+    print(f"\n  TOTAL: {passed}/{len(results)} tests passed")
+    print("=" * 60)
+    
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,9 +4,16 @@ Test script to verify the water→ice transformation works correctly
 """
 
 from game_engine import GameEngine
+from game_engine_rpg import GameEngineRPG, Room, RoomGraph
+from sprite_table import np
+import os
 import sys
 
 
+# The .ini files ship next to this script when there is no config/ directory
+WORLD_PATH = "config" if os.path.isdir("config") else os.path.dirname(os.path.abspath(__file__))
+
+
 def test_water_to_ice():
     """Test the water to ice transformation"""
     print("🧪 Testing Water → Ice Transformation\n")
@@ -139,6 +146,854 @@ def test_config_loading():
     return True
 
 
+def test_location_index():
+    """Test that the RPG location index tracks every move"""
+    print("\n🧪 Testing Location Index\n")
+    
+    engine = GameEngineRPG(config_path=WORLD_PATH)
+    engine.start_game()
+    
+    def index_matches_world():
+        for obj in engine.objects.values():
+            assert obj.id in engine.index.objects_at(obj.location), obj.id
+        for sprite in engine.sprites.values():
+            assert sprite.id in engine.index.sprites_at(sprite.location), sprite.id
+        indexed = sum(len(ids) for ids in engine.index.objects.values())
+        assert indexed == len(engine.objects)
+    
+    print("1️⃣  Checking index after loading...")
+    index_matches_world()
+    assert engine.index.players_at(engine.player_location) == [engine.player_name]
+    print("   ✅ Index matches world")
+    
+    print("\n2️⃣  Taking and dropping the rusty sword...")
+    start = engine.player_location
+    engine.execute_command("take rusty sword")
+    assert "rusty_sword" not in engine.index.objects_at(start)
+    assert "rusty_sword" in engine.index.objects_at("inventory")
+    engine.execute_command("s")
+    engine.execute_command("drop rusty sword")
+    assert "rusty_sword" in engine.index.objects_at(engine.player_location)
+    assert engine.index.players_at(start) == []
+    index_matches_world()
+    print("   ✅ Take/drop/move keep the index current")
+    
+    print("\n3️⃣  Spawning and slaying a sprite...")
+    sprite_id = engine.spawn_sprite("rat_template", engine.player_location)
+    assert sprite_id in engine.index.sprites_at(engine.player_location)
+    engine.sprites[sprite_id].health = 1
+    engine.attack(engine.sprites[sprite_id])
+    assert sprite_id not in engine.index.sprites_at(engine.player_location)
+    index_matches_world()
+    print("   ✅ Spawns and deaths keep the index current")
+    
+    print("\n✅ Location index working correctly!")
+    return True
+
+
+def test_verb_lookup():
+    """Test the precomputed verb alias table"""
+    print("\n🧪 Testing Verb Lookup Table\n")
+    
+    engine = GameEngine(config_path=WORLD_PATH)
+    
+    print("1️⃣  Resolving every verb and alias...")
+    for verb_id, verb_data in engine.verbs.items():
+        assert engine.get_verb_handler(verb_id.upper()) == verb_id
+        for alias in verb_data['aliases']:
+            assert engine.get_verb_handler(alias) in engine.verbs
+    assert engine.get_verb_handler("grab") == "take"
+    assert engine.get_verb_handler("xyzzy") is None
+    assert engine.direction_map["n"] == "north"
+    print(f"   ✅ {len(engine.verb_lookup)} entries resolve")
+    
+    print("\n2️⃣  Detecting alias collisions...")
+    engine.verbs["snatch"] = {'name': 'snatch', 'aliases': ['grab', 'look'],
+                              'requires_object': True, 'description': ''}
+    engine.build_verb_lookup()
+    assert ("grab", "take", "snatch") in engine.verb_alias_collisions
+    assert ("look", "look", "snatch") in engine.verb_alias_collisions
+    assert engine.get_verb_handler("grab") == "take"
+    print("   ✅ Collisions reported, first definition kept")
+    
+    print("\n✅ Verb lookup working correctly!")
+    return True
+
+
+def test_name_lookup():
+    """Test name/alias token lookup for objects and sprites"""
+    print("\n🧪 Testing Name Lookup\n")
+    
+    engine = GameEngineRPG(config_path=WORLD_PATH)
+    engine.start_game()
+    
+    print("1️⃣  Resolving by name, id and word prefix...")
+    assert engine.find_object("rusty sword").id == "rusty_sword"
+    assert engine.find_object("iron_sword").id == "iron_sword"
+    assert engine.find_object("chand").id == "chandelier"
+    assert engine.find_object("knife") is None  # In the kitchen, not here
+    print("   ✅ Names, ids and prefixes resolve in scope")
+    
+    print("\n2️⃣  Reporting ambiguous matches...")
+    result = engine.execute_command("take sword")
+    assert result == "Which do you mean: the iron sword or the rusty sword?", result
+    assert [obj.id for obj in engine.find_objects("sword")] == ["iron_sword", "rusty_sword"]
+    print(f"   ✅ {result}")
+    
+    print("\n3️⃣  Following objects as they move...")
+    engine.execute_command("take rusty sword")
+    engine.execute_command("w")
+    assert engine.find_object("rusty").id == "rusty_sword"  # Inventory
+    assert engine.find_object("iron sword") is None  # Left behind
+    engine.spawn_sprite("rat_template", engine.player_location)
+    assert engine.find_sprite("giant rat") is not None
+    print("   ✅ Lookups track inventory and room changes")
+    
+    print("\n✅ Name lookup working correctly!")
+    return True
+
+
+def test_transformation_scheduler():
+    """Test that only due transformation rules are checked each turn"""
+    print("\n🧪 Testing Transformation Scheduler\n")
+    
+    engine = GameEngine(config_path=WORLD_PATH)
+    engine.start_game()
+    
+    checked = []
+    check_transformation = engine.check_transformation
+    def counting_check(transformation):
+        checked.append(transformation['id'])
+        return check_transformation(transformation)
+    engine.check_transformation = counting_check
+    
+    print("1️⃣  Freezing water...")
+    engine.objects["water"].location = "freezer"
+    messages = engine.process_turn() + engine.process_turn()
+    assert "water_to_ice" not in checked, checked
+    messages = engine.process_turn()
+    assert "water_to_ice" in checked
+    assert engine.objects["water"].state == "frozen", messages
+    print(f"   ✅ Fired on turn {engine.turn_count}: {messages[0]}")
+    
+    print("\n2️⃣  Checking that idle turns stay cheap...")
+    checked.clear()
+    engine.objects["water"].location = "freezer"
+    engine.process_turn()
+    assert "water_to_ice" not in checked  # Water is frozen now, rule not indexed for it
+    assert len(checked) < len(engine.transformations), checked
+    print(f"   ✅ {len(checked)} of {len(engine.transformations)} rules checked")
+    
+    print("\n3️⃣  Setting aside rules that wait for a cold room...")
+    engine = GameEngine(config_path=WORLD_PATH)
+    engine.start_game()
+    check_transformation = engine.check_transformation  # counting_check now wraps this engine's
+    engine.check_transformation = counting_check
+    for _ in range(5):
+        engine.process_turn()
+    assert "water" in engine.scheduler.blocked  # Kitchen isn't cold
+    checked.clear()
+    for _ in range(20):
+        engine.process_turn()
+    assert "water_to_ice" not in checked, checked
+    engine.player_location = engine.objects["water"].location
+    engine.take(engine.objects["water"])
+    engine.player_location = "freezer"
+    engine.drop(engine.objects["water"])
+    messages = engine.process_turn()
+    assert any("frozen" in message for message in messages), messages
+    print("   ✅ Not rechecked while idle, fired once moved to the freezer")
+    
+    print("\n4️⃣  Waking rules on any move, not just take/drop/put...")
+    engine = GameEngine(config_path=WORLD_PATH)
+    engine.start_game()
+    for _ in range(5):
+        engine.process_turn()
+    assert "water" in engine.scheduler.blocked
+    engine.objects["water"].location = "freezer"  # Moved without a verb
+    assert "water" not in engine.scheduler.blocked
+    messages = engine.process_turn()
+    assert any("frozen" in message for message in messages), messages
+    
+    from game_engine import WorldTemplate
+    session = GameEngine(template=WorldTemplate(WORLD_PATH))
+    session.start_game()
+    for _ in range(5):
+        session.process_turn()
+    assert "water" in session.scheduler.blocked
+    session.writable_object("water").location = "freezer"
+    assert "water" not in session.scheduler.blocked
+    print("   ✅ Direct moves re-armed the rule, in a template session too")
+    
+    print("\n5️⃣  Waking rules from the location index (RPG engine)...")
+    rpg = GameEngineRPG(config_path=WORLD_PATH, seed=1)
+    rpg.start_game()
+    for _ in range(5):
+        rpg.process_turn()
+    assert "water" in rpg.scheduler.blocked
+    rpg.objects["water"].location = "freezer"  # Any move reaches the index
+    assert "water" not in rpg.scheduler.blocked
+    messages = rpg.process_turn()
+    assert any("frozen" in message for message in messages), messages
+    print("   ✅ Moving the water re-armed its rule")
+    
+    print("\n✅ Transformation scheduler working correctly!")
+    return True
+
+
+def test_world_snapshot():
+    """Test that engines reuse the compiled world snapshot until an .ini changes"""
+    print("\n🧪 Testing World Snapshot\n")
+    
+    import shutil
+    import tempfile
+    from game_engine import snapshot_path
+    
+    world = tempfile.mkdtemp()
+    try:
+        for name in GameEngineRPG.CONFIG_FILES:
+            if os.path.exists(os.path.join(WORLD_PATH, name)):
+                shutil.copy(os.path.join(WORLD_PATH, name), world)
+        
+        print("1️⃣  Compiling on first load...")
+        first = GameEngineRPG(config_path=world)
+        assert os.path.exists(snapshot_path(world, "GameEngineRPG"))
+        print(f"   ✅ Snapshot written with {len(first.objects)} objects")
+        
+        print("\n2️⃣  Loading from the snapshot...")
+        load_verbs = GameEngineRPG.load_verbs
+        GameEngineRPG.load_verbs = None  # Any re-parse would now fail
+        try:
+            second = GameEngineRPG(config_path=world)
+        finally:
+            GameEngineRPG.load_verbs = load_verbs
+        assert sorted(second.objects) == sorted(first.objects)
+        assert second.verb_lookup == first.verb_lookup
+        assert second.sprite_templates.keys() == first.sprite_templates.keys()
+        assert second.objects is not first.objects
+        print("   ✅ Same world, separate objects")
+        
+        print("\n3️⃣  Editing rooms.ini invalidates it...")
+        with open(os.path.join(world, "rooms.ini"), "a") as f:
+            f.write("\n[snapshot_test_room]\nname = Snapshot Test Room\ndescription = New.\n")
+        third = GameEngineRPG(config_path=world)
+        assert "snapshot_test_room" in third.rooms
+        print("   ✅ New room picked up")
+    finally:
+        shutil.rmtree(world)
+    
+    print("\n✅ World snapshot working correctly!")
+    return True
+
+
+def test_world_template():
+    """Test that session engines share one world and keep their own changes"""
+    print("\n🧪 Testing World Template\n")
+    
+    from game_engine import WorldTemplate
+    
+    template = WorldTemplate(WORLD_PATH)
+    alice = GameEngine(template=template)
+    bob = GameEngine(template=template)
+    alice.start_game()
+    bob.start_game()
+    
+    print("1️⃣  Checking shared world data...")
+    assert alice.rooms is bob.rooms is template.rooms
+    assert alice.verb_lookup is template.verb_lookup
+    assert not alice.objects.changed
+    print(f"   ✅ {len(alice.rooms)} rooms shared, no objects copied")
+    
+    for command in ("look", "inventory", "examine table", "open cabinet"):
+        alice.execute_command(command)
+    assert not alice.objects.changed
+    print("   ✅ Reading objects copies nothing")
+    
+    print("\n2️⃣  Changing one session...")
+    alice.player_location = "kitchen"
+    alice.execute_command("take water")
+    assert alice.objects["water"].location == "inventory"
+    assert bob.objects["water"] is template.objects["water"]
+    assert bob.objects["water"].location == "kitchen"
+    assert template.objects["water"].location == "kitchen"
+    assert list(alice.objects.changed) == ["water"]
+    print("   ✅ Only the water was copied into Alice's session")
+    
+    print("\n3️⃣  Freezing water in one session...")
+    alice.objects["water"].location = "freezer"
+    for _ in range(3):
+        alice.process_turn()
+    assert alice.objects["water"].state == "frozen"
+    assert template.objects["water"].state == "liquid"
+    assert bob.objects["water"].state == "liquid"
+    print("   ✅ Template untouched")
+    
+    print("\n4️⃣  Running idle turns in a new session...")
+    carol = GameEngine(template=template)
+    carol.start_game()
+    for _ in range(30):
+        carol.process_turn()
+    for obj_id, obj in carol.objects.changed.items():  # Only objects a rule actually changed
+        original = template.objects[obj_id]
+        assert (obj.name, obj.state) != (original.name, original.state), obj_id
+    assert len(carol.objects.changed) < len(template.objects) // 2
+    print(f"   ✅ {len(carol.objects.changed)} of {len(template.objects)} objects copied after 30 turns")
+    
+    print("\n✅ World template working correctly!")
+    return True
+
+
+def test_player_contexts():
+    """Test that commands act on the player context they are given"""
+    print("\n🧪 Testing Player Contexts\n")
+    
+    from game_engine_rpg import PlayerContext
+    
+    engine = GameEngineRPG(config_path=WORLD_PATH, player_name="SERVER")
+    engine.start_game()
+    alice = PlayerContext(name="alice", location="kitchen")
+    bob = PlayerContext(name="bob", location="kitchen")
+    
+    print("1️⃣  Alice takes the water...")
+    result = engine.execute_command("take water", alice)
+    assert "Taken" in result, result
+    assert alice.inventory == {"water"}
+    assert not bob.inventory and not engine.inventory
+    print(f"   ✅ {result}")
+    
+    print("\n2️⃣  Bob can't drop what Alice holds...")
+    result = engine.execute_command("drop water", bob)
+    assert "water" in alice.inventory, result
+    print(f"   ✅ {result}")
+    
+    print("\n3️⃣  Moving one player leaves the others in place...")
+    start = engine.player_location
+    engine.execute_command("north", alice)
+    assert alice.location != "kitchen"
+    assert bob.location == "kitchen" and engine.player_location == start
+    print(f"   ✅ Alice in {alice.location}, Bob in {bob.location}")
+    
+    print("\n✅ Player contexts working correctly!")
+    return True
+
+
+def test_area_of_interest():
+    """Test that only sprites near players are simulated every turn"""
+    print("\n🧪 Testing Area-of-Interest Simulation\n")
+    
+    engine = GameEngineRPG(config_path=WORLD_PATH, sim_radius=1)
+    engine.start_game()
+    engine.sim_far_batch = 0
+    start = engine.player_location
+    near_rooms = engine.rooms_within({start}, 1)
+    far_room = next(room_id for room_id in engine.rooms if room_id not in near_rooms)
+    template = next(iter(engine.sprite_templates))
+    far = [engine.spawn_sprite(template, far_room) for _ in range(30)]
+    far = [sprite_id for sprite_id in far if sprite_id]
+    
+    print(f"1️⃣  {len(far)} sprites in {far_room}, out of range of {start}...")
+    for _ in range(10):
+        engine.turn_count += 1
+        engine.process_sprite_ai()
+    assert all(engine.sprites[sprite_id].location == far_room for sprite_id in far)
+    assert engine.sim_stats['simulated'] == 0, engine.sim_stats
+    print("   ✅ Far sprites left alone")
+    
+    print("\n2️⃣  Player walks up...")
+    engine.player_location = far_room
+    engine.turn_count += 1
+    engine.process_sprite_ai()
+    assert engine.sim_stats['fast_forwarded'] == len(far), engine.sim_stats
+    assert any(engine.sprites[sprite_id].location != far_room for sprite_id in far)
+    print(f"   ✅ {engine.sim_stats['fast_forwarded']} sprites fast-forwarded through 10 missed turns")
+    
+    print("\n3️⃣  Far batches keep the rest of the world moving...")
+    engine.player_location = start
+    engine.sim_far_batch = 4
+    simulated = engine.sim_stats['simulated']
+    near_now = sum(1 for sprite_id in engine.sprites
+                   if engine.sprites[sprite_id].location in near_rooms)
+    engine.turn_count += 1
+    engine.process_sprite_ai()
+    assert engine.sim_stats['simulated'] - simulated <= near_now + 4
+    print(f"   ✅ {engine.sim_stats['simulated'] - simulated} sprite turns instead of {len(engine.sprites)}")
+    
+    print("\n✅ Area-of-interest simulation working correctly!")
+    return True
+
+
+def test_sprite_population():
+    """Test spawn caps, removal of dead sprites, pooling and sprite ids"""
+    print("\n🧪 Testing Sprite Population\n")
+    
+    engine = GameEngineRPG(config_path=WORLD_PATH)
+    engine.start_game()
+    
+    print("1️⃣  500 turns of spawning...")
+    for _ in range(500):
+        engine.check_spawns()
+    for template_name, template in engine.sprite_templates.items():
+        assert engine.sprite_population[template_name] <= template['max_population']
+    for room_id in engine.rooms:
+        assert len(engine.index.sprites_at(room_id)) <= engine.MAX_SPRITES_PER_ROOM
+    total_cap = sum(template['max_population'] for template in engine.sprite_templates.values())
+    print(f"   ✅ {len(engine.sprites)} sprites (template caps allow {total_cap})")
+    
+    print("\n2️⃣  Dead sprites are removed, loot is dropped...")
+    sprite = next(iter(engine.sprites.values()))
+    engine.objects["knife"].location = sprite.id
+    sprite.inventory.add("knife")
+    sprite.health = 0
+    room, old_id = sprite.location, sprite.id
+    engine.process_sprite_ai()
+    assert sprite.id not in engine.sprites and sprite in engine.sprite_pool
+    assert engine.objects["knife"].location == room
+    print(f"   ✅ {sprite.id} removed, knife left in {room}")
+    
+    print("\n3️⃣  Spawning reuses pooled sprites with fresh ids...")
+    template_name = next(iter(engine.sprite_templates))
+    new_id = engine.spawn_sprite(template_name, room)
+    assert engine.sprites[new_id] is sprite and new_id != old_id
+    assert sprite.health == sprite.max_health and not sprite.inventory
+    ids = [engine.spawn_sprite(template_name, room) for _ in range(3)]
+    serials = [int(sprite_id.rsplit('_', 1)[1]) for sprite_id in [new_id] + ids]
+    assert serials == sorted(serials) and len(set(serials)) == 4
+    print(f"   ✅ Reused instance as {new_id}, next ids {ids}")
+    
+    print("\n✅ Sprite population working correctly!")
+    return True
+
+
+def test_sprite_table():
+    """Test the NumPy sprite table against the Sprite objects it mirrors"""
+    print("\n🧪 Testing Sprite Table\n")
+    
+    if np is None:
+        print("   ⏭️  Skipped: NumPy not installed")
+        return True
+    
+    engine = GameEngineRPG(config_path=WORLD_PATH, sprite_table=True)
+    engine.start_game()
+    table = engine.sprite_table
+    template_name = next(iter(engine.sprite_templates))
+    
+    def check_mirror():
+        assert len(table) == len(engine.sprites)
+        for sprite in engine.sprites.values():
+            row = table.rows[sprite.id]
+            assert table.room_ids[table.location[row]] == sprite.location
+            assert table.health[row] == sprite.health and table.damage[row] == sprite.damage
+    
+    print("1️⃣  Rows mirror sprites...")
+    for room_id in engine.rooms:
+        engine.spawn_sprite(template_name, room_id)
+    check_mirror()
+    print(f"   ✅ {len(table)} sprites in {len(table.room_ids)} rooms")
+    
+    print("\n2️⃣  Sprites wander and the moves are written back...")
+    before = {sprite_id: sprite.location for sprite_id, sprite in engine.sprites.items()}
+    for _ in range(20):
+        engine.player_health = 100
+        engine.process_sprite_ai()
+    check_mirror()
+    moved = [sprite_id for sprite_id, sprite in engine.sprites.items() if sprite.location != before[sprite_id]]
+    assert moved
+    for sprite in engine.sprites.values():
+        assert sprite.id in engine.index.sprites_at(sprite.location)
+    print(f"   ✅ {len(moved)} sprites moved, index and table agree")
+    
+    print("\n3️⃣  Hostile sprites in the player's room attack...")
+    room = engine.player_location
+    for sprite_id in engine.index.sprites_at(room):
+        engine.remove_sprite(sprite_id)
+    attacker = engine.sprites[engine.spawn_sprite(template_name, room)]
+    attacker.aggression = 1.0
+    attacker.damage = 7
+    engine.player_health = 100
+    messages = engine.process_sprite_ai()
+    assert engine.player_health == 93 and attacker.location == room
+    assert f"BATTLE_START:{attacker.name}" in messages
+    print(f"   ✅ {attacker.name} hit for 7, player at {engine.player_health}")
+    
+    print("\n4️⃣  Dead sprites give their rows back...")
+    row = table.rows[attacker.id]
+    attacker.health = 0
+    engine.process_sprite_ai()
+    assert attacker.id not in engine.sprites and attacker.id not in table.rows
+    new_id = engine.spawn_sprite(template_name, room)
+    assert table.rows[new_id] == row
+    check_mirror()
+    print(f"   ✅ Row {row} reused by {new_id}")
+    
+    print("\n5️⃣  Both AI paths hit every player in the room and count deaths alike...")
+    from game_engine_rpg import PlayerContext
+    
+    def fight(use_table: bool) -> list:
+        engine = GameEngineRPG(config_path=WORLD_PATH, sprite_table=use_table, seed=3)
+        for sprite_id in list(engine.sprites):
+            engine.remove_sprite(sprite_id)
+        players = [PlayerContext(name="alice", location="kitchen"), PlayerContext(name="bob", location="kitchen"),
+                   PlayerContext(name="carol", location="freezer")]
+        for room, damage in (("kitchen", 30), ("kitchen", 20), ("freezer", 25)):
+            sprite = engine.sprites[engine.spawn_sprite(template_name, room)]
+            sprite.aggression = 1.0
+            sprite.damage = damage
+        for _ in range(4):
+            engine.sprite_turn(players)
+        return [(player.name, player.health, player.deaths) for player in players]
+    
+    expected = [("alice", -100, 3), ("bob", -100, 3), ("carol", 0, 1)]
+    assert fight(False) == expected, fight(False)
+    assert fight(True) == expected, fight(True)
+    print(f"   ✅ {expected} with and without the table")
+    
+    print("\n✅ Sprite table working correctly!")
+    return True
+
+
+def test_room_graph():
+    """Test the compiled room graph: exits, BFS tables and radius queries"""
+    print("\n🧪 Testing Room Graph\n")
+    
+    engine = GameEngineRPG(config_path=WORLD_PATH)
+    graph = engine.room_graph
+    
+    print("1️⃣  Exits match rooms.ini...")
+    for room_id, room in engine.rooms.items():
+        assert graph.exits(room_id) == list(room.exits.items())
+    assert not graph.dangling and len(graph.components()) == 1
+    print(f"   ✅ {len(graph)} rooms, {len(graph.targets)} exits, one component")
+    
+    print("\n2️⃣  Shortest paths...")
+    for start in engine.rooms:
+        for goal in engine.rooms:
+            steps, room = 0, start
+            while room != goal:
+                direction, next_room = graph.next_step(room, goal)
+                assert engine.rooms[room].exits[direction] == next_room
+                room = next_room
+                steps += 1
+            assert steps == graph.distance(start, goal)
+    print(f"   ✅ freezer -> dragon_shrine: {graph.distance('freezer', 'dragon_shrine')} exits, "
+          f"first {graph.next_step('freezer', 'dragon_shrine')[0]}")
+    
+    print("\n3️⃣  Rooms within k exits...")
+    assert graph.within({'kitchen'}, 0) == ['kitchen']
+    assert graph.within({'kitchen'}, 1) == ['kitchen', 'freezer', 'entrance_hall']
+    assert len(graph.within({'kitchen'}, 99)) == len(graph)
+    for room_id in graph.within({'kitchen'}, 2):
+        assert graph.distance('kitchen', room_id) <= 2
+    print(f"   ✅ Within 2 of kitchen: {graph.within({'kitchen'}, 2)}")
+    
+    print("\n4️⃣  Broken maps are reported...")
+    rooms = {
+        'a': Room(id='a', name='A', description='', exits={'north': 'b', 'east': 'nowhere'}),
+        'b': Room(id='b', name='B', description='', exits={'south': 'a'}),
+        'c': Room(id='c', name='C', description='', exits={'west': 'a'}),
+        'd': Room(id='d', name='D', description=''),
+    }
+    broken = RoomGraph(rooms)
+    assert broken.dangling == [('a', 'east', 'nowhere')]
+    assert broken.unreachable_from('a') == ['c', 'd']
+    assert broken.components() == [['a', 'b', 'c'], ['d']]
+    assert broken.distance('a', 'c') is None and broken.next_step('a', 'c') is None
+    assert broken.random_exit('d') is None and broken.random_exit('a') == ('north', 'b')
+    print("   ✅ Dangling exit, unreachable rooms and components found")
+    
+    print("\n✅ Room graph working correctly!")
+    return True
+
+
+def test_player_persistence():
+    """Test write-behind saving of multiplayer player files"""
+    print("\n🧪 Testing Player Persistence\n")
+    
+    import json
+    import shutil
+    import tempfile
+    import time
+    from storage import JsonStorage, Storage
+    
+    root = tempfile.mkdtemp()
+    player_file = os.path.join(root, "players", "Alice", "player.json")
+    try:
+        print("1️⃣  Turns only queue the player's state...")
+        engine = GameEngineRPG(config_path=WORLD_PATH, player_name="Alice", multiplayer_root=root,
+                               save_interval=60)
+        engine.start_game()
+        engine.sprite_templates.clear()
+        for _ in range(50):
+            engine.player_health = 100
+            engine.process_turn()
+        stats = engine.player_store.stats
+        assert stats['saves'] == 50 and stats['writes'] == 0 and not os.path.exists(player_file)
+        print(f"   ✅ 50 turns, no file writes ({stats['coalesced']} saves coalesced)")
+        
+        print("\n2️⃣  Flushing writes the latest state atomically...")
+        engine.inventory.add("knife")
+        engine.save_player_state()
+        engine.flush_player_state()
+        with open(player_file) as f:
+            state = json.load(f)
+        assert state['turn_count'] == 50 and state['inventory'] == ["knife"]
+        assert os.listdir(os.path.dirname(player_file)) == ["player.json"]  # No temp files left
+        engine.close()
+        print(f"   ✅ One write, turn {state['turn_count']}")
+        
+        print("\n3️⃣  A new session picks the player back up...")
+        again = GameEngineRPG(config_path=WORLD_PATH, player_name="Alice", multiplayer_root=root,
+                              save_interval=0.05)
+        again.start_game()
+        assert again.turn_count == 50 and again.inventory == {"knife"}
+        print("   ✅ Turn count and inventory restored")
+        
+        print("\n4️⃣  The writer thread flushes on its own...")
+        again.sprite_templates.clear()
+        again.process_turn()
+        time.sleep(0.3)
+        with open(player_file) as f:
+            assert json.load(f)['turn_count'] == 51
+        again.close()
+        assert not again.player_store.thread.is_alive()
+        print(f"   ✅ Written in the background ({again.player_store.stats['batches']} batches)")
+        
+        print("\n5️⃣  SQLite backend, with the world...")
+        db_root = os.path.join(root, "sqlite")
+        engine = GameEngineRPG(config_path=WORLD_PATH, player_name="Bob", multiplayer_root=db_root,
+                               save_interval=0, storage='sqlite')
+        engine.start_game()
+        engine.objects["knife"].location = "freezer"
+        engine.kills = 4
+        engine.close()
+        assert os.path.exists(os.path.join(db_root, "game.db"))
+        
+        again = GameEngineRPG(config_path=WORLD_PATH, player_name="Bob", multiplayer_root=db_root,
+                              save_interval=0, storage='sqlite')
+        again.start_game()
+        assert again.objects["knife"].location == "freezer" and again.kills == 4
+        assert again.storage.leaderboard('kills') == [("Bob", 4)]
+        again.close()
+        print("   ✅ Player, world and leaderboard restored from game.db")
+        
+        print("\n6️⃣  A backend missing a method...")
+        
+        class NoLeaderboard(JsonStorage):
+            leaderboard = Storage.leaderboard
+        
+        try:
+            NoLeaderboard(root)
+            assert False, "created a backend without a leaderboard"
+        except TypeError as e:
+            print(f"   ✅ Refused at creation: {e}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    
+    print("\n✅ Player persistence working correctly!")
+    return True
+
+
+def test_delta_saves():
+    """Test checkpoint + journal saves and loading them back"""
+    print("\n🧪 Testing Delta Saves\n")
+    
+    import json
+    import shutil
+    import tempfile
+    
+    folder = tempfile.mkdtemp()
+    save = os.path.join(folder, "slot1")
+    
+    def world(engine):
+        return (engine.player_location, sorted(engine.inventory), engine.turn_count,
+                {obj_id: engine.record(engine.object_record(obj)) for obj_id, obj in engine.objects.items()},
+                {sprite_id: engine.record(engine.sprite_record(sprite)) for sprite_id, sprite in engine.sprites.items()})
+    
+    try:
+        engine = GameEngineRPG(config_path=WORLD_PATH)
+        engine.start_game()
+        
+        print("1️⃣  First save is a checkpoint of what changed...")
+        engine.execute_command("west")  # Kitchen
+        engine.execute_command("take water")
+        troll = engine.spawn_sprite(next(iter(engine.sprite_templates)), "courtyard")
+        keeper = engine.spawn_sprite(next(iter(engine.sprite_templates)), "library")
+        engine.save_game(save)
+        with open(f"{save}.json") as f:
+            checkpoint = json.load(f)
+        assert checkpoint['format'] == 'delta' and list(checkpoint['objects']) == ["water"]
+        assert troll in checkpoint['sprites']
+        assert os.path.getsize(f"{save}.journal") == 0
+        print(f"   ✅ 1 of {len(engine.objects)} objects written, {len(checkpoint['sprites'])} sprites")
+        
+        print("\n2️⃣  Later saves append only their changes...")
+        engine.objects["knife"].location = "library"
+        engine.sprites[troll].health = 3
+        engine.sprites[keeper].location = "secret_room"
+        engine.save_game(save)
+        engine.remove_sprite(troll)
+        engine.execute_command("north")  # Freezer
+        engine.save_game(save)
+        with open(f"{save}.journal") as f:
+            entries = [json.loads(line) for line in f]
+        assert [list(entry['objects']) for entry in entries] == [["knife"], []]
+        assert sorted(entries[0]['sprites']) == sorted([troll, keeper]) and entries[1]['removed_sprites'] == [troll]
+        print(f"   ✅ Journal entries: {[len(line) for line in open(f'{save}.journal')]} bytes")
+        serialised = []
+        object_record = engine.object_record
+        engine.object_record = lambda obj: serialised.append(obj.id) or object_record(obj)
+        engine.objects["knife"].location = "kitchen"
+        engine.save_game(save)
+        del engine.object_record
+        assert serialised == ["knife"], serialised
+        print(f"   ✅ Only the changed object serialised, not all {len(engine.objects)}")
+        
+        print("\n3️⃣  Loading applies initial world + checkpoint + journal...")
+        saved = world(engine)
+        other = GameEngineRPG(config_path=WORLD_PATH)
+        other.start_game()
+        other.objects["glass_cup"].location = "freezer"  # Must be put back by the load
+        result = other.load_game(save)
+        assert "Game loaded" in result, result
+        assert world(other) == saved and troll not in other.sprites
+        assert other.sprites[keeper].location == "secret_room"
+        print(f"   ✅ Same player, {len(other.objects)} objects and {len(other.sprites)} sprites")
+        
+        print("\n4️⃣  Saves keep journaling after a load, then compact...")
+        for turn in range(GameEngineRPG.JOURNAL_COMPACT_ENTRIES):
+            other.player_location = "kitchen" if turn % 2 else "freezer"
+            other.save_game(save)
+        with open(f"{save}.json") as f:
+            assert json.load(f)['generation'] != checkpoint['generation']  # Folded into a new checkpoint
+        with open(f"{save}.journal") as f:
+            assert len(f.readlines()) < GameEngineRPG.JOURNAL_COMPACT_ENTRIES
+        again = GameEngineRPG(config_path=WORLD_PATH)
+        again.load_game(save)
+        assert world(again) == world(other)
+        print("   ✅ Journal compacted into a fresh checkpoint")
+        
+        print("\n5️⃣  A torn journal line (crash mid-save) is ignored...")
+        other.player_location = "kitchen"
+        other.save_game(save)
+        good = world(other)
+        with open(f"{save}.journal", 'a') as f:
+            f.write('{"generation": "')
+        torn = GameEngineRPG(config_path=WORLD_PATH)
+        torn.load_game(save)
+        assert world(torn) == good
+        print("   ✅ Loaded up to the last complete entry")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    print("\n✅ Delta saves working correctly!")
+    return True
+
+
+def test_binary_saves():
+    """Test the binary .sav format for both engines and converting saves"""
+    print("\n🧪 Testing Binary Saves\n")
+    
+    import json
+    import shutil
+    import subprocess
+    import tempfile
+    import save_format
+    
+    folder = tempfile.mkdtemp()
+    save = os.path.join(folder, "slot1")
+    
+    try:
+        print("1️⃣  Encoding round-trips JSON values...")
+        state = {'name': "Zoë", 'turn': 42, 'big': 2 ** 70, 'neg': -300, 'ratio': 0.25,
+                 'flags': {'lit': True, 'open': False, 'key': None}, 'rooms': ["hall", "hall", "attic"]}
+        for compression in save_format.COMPRESSION:
+            assert save_format.loads(save_format.dumps(state, compression)) == state
+        for bad in (b"PK\x03\x04....", save_format.dumps(state, 'none')[:-2]):
+            try:
+                save_format.loads(bad)
+                assert False, "bad data was accepted"
+            except save_format.SaveFormatError as e:
+                print(f"   ✅ Rejected: {e}")
+        
+        print("\n2️⃣  GameEngine saves and loads .sav...")
+        engine = GameEngine(config_path=WORLD_PATH, save_format='sav')
+        engine.player_location = "kitchen"
+        engine.execute_command("take water")
+        engine.turn_count = 7
+        result = engine.save_game(save)
+        assert result.endswith(".sav") and not os.path.exists(f"{save}.json"), result
+        other = GameEngine(config_path=WORLD_PATH)  # Reads either format
+        assert "Game loaded" in other.load_game(save)
+        assert other.inventory == engine.inventory and other.turn_count == 7
+        missing = os.path.join(folder, "slot9")
+        assert other.load_game(missing) == f"Save file {missing}.json or {missing}.sav not found."
+        json_size = len(json.dumps(save_format.load(f"{save}.sav"), indent=2))
+        print(f"   ✅ {os.path.getsize(f'{save}.sav')} bytes (JSON: {json_size})")
+        
+        print("\n3️⃣  GameEngineRPG checkpoints are binary, journals stay JSON lines...")
+        rpg = GameEngineRPG(config_path=WORLD_PATH, save_format='sav')
+        rpg.start_game()
+        rpg.execute_command("west")
+        rpg.execute_command("take water")
+        rpg.save_game(save)
+        rpg.objects["knife"].location = "library"
+        rpg.save_game(save)
+        assert os.path.getsize(f"{save}.journal") > 0
+        loaded = GameEngineRPG(config_path=WORLD_PATH)
+        assert "Game loaded" in loaded.load_game(save)
+        assert loaded.objects["knife"].location == "library" and "water" in loaded.inventory
+        assert loaded.load_game(missing) == f"Save file {missing}.json or {missing}.sav not found."
+        print("   ✅ Checkpoint + journal loaded")
+        
+        print("\n4️⃣  convert_save.py turns it into JSON and back...")
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "convert_save.py")
+        subprocess.run([sys.executable, script, f"{save}.sav", "--replace"], check=True, capture_output=True)
+        assert os.path.exists(f"{save}.json") and not os.path.exists(f"{save}.sav")
+        again = GameEngineRPG(config_path=WORLD_PATH)
+        assert "Game loaded" in again.load_game(save)
+        assert again.objects["knife"].location == "library"  # Journal still applies
+        subprocess.run([sys.executable, script, f"{save}.json", "--compression", "lzma"],
+                       check=True, capture_output=True)
+        assert save_format.load(f"{save}.sav") == json.load(open(f"{save}.json"))
+        print("   ✅ Converted both ways")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    print("\n✅ Binary saves working correctly!")
+    return True
+
+
+def test_seeded_rng():
+    """Test that a seeded world plays out the same whatever else uses random"""
+    print("\n🧪 Testing Seeded World RNG\n")
+    
+    import random
+    
+    commands = ["n", "s", "e", "w", "take knife", "attack goblin", "flee", "look", "drop knife"]
+    
+    def play(seed: int, noise: int) -> list:
+        engine = GameEngineRPG(config_path=WORLD_PATH, seed=seed)
+        engine.start_game()
+        script = random.Random(1)
+        log = []
+        for _ in range(300):
+            random.seed(noise)  # Must not matter
+            noise += 1
+            engine.player_health = 100
+            log.append(engine.execute_command(script.choice(commands)))
+            log.extend(engine.process_turn())
+        log.append(sorted((sprite.id, sprite.location, sprite.health) for sprite in engine.sprites.values()))
+        return log
+    
+    first = play(42, noise=0)
+    assert play(42, noise=1000) == first
+    print(f"   ✅ Same seed, same {len(first)} outputs and sprites")
+    assert play(43, noise=0) != first
+    print("   ✅ Another seed plays differently")
+    
+    print("\n✅ Seeded world RNG working correctly!")
+    return True
+
+
 def main():
     print("=" * 60)
     print("  ZORK GAME ENGINE - AUTOMATED TEST SUITE")
@@ -148,6 +1003,21 @@ def main():
         ("Configuration Loading", test_config_loading),
         ("Action Matrix", test_action_matrix),
         ("Water→Ice Transformation", test_water_to_ice),
+        ("Location Index", test_location_index),
+        ("Verb Lookup", test_verb_lookup),
+        ("Name Lookup", test_name_lookup),
+        ("Transformation Scheduler", test_transformation_scheduler),
+        ("World Snapshot", test_world_snapshot),
+        ("World Template", test_world_template),
+        ("Player Contexts", test_player_contexts),
+        ("Area of Interest", test_area_of_interest),
+        ("Sprite Population", test_sprite_population),
+        ("Sprite Table", test_sprite_table),
+        ("Room Graph", test_room_graph),
+        ("Player Persistence", test_player_persistence),
+        ("Delta Saves", test_delta_saves),
+        ("Binary Saves", test_binary_saves),
+        ("Seeded World RNG", test_seeded_rng),
     ]
     
     results = []
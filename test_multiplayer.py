@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+Test script for the multiplayer SSH server
+Drives MultiplayerGameServer with fake SSH processes, no network needed
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+try:
+    from ssh_server_multiplayer_rpg import MultiplayerGameServer, PlayerSession
+except ImportError as e:  # asyncssh not installed
+    MultiplayerGameServer = None
+    MISSING_DEPENDENCY = str(e)
+
+
+# The .ini files ship next to this script when there is no config/ directory
+WORLD_PATH = "config" if os.path.isdir("config") else os.path.dirname(os.path.abspath(__file__))
+
+
+class FakeProcess:
+    """Just enough of an SSH process to capture what a PlayerSession writes"""
+    
+    def __init__(self, stalled: bool = False):
+        self.output = []
+        self.closed = False
+        self.window = asyncio.Event()  # Cleared = client's SSH window is full
+        if not stalled:
+            self.window.set()
+        self.stdout = self
+    
+    def write(self, text: str):
+        self.output.append(text)
+    
+    async def drain(self):
+        await self.window.wait()
+    
+    def close(self):
+        self.closed = True
+    
+    def text(self) -> str:
+        return "".join(self.output)
+
+
+def join(server, name: str, stalled: bool = False, **queue_options) -> FakeProcess:
+    process = FakeProcess(stalled)
+    server.add_player(name, PlayerSession(name, process, **queue_options))
+    return process
+
+
+def test_broadcast_fan_out():
+    """Test that one stalled client doesn't hold up room chat for everyone else"""
+    print("\n🧪 Testing Broadcast Fan-out\n")
+    
+    if MultiplayerGameServer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    server = MultiplayerGameServer(config_path=WORLD_PATH)
+    
+    async def scenario():
+        stalled = join(server, "Stuck", stalled=True)
+        others = [join(server, f"Player{i}") for i in range(300)]
+        
+        result = await asyncio.wait_for(server.handle_player_command("Player0", "say hello"), timeout=1)
+        await asyncio.sleep(0.01)  # Let the writer tasks run
+        return result, stalled, others
+    
+    result, stalled, others = asyncio.run(scenario())
+    
+    assert result == 'You say: "hello"'
+    assert all('Player0 says: "hello"' in process.text() for process in others[1:])
+    print(f"   ✅ {len(others) - 1} players got the message")
+    assert 'Player0 says' in stalled.text()  # Written, but its drain never finished
+    assert not others[0].output
+    print("   ✅ Stalled client didn't block the sender or anyone else")
+    
+    print("\n✅ Broadcast fan-out working correctly!")
+    return True
+
+
+def test_queue_policies():
+    """Test the high-water policies for a client that stops reading"""
+    print("\n🧪 Testing Outbound Queue Policies\n")
+    
+    if MultiplayerGameServer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    server = MultiplayerGameServer(config_path=WORLD_PATH)
+    
+    async def scenario():
+        slow = {policy: join(server, policy, stalled=True, queue_limit=5, queue_policy=policy)
+                for policy in PlayerSession.QUEUE_POLICIES}
+        await server.broadcast_to_all("first")
+        await asyncio.sleep(0)  # Writers pick up "first" and stall in drain()
+        for i in range(10):
+            await server.broadcast_to_all(f"message {i}")
+        
+        metrics = server.queue_metrics()
+        for process in slow.values():
+            process.window.set()
+        await asyncio.sleep(0.01)
+        return slow, metrics
+    
+    slow, metrics = asyncio.run(scenario())
+    
+    dropper = server.players["drop_oldest"]
+    assert dropper.stats['dropped'] == 5, dropper.stats
+    assert slow['drop_oldest'].text() == "first\n" + "".join(f"message {i}\n" for i in range(5, 10))
+    print(f"   ✅ drop_oldest: dropped {dropper.stats['dropped']}, kept the newest 5")
+    
+    assert "... 5 messages skipped ...\n" in slow['coalesce'].text()
+    assert slow['coalesce'].text().endswith("message 9\n")
+    print("   ✅ coalesce: backlog folded into one line")
+    
+    assert slow['disconnect'].closed and server.players["disconnect"].closed
+    print("   ✅ disconnect: slow client hung up")
+    
+    assert metrics['players'] == 3 and metrics['max_depth'] == 5, metrics
+    print(f"   ✅ Metrics: {metrics}")
+    
+    print("\n✅ Outbound queue policies working correctly!")
+    return True
+
+
+def test_room_index():
+    """Test that room membership follows joins, moves, respawns and leaves"""
+    print("\n🧪 Testing Room Membership Index\n")
+    
+    if MultiplayerGameServer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    server = MultiplayerGameServer(config_path=WORLD_PATH)
+    
+    async def scenario():
+        for name in ("Alice", "Bob", "Carol"):
+            join(server, name)
+        assert server.get_players_in_room("entrance_hall") == ["Alice", "Bob", "Carol"]
+        print("   ✅ SERVER engine player is not listed")
+        
+        await server.handle_player_command("Bob", "south")
+        assert server.get_players_in_room("entrance_hall") == ["Alice", "Carol"]
+        assert server.get_players_in_room("courtyard") == ["Bob"]
+        look = server.format_look_for_player("Alice", "entrance_hall")
+        assert "Carol" in look and "Bob" not in look
+        print("   ✅ Movement updates the index")
+        
+        server.contexts["Carol"].location = "library"
+        server.contexts["Carol"].location = "entrance_hall"  # Respawn
+        assert server.get_players_in_room("library") == []
+        assert "Carol" in server.get_players_in_room("entrance_hall")
+        print("   ✅ Direct location changes (respawn) update the index")
+        
+        server.remove_player("Alice")
+        assert server.get_players_in_room("entrance_hall") == ["Carol"]
+        print("   ✅ Leaving removes the player")
+        
+        server.engine.reindex()  # e.g. after a load
+        assert server.get_players_in_room("courtyard") == ["Bob"]
+        print("   ✅ Players survive a reindex")
+    
+    asyncio.run(scenario())
+    
+    print("\n✅ Room membership index working correctly!")
+    return True
+
+
+class FakeClock:
+    """Stands in for the event loop's clock; sleeping just moves the time on"""
+    
+    def __init__(self):
+        self.now = 0.0
+        self.end = 0.0
+    
+    def time(self) -> float:
+        return self.now
+    
+    async def sleep(self, delay: float):
+        self.now += delay
+        if self.now >= self.end:
+            raise asyncio.CancelledError  # Out of time, stop the ticker
+        await asyncio.sleep(0)
+
+
+def test_world_ticks():
+    """Test that the world ticks at a fixed rate and recovers from a stall"""
+    print("\n🧪 Testing Fixed-rate World Ticks\n")
+    
+    if MultiplayerGameServer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    server = MultiplayerGameServer(config_path=WORLD_PATH, tick_rate=50, max_catchup_ticks=2, seed=1)
+    engine = server.engine
+    clock = FakeClock()
+    
+    async def run_for(seconds):
+        clock.end = clock.now + seconds
+        try:
+            await server.run_world_ticks(clock=clock.time, sleep=clock.sleep)
+        except asyncio.CancelledError:
+            pass
+    
+    print("1️⃣  Idle server (nobody typing)...")
+    sprites = len(engine.sprites)
+    asyncio.run(run_for(0.31))
+    stats = server.tick_stats
+    assert stats['ticks'] == 15, stats
+    assert engine.turn_count == 15 and engine.scheduler.turn == 15
+    assert sum(stats['histogram']) == stats['ticks']
+    print(f"   ✅ {stats['ticks']} ticks in 0.3s at 50/s")
+    
+    print("\n2️⃣  A longer idle stretch...")
+    asyncio.run(run_for(4.0))
+    assert stats['ticks'] == 215, stats
+    assert engine.scheduler.turn == 215  # The world doesn't stall after a few turns
+    assert len(engine.sprites) > sprites
+    print(f"   ✅ Scheduler at turn {engine.scheduler.turn}, {len(engine.sprites) - sprites} sprites spawned")
+    
+    print("\n3️⃣  One tick stalls for 210 ms...")
+    process_global_turn = server.process_global_turn
+    
+    async def stalled_turn():
+        server.process_global_turn = process_global_turn
+        clock.now += 0.21  # Like a slow tick blocking the event loop
+        await process_global_turn()
+    
+    server.process_global_turn = stalled_turn
+    before = dict(stats)
+    asyncio.run(run_for(0.41))
+    assert stats['overruns'] == before['overruns'] + 1, stats
+    assert stats['skipped'] == 7, stats
+    assert stats['ticks'] - before['ticks'] == 13, stats  # 20 slots, 7 skipped
+    assert engine.scheduler.turn == stats['ticks']
+    print(f"   ✅ Overrun reported, {stats['skipped']} ticks skipped instead of replayed")
+    print(server.format_tick_stats())
+    
+    print("\n✅ World ticks working correctly!")
+    return True
+
+
+def test_world_turn():
+    """Test that the world keeps running for hundreds of ticks and reaches every player"""
+    print("\n🧪 Testing World Turn\n")
+    
+    if MultiplayerGameServer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    print("1️⃣  400 ticks with nobody connected...")
+    server = MultiplayerGameServer(config_path=WORLD_PATH, seed=1)
+    
+    async def ticks(count):
+        spawns = 0
+        for _ in range(count):
+            spawns += sum("has appeared" in msg for msg in await server.process_global_turn())
+        await asyncio.sleep(0.01)  # Let the writers deliver
+        return spawns
+    
+    spawns = asyncio.run(ticks(400))
+    engine = server.engine
+    assert engine.scheduler.turn == 400 and engine.turn_count == 400
+    assert engine.player.health == 100 and engine.player.deaths == 0  # The engine's own context is left alone
+    assert spawns > 12 and len(engine.sprites) > 12
+    print(f"   ✅ Scheduler at turn {engine.scheduler.turn}, {len(engine.sprites)} sprites")
+    
+    print("\n2️⃣  400 more with two players...")
+    alice = join(server, "Alice")
+    bob = join(server, "Bob")
+    before = {sprite_id: sprite.location for sprite_id, sprite in engine.sprites.items()}
+    asyncio.run(ticks(400))
+    assert engine.scheduler.turn == 800
+    assert any(engine.sprites[sprite_id].location != location  # Sprites still wander
+               for sprite_id, location in before.items() if sprite_id in engine.sprites)
+    assert "[ATK]" in alice.text() and "[ATK]" in bob.text()
+    assert "BATTLE_START" not in alice.text()
+    assert server.contexts["Alice"].deaths > 0 and "You respawn at" in alice.text()
+    for name, ctx in server.contexts.items():
+        assert ctx.health > 0, (name, ctx.health)  # Everyone who died came back
+    print(f"   ✅ Players attacked and respawned ({server.contexts['Alice'].deaths} deaths for Alice)")
+    
+    print("\n✅ World turn working correctly!")
+    return True
+
+
+def test_carried_freeze():
+    """Test that a carried object transforms in its carrier's room, not the server's"""
+    print("\n🧪 Testing Carried Transformations\n")
+    
+    if MultiplayerGameServer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    server = MultiplayerGameServer(config_path=WORLD_PATH, seed=1)
+    engine = server.engine
+    
+    async def scenario():
+        join(server, "Alice")
+        for command in ("west", "take water", "north"):
+            await server.handle_player_command("Alice", command)
+        for _ in range(6):
+            await server.process_global_turn()
+    
+    print("1️⃣  Alice carries the water into the freezer...")
+    asyncio.run(scenario())
+    ctx = server.contexts["Alice"]
+    assert ctx.location == "freezer" and "water" in ctx.inventory
+    assert engine.player.location == "entrance_hall"  # The SERVER context never moved
+    assert engine.objects["water"].state == "frozen", engine.objects["water"]
+    print(f"   ✅ {engine.objects['water'].name} ({engine.objects['water'].state}) in Alice's pack")
+    
+    print("\n✅ Carried transformations working correctly!")
+    return True
+
+
+def test_persistence():
+    """Test that players, the world and stats survive a server restart with --db"""
+    print("\n🧪 Testing SQLite Persistence\n")
+    
+    if MultiplayerGameServer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    import shutil
+    import tempfile
+    
+    folder = tempfile.mkdtemp()
+    db_path = os.path.join(folder, "game.db")
+    try:
+        print("1️⃣  First session...")
+        server = MultiplayerGameServer(config_path=WORLD_PATH, db_path=db_path, save_interval=60)
+        
+        async def first_session():
+            join(server, "Alice")
+            join(server, "Bob")
+            await server.handle_player_command("Alice", "east")  # Library
+            server.engine.objects["knife"].location = "library"
+            await server.handle_player_command("Alice", "take knife")
+            server.contexts["Alice"].kills = 3
+            server.contexts["Bob"].kills = 5
+            server.contexts["Bob"].deaths = 2
+            template = next(iter(server.engine.sprite_templates))
+            sprite_id = server.engine.spawn_sprite(template, "courtyard")
+            server.engine.sprites[sprite_id].health = 7
+            doomed_id = server.engine.spawn_sprite(template, "courtyard")
+            await server.save_world()
+            
+            # Later saves upsert only what changed and delete removed sprites
+            server.engine.objects["glass_cup"].location = "courtyard"
+            server.engine.remove_sprite(doomed_id)
+            written = []
+            save_world = server.storage.save_world
+            server.storage.save_world = lambda changes: written.append(changes) or save_world(changes)
+            await server.save_world()
+            del server.storage.save_world
+            assert not written[0]['full'], written
+            assert list(written[0]['objects']) == ["glass_cup"] and not written[0]['sprites'], written
+            assert written[0]['removed_sprites'] == [doomed_id], written
+            server.remove_player("Alice")
+            for _ in range(100):  # The store's writer thread flushes a disconnect right away
+                if server.storage.load_player("Alice") is not None:
+                    break
+                await asyncio.sleep(0.01)
+            assert server.storage.load_player("Alice") is not None, "disconnect was not flushed"
+            return sprite_id, doomed_id
+        
+        sprite_id, doomed_id = asyncio.run(first_session())
+        sprites = sorted(server.engine.sprites)
+        server.close()
+        print(f"   ✅ Saved 2 players and {len(sprites)} sprites")
+        
+        print("\n2️⃣  After a restart...")
+        server = MultiplayerGameServer(config_path=WORLD_PATH, db_path=db_path, save_interval=60)
+        assert server.engine.objects["glass_cup"].location == "courtyard"
+        assert sorted(server.engine.sprites) == sprites
+        sprite = server.engine.sprites[sprite_id]
+        assert sprite.health == 7 and sprite.location == "courtyard"
+        assert sprite_id in server.engine.index.sprites_at("courtyard")
+        assert doomed_id not in server.engine.sprites
+        print("   ✅ Objects and sprites restored")
+        
+        async def second_session():
+            join(server, "Alice")
+            return await server.handle_player_command("Alice", "leaderboard")
+        
+        board = asyncio.run(second_session())
+        ctx = server.contexts["Alice"]
+        assert ctx.location == "library" and ctx.inventory == {"knife"}
+        assert ctx.kills == 3
+        print("   ✅ Alice is back in the library with her knife and kills")
+        
+        assert board.index("Bob") < board.index("Alice"), board
+        assert server.storage.leaderboard('kills') == [("Bob", 5), ("Alice", 3)]
+        assert server.storage.leaderboard('deaths') == [("Bob", 2), ("Alice", 0)]
+        print(board)
+        server.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    print("\n✅ SQLite persistence working correctly!")
+    return True
+
+
+def test_journal_replay():
+    """Test that a journaled session restores and replays exactly"""
+    print("\n🧪 Testing Command Journal\n")
+    
+    if MultiplayerGameServer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    import random
+    import shutil
+    import subprocess
+    import tempfile
+    
+    folder = tempfile.mkdtemp()
+    journal = os.path.join(folder, "session.journal")
+    commands = ["n", "s", "e", "w", "look", "take knife", "drop knife", "attack goblin", "flee",
+                "pvp", "attack Bob", "say hi", "inventory"]
+    try:
+        print("1️⃣  Recording a session...")
+        server = MultiplayerGameServer(config_path=WORLD_PATH, seed=11)
+        
+        async def session():
+            await server.open_journal(journal, snapshot_entries=150)  # Two snapshots on the way
+            script = random.Random(5)
+            for name in ("Alice", "Bob", "Carol"):
+                join(server, name)
+            for step in range(400):
+                if step == 200:
+                    server.remove_player("Carol")
+                    await asyncio.sleep(0)
+                if step % 4 == 0:
+                    await server.process_global_turn()
+                else:
+                    await server.handle_player_command(script.choice(["Alice", "Bob"]), script.choice(commands))
+            return server.engine.world_state(), {name: server.player_snapshot(name) for name in server.players}
+        
+        world, players = asyncio.run(session())
+        server.close()
+        with open(journal) as f:
+            lines = f.readlines()
+        assert len(lines) <= 151, len(lines)  # Snapshot + events since
+        print(f"   ✅ Journal holds a snapshot and {len(lines) - 1} events")
+        
+        print("\n2️⃣  Replaying it offline in another process...")
+        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay_journal.py")
+        env = dict(os.environ, PYTHONHASHSEED="123")  # Different set ordering than this process
+        result = subprocess.run([sys.executable, script_path, journal, "--config", WORLD_PATH],
+                                capture_output=True, text=True, env=env)
+        assert result.returncode == 0 and "Every event matched" in result.stdout, result.stdout + result.stderr
+        print("   " + result.stdout.strip().replace("\n", "\n   "))
+        
+        print("\n3️⃣  Restarting from the journal...")
+        restarted = MultiplayerGameServer(config_path=WORLD_PATH)
+        
+        async def restart():
+            stats = await restarted.open_journal(journal)
+            return stats
+        
+        stats = asyncio.run(restart())
+        assert stats['mismatches'] == 0 and stats['events'] == len(lines) - 1
+        assert restarted.engine.world_state() == world
+        assert not restarted.players  # Nobody is connected after a restart
+        print(f"   ✅ Same world after replaying {stats['events']} events; players were {sorted(players)}")
+        restarted.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    print("\n✅ Command journal working correctly!")
+    return True
+
+
+def test_load_generator():
+    """Test the simulated-player load test in both modes"""
+    print("\n🧪 Testing Load Generator\n")
+    
+    if MultiplayerGameServer is None:
+        print(f"   ⏭️  Skipped: {MISSING_DEPENDENCY}")
+        return True
+    
+    import json
+    import shutil
+    import subprocess
+    import tempfile
+    
+    folder = tempfile.mkdtemp()
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_server.py")
+    try:
+        def run(*options):
+            results = os.path.join(folder, "results.json")
+            result = subprocess.run([sys.executable, script_path, "--config", WORLD_PATH, "--json", results,
+                                     "--think", "0.02", *options], capture_output=True, text=True, timeout=120)
+            with open(results) as f:
+                return result, json.load(f)
+        
+        print("1️⃣  Random bots calling the server directly...")
+        result, stats = run("--players", "20", "--duration", "1")
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert stats['commands'] > 100 and stats['errors'] == 0, stats
+        assert stats['broadcasts'] > 0 and stats['memory_per_player_kb'] > 0, stats
+        assert stats['latency_ms']['p50'] <= stats['latency_ms']['p99'] <= stats['latency_ms']['max']
+        print(f"   ✅ {stats['commands']} commands, p99 {stats['latency_ms']['p99']} ms, "
+              f"{stats['broadcasts']} says delivered")
+        
+        print("\n2️⃣  Scripted bots over SSH...")
+        script = os.path.join(folder, "commands.txt")
+        with open(script, 'w') as f:
+            f.write("# Walk a loop and chat\nn\nlook\ns\nsay\n")
+        result, stats = run("--players", "5", "--duration", "1", "--mode", "ssh", "--script", script)
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert stats['commands'] > 20 and stats['errors'] == 0 and stats['broadcasts'] > 0, stats
+        assert "Player left" not in result.stdout  # Server output stays quiet
+        print(f"   ✅ {stats['commands']} commands, p99 {stats['latency_ms']['p99']} ms")
+        
+        print("\n3️⃣  Failing a latency budget...")
+        result, stats = run("--players", "5", "--duration", "0.5", "--max-p99", "0.000001")
+        assert result.returncode == 1 and "over the" in result.stdout, result.stdout
+        print("   ✅ Exit status 1 when p99 is over --max-p99")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    
+    print("\n✅ Load generator working correctly!")
+    return True
+
+
+def main():
+    print("=" * 60)
+    print("  MULTIPLAYER SERVER - TEST SUITE")
+    print("=" * 60)
+    
+    tests = [
+        ("Broadcast Fan-out", test_broadcast_fan_out),
+        ("Outbound Queue Policies", test_queue_policies),
+        ("Room Membership Index", test_room_index),
+        ("World Ticks", test_world_ticks),
+        ("World Turn", test_world_turn),
+        ("Carried Freeze", test_carried_freeze),
+        ("SQLite Persistence", test_persistence),
+        ("Command Journal", test_journal_replay),
+        ("Load Generator", test_load_generator),
+    ]
+    
+    results = []
+    for test_name, test_func in tests:
+        print("\n" + "=" * 60)
+        try:
+            results.append((test_name, test_func()))
+        except Exception as e:
+            print(f"\n❌ EXCEPTION in {test_name}: {e}")
+            results.append((test_name, False))
+    
+    print("\n" + "=" * 60)
+    for test_name, result in results:
+        print(f"{'✅ PASS' if result else '❌ FAIL'}  {test_name}")
+    passed = sum(1 for _, result in results if result)
+    print(f"\n  TOTAL: {passed}/{len(results)} tests passed")
+    print("=" * 60)
+    
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
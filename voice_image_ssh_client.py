@@ -212,6 +212,7 @@ Log file: zork_debug.log
             # Read thread - character by character for instant response!
             def read_output():
                 buffer = ""
+                image_parts = []
                 while True:
                     try:
                         char = process.stdout.read(1)
@@ -220,14 +221,18 @@ Log file: zork_debug.log
                         
                         buffer += char
                         
-                        # Extract images IMMEDIATELY
-                        while '\x1b]IMAGE;' in buffer and '\x1b\\' in buffer:
-                            start = buffer.find('\x1b]IMAGE;')
+                        # Extract images IMMEDIATELY (large ones arrive as IMAGE+ parts, then a final IMAGE)
+                        while '\x1b]IMAGE' in buffer and '\x1b\\' in buffer:
+                            start = buffer.find('\x1b]IMAGE')
                             end = buffer.find('\x1b\\', start)
                             
                             if end > start:
-                                b64 = buffer[start+len('\x1b]IMAGE;'):end]
-                                self.queue_image(b64)
+                                head, _, b64 = buffer[start:end].partition(';')
+                                if head.endswith('+'):
+                                    image_parts.append(b64)
+                                else:
+                                    self.queue_image(''.join(image_parts) + b64)
+                                    image_parts.clear()
                                 buffer = buffer[:start] + buffer[end+2:]
                             else:
                                 break